@@ -0,0 +1,186 @@
+"""Launching and stopping many containers at once.
+
+Each container operation runs on a worker thread; Docker API calls are I/O
+bound so a pool of workers brings N containers up or down in roughly
+N / workers round trips instead of N.
+"""
+import contextvars
+import fnmatch
+import logging
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import telemetry
+
+logger = logging.getLogger("cms.containers")
+
+BATCH_LABEL = "cms.batch"
+REPLICA_LABEL = "cms.replica"
+
+
+class OperationResult:
+    """Outcome and timing of one container operation."""
+
+    def __init__(self, action, target):
+        self.action = action
+        self.target = target
+        self.ok = False
+        self.seconds = 0.0
+        self.error = None
+
+    def as_dict(self):
+        return {"action": self.action, "target": self.target, "ok": self.ok,
+                "seconds": round(self.seconds, 3), "error": str(self.error) if self.error else None}
+
+
+def summarize(results, wall_seconds=None):
+    """Counts and timing statistics (seconds) for a list of OperationResults."""
+    durations = [r.seconds for r in results]
+    summary = {
+        "count": len(results),
+        "ok": sum(r.ok for r in results),
+        "failed": sum(not r.ok for r in results),
+    }
+    if durations:
+        summary.update(min=min(durations), median=statistics.median(durations), max=max(durations),
+                       mean=statistics.fmean(durations))
+    if wall_seconds is not None:
+        summary["wall_seconds"] = wall_seconds
+    return summary
+
+
+def _timed(operation, action, target, func, bytes_of=None, log=logger):
+    result = OperationResult(action, target)
+    with telemetry.measure(operation, target=target) as span:
+        try:
+            value = func()
+            result.ok = True
+            if bytes_of is not None:
+                span.add_bytes(bytes_of(value))
+        except Exception as e:
+            result.error = e
+            span.outcome = telemetry.ERROR
+            span.error = str(e)[:500]
+            log.error(f"Failed to {action} {target}: {e}")
+    result.seconds = span.seconds
+    return result
+
+
+def run_operations(tasks, concurrency=8, job=None, bytes_of=None, log=logger, thread_name_prefix="cms-batch"):
+    """Run (operation, action, target, func) tasks on a thread pool; returns (results, wall seconds).
+
+    Every func call is measured as the telemetry operation and becomes an
+    OperationResult(action, target); results keep the order of tasks.
+    bytes_of(return value of func) gives the bytes a task moved or freed.
+    Tasks not started yet raise JobCancelled once job is cancelled.
+    """
+    def run(task):
+        if job is not None:
+            job.check_cancelled()
+        return _timed(*task, bytes_of=bytes_of, log=log)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix=thread_name_prefix) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, run, task) for task in tasks]
+        results = [future.result() for future in futures]
+    return results, time.monotonic() - start
+
+
+def parse_env(items):
+    """Turn ["KEY=VALUE", ...] into a dict."""
+    env = {}
+    for item in items or ():
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid environment variable '{item}', expected KEY=VALUE.")
+        env[key] = value
+    return env
+
+
+def parse_ports(items):
+    """Turn ["HOST:CONTAINER[/proto]" or "CONTAINER[/proto]", ...] into {container: host or None}."""
+    ports = {}
+    for item in items or ():
+        host, sep, container = item.rpartition(":")
+        if "/" not in container:
+            container += "/tcp"
+        ports[container] = int(host) if sep else None
+    return ports
+
+
+def replica_name(template, image, index, batch_id):
+    short_image = image.rsplit("/", 1)[-1].split(":", 1)[0].split("@", 1)[0]
+    return template.format(image=short_image, index=index, batch=batch_id)
+
+
+def launch_replicas(client, image, replicas, name_template="{image}-{batch}-{index}", env=None, ports=None,
+                    cpus=None, mem_limit=None, labels=None, concurrency=8, job=None):
+    """Start replicas detached containers of image in parallel.
+
+    name_template may use {image}, {index} and {batch}. Host ports in ports are
+    offset by the replica index so replicas do not collide. Every container is
+    labelled with cms.batch=<batch id> so the set can be stopped together.
+    Returns (batch_id, results, summary).
+    """
+    batch_id = uuid.uuid4().hex[:8]
+    logger.info(f"Launching {replicas} replicas of {image} as batch {batch_id} with concurrency {concurrency}.")
+
+    def start(index):
+        container_labels = dict(labels or {})
+        container_labels[BATCH_LABEL] = batch_id
+        container_labels[REPLICA_LABEL] = str(index)
+        port_map = {container: (host + index if host is not None else None)
+                    for container, host in (ports or {}).items()}
+        kwargs = {"name": replica_name(name_template, image, index, batch_id), "detach": True,
+                  "environment": env or None, "ports": port_map or None, "labels": container_labels}
+        if cpus:
+            kwargs["nano_cpus"] = int(float(cpus) * 1e9)
+        if mem_limit:
+            kwargs["mem_limit"] = mem_limit
+        return lambda: client.containers.run(image, **kwargs)
+
+    tasks = [("container.run", "run", replica_name(name_template, image, index, batch_id), start(index))
+             for index in range(replicas)]
+    results, wall = run_operations(tasks, concurrency, job)
+    summary = summarize(results, wall)
+    logger.info(f"Batch {batch_id}: {summary['ok']}/{replicas} containers started in {wall:.2f} seconds.")
+    return batch_id, results, summary
+
+
+def select_containers(client, label=None, name_pattern=None, include_stopped=False):
+    """List containers matching a label filter ("key" or "key=value") and/or a shell-style name pattern.
+
+    One GET /containers/json request: containers.list() would inspect every
+    container separately, and stopping or removing only needs the id.
+    """
+    filters = {"label": label} if label else None
+    containers = []
+    for summary in client.api.containers(all=include_stopped, filters=filters):
+        name = (summary.get("Names") or ["/"])[0].lstrip("/")
+        if name_pattern and not fnmatch.fnmatchcase(name, name_pattern):
+            continue
+        # Container.name reads the inspect-style "Name" field
+        containers.append(client.containers.prepare_model({**summary, "Name": f"/{name}"}))
+    return containers
+
+
+def stop_containers(client, containers, timeout=10, remove=False, concurrency=8, job=None):
+    """Stop (and optionally remove) containers in parallel. Returns (results, summary)."""
+    logger.info(f"Stopping {len(containers)} containers with concurrency {concurrency}"
+                f"{' and removing them' if remove else ''}.")
+
+    def stop(container):
+        def run():
+            container.stop(timeout=timeout)
+            if remove:
+                container.remove()
+        return run
+
+    action = "remove" if remove else "stop"
+    tasks = [(f"container.{action}", action, container.name, stop(container)) for container in containers]
+    results, wall = run_operations(tasks, concurrency, job)
+    summary = summarize(results, wall)
+    logger.info(f"{summary['ok']}/{len(containers)} containers stopped in {wall:.2f} seconds.")
+    return results, summary
@@ -0,0 +1,14 @@
+"""Reproducible performance benchmarks for the Cloud Management System.
+
+Run from the repository root:
+
+    python -m benchmarks                         # run everything, print a table
+    python -m benchmarks -k catalog --rounds 20  # only matching benchmarks
+    python -m benchmarks --output results.json --save-baseline benchmarks/baseline.json
+    python -m benchmarks --compare benchmarks/baseline.json   # exit 1 on regressions
+
+Docker operations run against fake_docker.FakeDockerServer, an in-process
+HTTP server speaking the subset of the Engine API the tool uses, and VM
+operations against the stub qemu and qemu-img programs written by stubs.py,
+so results do not depend on a Docker daemon, KVM or disk images.
+"""
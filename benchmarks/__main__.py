@@ -0,0 +1,70 @@
+"""Command line entry point: python -m benchmarks --help."""
+import argparse
+import json
+import sys
+
+from . import operations, suite
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Benchmark core Cloud Management System operations against a fake "
+                                                 "Docker daemon and stub QEMU binaries.")
+    parser.add_argument("-k", dest="patterns", action="append", metavar="PATTERN",
+                        help="only run benchmarks whose name contains or matches PATTERN (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    parser.add_argument("--rounds", type=int, help="measured rounds per benchmark (default: per benchmark)")
+    parser.add_argument("--warmup", type=int, help="unmeasured warm-up rounds per benchmark (default: per benchmark)")
+    parser.add_argument("--output", "-o", metavar="FILE", help="write the results as JSON to FILE")
+    parser.add_argument("--save-baseline", metavar="FILE", help="also store the results as the baseline FILE")
+    parser.add_argument("--compare", metavar="FILE", help="compare median times with the baseline FILE and exit 1 "
+                                                          "on regressions")
+    parser.add_argument("--threshold", type=float, default=suite.DEFAULT_THRESHOLD,
+                        help="slowdown that counts as a regression, as a fraction (default: %(default)s)")
+    parser.add_argument("--min-delta", type=float, default=suite.DEFAULT_MIN_DELTA,
+                        help="ignore median changes smaller than this many seconds (default: %(default)s)")
+    parser.add_argument("--json", action="store_true", help="print the results document instead of a table")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.rounds is not None and args.rounds < 1:
+        print("--rounds must be at least 1.", file=sys.stderr)
+        return 2
+    selected = suite.select(args.patterns)
+    if not selected:
+        print(f"No benchmark matches {', '.join(args.patterns)}.", file=sys.stderr)
+        return 2
+    if args.list:
+        for benchmark in selected:
+            print(f"{benchmark.name:<34} {benchmark.description}")
+        return 0
+    baseline = suite.load(args.compare) if args.compare else None
+
+    if not args.json:
+        print(suite.header(), flush=True)
+    with operations.isolated():
+        document = suite.run_all(selected, args.rounds, args.warmup,
+                                 on_result=None if args.json else suite.print_progress)
+    if args.json:
+        print(json.dumps(document, indent=2))
+    for path in (args.output, args.save_baseline):
+        if path:
+            suite.save(document, path)
+
+    failed = [result["name"] for result in document["benchmarks"] if "error" in result]
+    regressions = []
+    if baseline is not None:
+        rows = suite.compare(document, baseline, args.threshold, args.min_delta)
+        regressions = [row["name"] for row in rows if row["status"] == "regression"]
+        print("\n" + suite.format_comparison(rows, args.threshold), file=sys.stderr if args.json else sys.stdout)
+    if failed:
+        print(f"Failed: {', '.join(failed)}", file=sys.stderr)
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""In-process fake Docker Engine API server for benchmarks.
+
+Implements the endpoints the Cloud Management System calls (ping, version,
+image listing and inspection, container create/start/inspect/list/stop/remove)
+against in-memory state. latency adds a fixed delay to every request to model
+a daemon that does real work, so concurrency effects show up in the numbers.
+Generated data is deterministic for a given seed.
+"""
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_VERSION = "1.43"
+
+
+def generate_images(count, tags_per_image=2, seed=0):
+    """Return count image records with tags_per_image tags each (e.g. 5000 x 2 = 10k tags)."""
+    rng = random.Random(seed)
+    words = ["api", "web", "worker", "cache", "db", "proxy", "auth", "search", "queue", "metrics", "billing",
+             "gateway", "frontend", "backend", "scheduler", "notifier"]
+    images = []
+    for index in range(count):
+        repository = f"registry.local/{rng.choice(words)}-{rng.choice(words)}-{index}"
+        tags = [f"{repository}:{major}.{rng.randrange(50)}" for major in range(tags_per_image)]
+        images.append({"Id": f"sha256:{rng.getrandbits(256):064x}", "RepoTags": tags, "RepoDigests": [],
+                       "Created": 1_700_000_000 + rng.randrange(10_000_000), "Size": rng.randrange(5, 900) * 2**20,
+                       "SharedSize": -1, "VirtualSize": 0, "Labels": {}, "Containers": -1, "ParentId": ""})
+    return images
+
+
+class FakeDockerServer:
+    """Fake daemon at http://127.0.0.1:<port>; use as a context manager or call start()/stop()."""
+
+    def __init__(self, images=0, tags_per_image=2, latency=0.0, seed=0):
+        self.latency = latency
+        self.images = generate_images(images, tags_per_image, seed)
+        self._by_key = {}
+        for image in self.images:
+            for key in (image["Id"], image["Id"].split(":", 1)[1], *image["RepoTags"]):
+                self._by_key[key] = image
+        self.containers = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"tcp://127.0.0.1:{self._server.server_address[1]}"
+
+    def client(self, **options):
+        """A docker.DockerClient connected to this server."""
+        import docker
+        return docker.DockerClient(base_url=self.url, version=API_VERSION, **options)
+
+    def start(self):
+        handler = type("Handler", (_Handler,), {"fake": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-docker", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # State
+
+    def create_container(self, name, body):
+        with self._lock:
+            container_id = uuid.uuid4().hex + uuid.uuid4().hex
+            name = name or f"fake_{container_id[:8]}"
+            if any(c["Name"] == f"/{name}" for c in self.containers.values()):
+                return None
+            self.containers[container_id] = {
+                "Id": container_id, "Name": f"/{name}", "Image": body.get("Image"), "Created": time.time(),
+                "Config": {"Image": body.get("Image"), "Labels": body.get("Labels") or {}, "Env": body.get("Env")},
+                "State": {"Status": "created", "Running": False},
+                "HostConfig": body.get("HostConfig") or {},
+            }
+            return container_id
+
+    def find_image(self, key):
+        image = self._by_key.get(key)
+        if image is None:
+            image = next((i for i in self.images if i["Id"].split(":", 1)[1].startswith(key)), None)
+        return image
+
+    def find_container(self, key):
+        with self._lock:
+            for container in self.containers.values():
+                if container["Id"].startswith(key) or container["Name"] == f"/{key}":
+                    return container
+        return None
+
+    def list_containers(self, include_stopped, filters):
+        labels = filters.get("label") or []
+        with self._lock:
+            containers = list(self.containers.values())
+        summaries = []
+        for c in containers:
+            if not include_stopped and not c["State"]["Running"]:
+                continue
+            container_labels = c["Config"]["Labels"]
+            if not all(_label_matches(container_labels, label) for label in labels):
+                continue
+            summaries.append({"Id": c["Id"], "Names": [c["Name"]], "Image": c["Image"], "Labels": container_labels,
+                              "State": c["State"]["Status"], "Status": c["State"]["Status"]})
+        return summaries
+
+
+def _label_matches(labels, expression):
+    key, sep, value = expression.partition("=")
+    return key in labels and (not sep or labels[key] == value)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without TCP_NODELAY each response waits for a delayed ACK
+    disable_nagle_algorithm = True
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body=None, raw=None):
+        data = raw if raw is not None else (json.dumps(body).encode() if body is not None else b"")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json" if raw is None else "text/plain")
+        self.send_header("Api-Version", API_VERSION)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, method):
+        with self.fake._lock:
+            self.fake.requests += 1
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        url = urllib.parse.urlsplit(self.path)
+        path = re.sub(r"^/v[0-9.]+", "", url.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+        filters = json.loads(query.get("filters") or "{}")
+        if isinstance(filters.get("label"), dict):
+            filters["label"] = [k for k, v in filters["label"].items() if v]
+
+        if path == "/_ping":
+            return self._send(200, raw=b"OK")
+        if path == "/version":
+            return self._send(200, {"Version": "24.0.0-fake", "ApiVersion": API_VERSION, "Os": "linux"})
+        if path == "/info":
+            return self._send(200, {"DockerRootDir": "/var/lib/docker", "Containers": len(self.fake.containers),
+                                    "Images": len(self.fake.images)})
+        if path == "/images/json":
+            return self._send(200, self.fake.images)
+        match = re.fullmatch(r"/images/(.+)/json", path)
+        if match:
+            key = urllib.parse.unquote(match.group(1))
+            image = self.fake.find_image(key)
+            if image is None:
+                return self._send(404, {"message": f"No such image: {key}"})
+            return self._send(200, {**image, "RootFS": {"Type": "layers", "Layers": []}})
+
+        if path == "/containers/json":
+            return self._send(200, self.fake.list_containers(query.get("all") in ("1", "true", "True"), filters))
+        if path == "/containers/create" and method == "POST":
+            container_id = self.fake.create_container(query.get("name"), body)
+            if container_id is None:
+                return self._send(409, {"message": "Conflict. The container name is already in use."})
+            return self._send(201, {"Id": container_id, "Warnings": []})
+        match = re.fullmatch(r"/containers/([^/]+)(/[a-z]+)?", path)
+        if match:
+            container = self.fake.find_container(match.group(1))
+            if container is None:
+                return self._send(404, {"message": f"No such container: {match.group(1)}"})
+            action = match.group(2)
+            if method == "GET" and action == "/json":
+                return self._send(200, container)
+            if method == "POST" and action in ("/start", "/stop"):
+                running = action == "/start"
+                container["State"] = {"Status": "running" if running else "exited", "Running": running}
+                return self._send(204)
+            if method == "DELETE" and action is None:
+                with self.fake._lock:
+                    self.fake.containers.pop(container["Id"], None)
+                return self._send(204)
+        return self._send(404, {"message": f"Not implemented by the fake daemon: {method} {path}"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+    def do_HEAD(self):
+        self._route("HEAD")
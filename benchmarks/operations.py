@@ -0,0 +1,260 @@
+"""The benchmarks: core Cloud Management System operations at realistic sizes.
+
+Run them inside isolated(), which points every file the operations write at
+a temporary directory, keeps telemetry in memory and puts the stub QEMU
+programs first on PATH. Fake Docker servers are shared between benchmarks of
+the same size and stopped when isolated() exits.
+"""
+import contextlib
+import logging
+import os
+import tempfile
+
+import batch_containers
+import cms_logging
+import history_store
+import image_browser
+import telemetry
+from image_catalog import ImageCatalog
+from image_pool import ImagePool
+from vm_manager import VMManager
+
+from .fake_docker import FakeDockerServer
+from .stubs import write_stubs
+from .suite import benchmark
+
+# 5000 images with two tags each
+IMAGES = 5000
+TAGS_PER_IMAGE = 2
+BATCH_SIZE = 50
+# Per-request delay of the fake daemon in the container benchmarks, roughly a local dockerd creating a container
+DAEMON_LATENCY = 0.005
+LOG_RECORDS = 20_000
+HISTORY_RECORDS = 20_000
+SEARCH_QUERIES = ("api", "worker-db", "registry.local/web", "gateway-cache-1", "1.4", "nothing-matches-this")
+
+_state = {}
+
+
+@contextlib.contextmanager
+def isolated():
+    """Temporary working area, in-memory telemetry and stub qemu binaries for the duration of a run."""
+    previous_path = os.environ.get("PATH", "")
+    with tempfile.TemporaryDirectory(prefix="cms-bench-") as workdir:
+        _state.clear()
+        _state["workdir"] = workdir
+        os.environ["PATH"] = write_stubs(os.path.join(workdir, "bin")) + os.pathsep + previous_path
+        telemetry.configure(path=None)
+        try:
+            yield workdir
+        finally:
+            for server in _state.get("servers", {}).values():
+                server.stop()
+            cms_logging.shutdown()
+            _state.clear()
+            os.environ["PATH"] = previous_path
+
+
+def _workdir(*parts):
+    path = os.path.join(_state["workdir"], *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _server(images=0, latency=0.0):
+    servers = _state.setdefault("servers", {})
+    if (images, latency) not in servers:
+        servers[(images, latency)] = FakeDockerServer(images=images, tags_per_image=TAGS_PER_IMAGE,
+                                                      latency=latency).start()
+    return servers[(images, latency)]
+
+
+def _client(server):
+    # Pool size above the batch concurrency so workers never wait for a connection
+    return telemetry.instrument_client(server.client(timeout=30, max_pool_size=16))
+
+
+def _catalog():
+    if "catalog" not in _state:
+        client = _client(_server(IMAGES))
+        catalog = ImageCatalog(lambda: client, ttl=None)
+        catalog.refresh()
+        _state["catalog"] = catalog
+    return _state["catalog"]
+
+
+# Images
+
+
+@benchmark("images.list", rounds=20)
+def bench_image_list(bench):
+    """List 5000 images (10k tags) through the image browser."""
+    client = _client(_server(IMAGES))
+    bench.items = IMAGES
+    bench(image_browser.list_images, client)
+
+
+@benchmark("images.sort", rounds=20)
+def bench_image_sort(bench):
+    """Sort 5000 image records by tag, as the browser does on every column click."""
+    records = image_browser.list_images(_client(_server(IMAGES)))
+    bench.items = len(records)
+    bench(image_browser.sort_images, records, "tag")
+
+
+@benchmark("images.catalog_refresh", rounds=3, warmup=0)
+def bench_catalog_refresh(bench):
+    """Full reload of the image catalog with 10k tags from one image listing."""
+    client = _client(_server(IMAGES))
+    catalog = ImageCatalog(lambda: client, ttl=None)
+    bench.items = IMAGES * TAGS_PER_IMAGE
+    bench(catalog.refresh)
+    _state["catalog"] = catalog
+
+
+@benchmark("images.catalog_search", rounds=50)
+def bench_catalog_search(bench):
+    """Six substring searches over a loaded catalog with 10k tags."""
+    catalog = _catalog()
+
+    def search_all():
+        return [catalog.search(query) for query in SEARCH_QUERIES]
+
+    bench.items = len(SEARCH_QUERIES)
+    matches = bench(search_all)
+    bench.extra_info["matches"] = [len(m) for m in matches]
+
+
+# Containers
+
+
+def _require_ok(summary, action):
+    if summary["failed"]:
+        raise RuntimeError(f"{summary['failed']} of {summary['count']} containers failed to {action}.")
+
+
+@benchmark("containers.launch_batch", rounds=5)
+def bench_launch_batch(bench):
+    """Start 50 replicas with concurrency 8 against a daemon answering in 5 ms."""
+    server = _server(latency=DAEMON_LATENCY)
+    client = _client(server)
+
+    def launch():
+        batch_id, results, summary = batch_containers.launch_replicas(client, "registry.local/api:1.0",
+                                                                      BATCH_SIZE, concurrency=8)
+        _require_ok(summary, "start")
+        return summary
+
+    bench.items = BATCH_SIZE
+    bench.pedantic(launch, setup=server.containers.clear)
+
+
+@benchmark("containers.stop_batch", rounds=5)
+def bench_stop_batch(bench):
+    """Select 50 labelled containers and stop them with concurrency 8 against a 5 ms daemon."""
+    server = _server(latency=DAEMON_LATENCY)
+    client = _client(server)
+
+    def prepare():
+        server.containers.clear()
+        for index in range(BATCH_SIZE):
+            container_id = server.create_container(f"bench-{index}", {"Image": "registry.local/api:1.0",
+                                                                      "Labels": {"cms.batch": "bench"}})
+            server.containers[container_id]["State"] = {"Status": "running", "Running": True}
+
+    def stop():
+        containers = batch_containers.select_containers(client, label="cms.batch=bench")
+        if len(containers) != BATCH_SIZE:
+            raise RuntimeError(f"Expected {BATCH_SIZE} containers, the daemon listed {len(containers)}.")
+        results, summary = batch_containers.stop_containers(client, containers, timeout=1, concurrency=8)
+        _require_ok(summary, "stop")
+        return summary
+
+    bench.items = BATCH_SIZE
+    bench.pedantic(stop, setup=prepare)
+
+
+# Virtual machines
+
+
+def _pool():
+    if "pool" not in _state:
+        pool = ImagePool(_workdir("pool"))
+        base = os.path.join(_workdir(), "base.qcow2")
+        with open(base, "wb") as f:
+            f.write(b"QFI\xfb" + bytes(4092))
+        pool.add_base(base, "base")
+        _state["pool"] = pool
+    return _state["pool"]
+
+
+@benchmark("vm.create_overlay", rounds=10)
+def bench_create_overlay(bench):
+    """Create a qcow2 overlay of a pooled base image (stub qemu-img)."""
+    pool = _pool()
+    names = (f"overlay-{index}" for index in range(10_000))
+    bench.pedantic(pool.create_overlay, setup=lambda: (("base", next(names)), {}))
+
+
+@benchmark("vm.launch_kill", rounds=5)
+def bench_launch_kill(bench):
+    """Launch a VM until QMP answers, query its status and kill it (stub QEMU, no KVM)."""
+    manager = VMManager(_workdir("vms"))
+    disk = _pool().create_overlay("base", "vm-disk")
+    names = (f"bench-vm-{index}" for index in range(10_000))
+
+    def launch_and_kill(name):
+        vm = manager.launch(disk, 1, 256, name=name, kvm=False)
+        status = manager.status(name)
+        manager.kill(name)
+        return vm.launch_seconds, status
+
+    def forget(result):
+        # State files of stopped VMs would make every later list() slower
+        for vm in manager.list():
+            manager.remove(vm.name)
+
+    bench.pedantic(launch_and_kill, setup=lambda: ((next(names),), {}), teardown=forget)
+
+
+# Logging and history
+
+
+@benchmark("logging.throughput", rounds=5)
+def bench_log_throughput(bench):
+    """Log 20k records through the queue listener to a rotating file and wait until they are written."""
+    logger = logging.getLogger("cms.containers")
+    path = os.path.join(_workdir("logs"), "cms.log")
+
+    def configure():
+        cms_logging.configure(filename=path, level="INFO", levels={}, json_format=False)
+
+    def log_all():
+        for index in range(LOG_RECORDS):
+            logger.info(f"Container bench-{index} is running.")
+        # Stopping the listener drains the queue, so the time includes writing every record
+        cms_logging.shutdown()
+
+    bench.items = LOG_RECORDS
+    bench.pedantic(log_all, setup=configure)
+
+
+@benchmark("history.record", rounds=5)
+def bench_history_record(bench):
+    """Queue 20k operation records in the history database and wait until they are committed."""
+    store = history_store.HistoryStore(os.path.join(_workdir("history"), "history.db"))
+    records = [{"ts": 1_700_000_000 + index, "op": "container.run", "target": f"bench-{index % 100}",
+                "seconds": 0.01 * (index % 50), "outcome": "error" if index % 97 == 0 else "ok", "api_calls": 3}
+               for index in range(HISTORY_RECORDS)]
+
+    def record_all():
+        for record in records:
+            store.record(record)
+        if not store.flush(timeout=60):
+            raise RuntimeError("History store did not flush within 60 seconds.")
+
+    bench.items = HISTORY_RECORDS
+    try:
+        bench(record_all)
+    finally:
+        store.close()
@@ -0,0 +1,57 @@
+"""Stub qemu-img and qemu-system-x86_64 programs for benchmarking VM paths.
+
+qemu-img create writes a small file recording its backing file; the QEMU
+stub serves QMP on the -qmp socket (qmp_capabilities, query-status, stop,
+cont, quit, system_powerdown) without emulating anything. Both are Python
+scripts, so they add interpreter start-up time but no disk or CPU work.
+"""
+import os
+import stat
+import sys
+
+QEMU_IMG = '''
+import json, sys
+args = sys.argv[1:]
+if args and args[0] == "create":
+    skip = {"-f", "-b", "-F", "-o"}
+    positional = [a for i, a in enumerate(args[1:], 1) if not a.startswith("-") and args[i - 1] not in skip]
+    with open(positional[0], "w") as f:
+        json.dump({"backing": args[args.index("-b") + 1] if "-b" in args else None}, f)
+elif args and args[0] == "convert":
+    with open(args[-2]) as src, open(args[-1], "w") as dst:
+        dst.write(src.read())
+'''
+
+QEMU_SYSTEM = '''
+import json, os, socket, sys
+path = sys.argv[sys.argv.index("-qmp") + 1].split(",")[0][len("unix:"):]
+server = socket.socket(socket.AF_UNIX)
+server.bind(path)
+server.listen(5)
+state = "running"
+while True:
+    connection, _ = server.accept()
+    connection.sendall(b'{"QMP": {"version": {}, "capabilities": []}}\\n')
+    for line in connection.makefile("r"):
+        command = json.loads(line)["execute"]
+        if command == "query-status":
+            connection.sendall(json.dumps({"return": {"status": state}}).encode() + b"\\n")
+            continue
+        state = {"stop": "paused", "cont": "running"}.get(command, state)
+        connection.sendall(b'{"return": {}}\\n')
+        if command in ("quit", "system_powerdown"):
+            os.unlink(path)
+            sys.exit(0)
+    connection.close()
+'''
+
+
+def write_stubs(directory):
+    """Write qemu-img and qemu-system-x86_64 into directory; returns the directory (put it first on PATH)."""
+    os.makedirs(directory, exist_ok=True)
+    for name, source in (("qemu-img", QEMU_IMG), ("qemu-system-x86_64", QEMU_SYSTEM)):
+        path = os.path.join(directory, name)
+        with open(path, "w") as f:
+            f.write(f"#!{sys.executable}\n{source.lstrip()}")
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return directory
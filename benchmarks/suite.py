@@ -0,0 +1,229 @@
+"""Benchmark registry, runner, result files and baseline comparison.
+
+A benchmark is a function taking a Bench; it prepares whatever it needs and
+calls bench(func, *args) once, which runs func for the warm-up and measured
+rounds (pytest-benchmark style). bench.pedantic() takes a per-round setup for
+operations that consume their input, such as stopping containers.
+
+Results are JSON: machine metadata plus, per benchmark, the round timings and
+min/max/mean/median/stddev/p95 in seconds. compare() matches benchmarks by
+name against a baseline file and flags a regression when the median grew by
+more than threshold (a fraction) and by more than min_delta seconds, so
+noise on sub-millisecond benchmarks does not fail a run.
+"""
+import datetime
+import fnmatch
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import telemetry
+
+REGISTRY = {}
+DEFAULT_THRESHOLD = 0.20
+DEFAULT_MIN_DELTA = 0.001
+
+
+class Benchmark:
+    """A registered benchmark function and its default round counts."""
+
+    def __init__(self, name, func, group, rounds, warmup, description):
+        self.name = name
+        self.func = func
+        self.group = group
+        self.rounds = rounds
+        self.warmup = warmup
+        self.description = description
+
+
+def benchmark(name, group=None, rounds=10, warmup=1):
+    """Register a benchmark function under name (e.g. "images.catalog_search")."""
+    def decorator(func):
+        if name in REGISTRY:
+            raise ValueError(f"Benchmark '{name}' is already registered.")
+        description = (func.__doc__ or "").strip().splitlines()[0] if func.__doc__ else ""
+        REGISTRY[name] = Benchmark(name, func, group or name.split(".", 1)[0], rounds, warmup, description)
+        return func
+    return decorator
+
+
+def select(patterns=None):
+    """Registered benchmarks whose name contains, or matches the shell pattern of, any of patterns."""
+    if not patterns:
+        return list(REGISTRY.values())
+    return [b for b in REGISTRY.values()
+            if any(p in b.name or fnmatch.fnmatchcase(b.name, p) for p in patterns)]
+
+
+class Bench:
+    """Passed to a benchmark function to time the operation under test."""
+
+    def __init__(self, rounds, warmup):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.timings = []
+        self.items = None
+        self.extra_info = {}
+
+    def __call__(self, func, *args, **kwargs):
+        """Time func(*args, **kwargs) for every round; returns the last result."""
+        return self.pedantic(func, args, kwargs)
+
+    def pedantic(self, func, args=(), kwargs=None, setup=None, teardown=None):
+        """Time func with setup() run before each round, untimed.
+
+        setup may return (args, kwargs) to call func with; teardown(result) runs
+        after each round, also untimed.
+        """
+        if self.timings:
+            raise RuntimeError("A benchmark may only time one operation.")
+        result = None
+        for index in range(self.warmup + self.rounds):
+            call_args, call_kwargs = args, kwargs or {}
+            if setup is not None:
+                prepared = setup()
+                if prepared is not None:
+                    call_args, call_kwargs = prepared
+            # Collect outside the timed region so one round does not pay for the garbage of the last
+            gc.collect()
+            start = time.perf_counter()
+            result = func(*call_args, **call_kwargs)
+            elapsed = time.perf_counter() - start
+            if teardown is not None:
+                teardown(result)
+            if index >= self.warmup:
+                self.timings.append(elapsed)
+        return result
+
+
+def _stats(timings, items):
+    ordered = sorted(timings)
+    median = statistics.median(ordered)
+    stats = {"rounds": len(ordered), "min": ordered[0], "max": ordered[-1], "mean": statistics.fmean(ordered),
+             "median": median, "stddev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+             "p95": telemetry.percentile(ordered, 0.95)}
+    if items:
+        stats["items"] = items
+        stats["items_per_second"] = items / median if median else None
+    return stats
+
+
+def run(benchmark_, rounds=None, warmup=None):
+    """Run one Benchmark and return its result dict (with "error" set if it raised)."""
+    bench = Bench(rounds or benchmark_.rounds, benchmark_.warmup if warmup is None else warmup)
+    result = {"name": benchmark_.name, "group": benchmark_.group, "description": benchmark_.description}
+    try:
+        benchmark_.func(bench)
+        if not bench.timings:
+            raise RuntimeError("The benchmark did not time anything.")
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    result["stats"] = _stats(bench.timings, bench.items)
+    result["timings"] = bench.timings
+    if bench.extra_info:
+        result["extra_info"] = bench.extra_info
+    return result
+
+
+def _git_commit():
+    try:
+        output = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def machine_info():
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "platform": platform.platform(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "commit": _git_commit(),
+            "datetime": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")}
+
+
+def run_all(benchmarks, rounds=None, warmup=None, on_result=None):
+    """Run benchmarks in order; returns the results document."""
+    results = []
+    for benchmark_ in benchmarks:
+        result = run(benchmark_, rounds, warmup)
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+    return {"machine_info": machine_info(), "benchmarks": results}
+
+
+def save(document, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(document, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(document, baseline, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """Compare median times with a baseline document.
+
+    Returns one dict per benchmark present in both with baseline, current,
+    ratio and status ("regression", "improvement" or "ok").
+    """
+    previous = {b["name"]: b["stats"] for b in baseline.get("benchmarks", []) if "stats" in b}
+    rows = []
+    for result in document["benchmarks"]:
+        if "stats" not in result or result["name"] not in previous:
+            continue
+        before, after = previous[result["name"]]["median"], result["stats"]["median"]
+        ratio = after / before if before else float("inf")
+        status = "ok"
+        if abs(after - before) > min_delta:
+            if ratio > 1 + threshold:
+                status = "regression"
+            elif ratio < 1 / (1 + threshold):
+                status = "improvement"
+        rows.append({"name": result["name"], "baseline": before, "current": after, "ratio": ratio,
+                     "status": status})
+    return rows
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.3f}"
+
+
+def format_result(result):
+    if "error" in result:
+        return f"{result['name']:<34} ERROR {result['error']}"
+    stats = result["stats"]
+    line = (f"{result['name']:<34} {_ms(stats['min']):>10} {_ms(stats['median']):>10} {_ms(stats['mean']):>10} "
+            f"{_ms(stats['stddev']):>10} {_ms(stats['p95']):>10} {stats['rounds']:>6}")
+    if stats.get("items_per_second"):
+        line += f" {stats['items_per_second']:>12,.0f}/s"
+    return line
+
+
+def header():
+    return (f"{'benchmark':<34} {'min ms':>10} {'median ms':>10} {'mean ms':>10} {'stddev ms':>10} "
+            f"{'p95 ms':>10} {'rounds':>6} {'throughput':>14}")
+
+
+def format_comparison(rows, threshold=DEFAULT_THRESHOLD):
+    lines = [f"{'benchmark':<34} {'baseline ms':>12} {'current ms':>12} {'change':>9}  status "
+             f"(threshold {threshold:.0%})"]
+    for row in rows:
+        change = f"{(row['ratio'] - 1) * 100:+.1f}%"
+        lines.append(f"{row['name']:<34} {_ms(row['baseline']):>12} {_ms(row['current']):>12} {change:>9}  "
+                     f"{row['status']}")
+    return "\n".join(lines)
+
+
+def print_progress(result, stream=sys.stdout):
+    print(format_result(result), file=stream, flush=True)
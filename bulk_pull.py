@@ -0,0 +1,213 @@
+"""Parallel pulling of many images with per-layer progress.
+
+Pulls go through the low-level API (client.api.pull with stream=True) so each
+layer's progress events can be reported as they arrive. Images whose exact
+reference is already present locally are skipped, and layers the daemon
+reports as "Already exists" are counted as shared rather than downloaded.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import telemetry
+
+logger = logging.getLogger("cms.registry")
+
+PULLED = "pulled"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class PullResult:
+    """Outcome and transfer statistics of one image pull."""
+
+    def __init__(self, reference):
+        self.reference = reference
+        self.status = None
+        self.bytes = 0
+        self.duration = 0.0
+        self.layers = 0
+        self.shared_layers = 0
+        self.error = None
+
+    @property
+    def throughput(self):
+        """Download rate in bytes per second."""
+        return self.bytes / self.duration if self.duration else 0.0
+
+    def as_dict(self):
+        return {"image": self.reference, "status": self.status, "bytes": self.bytes,
+                "seconds": round(self.duration, 3), "bytes_per_second": round(self.throughput),
+                "layers": self.layers, "shared_layers": self.shared_layers,
+                "error": str(self.error) if self.error else None}
+
+
+def read_manifest(path):
+    """Read image references from a JSON list or a text file with one reference per line."""
+    with open(path, 'r') as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        references = json.loads(content)
+    else:
+        references = [line.split("#", 1)[0].strip() for line in content.splitlines()]
+    return [ref for ref in references if ref]
+
+
+def parse_reference(reference):
+    """Split an image reference into (repository, tag_or_digest); tag defaults to latest."""
+    if "@" in reference:
+        repository, digest = reference.split("@", 1)
+        return repository, digest
+    name = reference.rsplit("/", 1)[-1]
+    if ":" in name:
+        repository, tag = reference.rsplit(":", 1)
+        return repository, tag
+    return reference, "latest"
+
+
+def is_present(client, reference):
+    """True if the exact reference (tag or digest) is already in the local image store."""
+    import docker
+    try:
+        client.images.get(reference)
+        return True
+    except docker.errors.ImageNotFound:
+        return False
+
+
+def pull_image(client, reference, skip_existing=True, progress=None, job=None):
+    """Pull one image, streaming layer events to progress(reference, layer, status, current, total)."""
+    with telemetry.measure("image.pull", target=reference) as span:
+        result = _pull_image(client, reference, skip_existing, progress, job)
+        span.add_bytes(result.bytes)
+        if result.status == FAILED:
+            span.outcome = telemetry.ERROR
+            span.error = str(result.error)[:500]
+    return result
+
+
+def _pull_image(client, reference, skip_existing, progress, job):
+    result = PullResult(reference)
+    start = time.monotonic()
+    try:
+        if skip_existing and is_present(client, reference):
+            result.status = SKIPPED
+            logger.info(f"Image {reference} already present, skipping pull.")
+            return result
+
+        repository, tag = parse_reference(reference)
+        layer_bytes = {}
+        layers = set()
+        shared = set()
+        for event in client.api.pull(repository, tag=tag, stream=True, decode=True):
+            if job is not None:
+                job.check_cancelled()
+            if "error" in event:
+                raise RuntimeError(event["error"])
+            layer = event.get("id")
+            status = event.get("status", "")
+            detail = event.get("progressDetail") or {}
+            if layer and status not in ("Pulling from", "Digest:", "Status:") and len(layer) == 12:
+                layers.add(layer)
+                if status == "Already exists":
+                    shared.add(layer)
+                elif status == "Downloading" and detail.get("total"):
+                    layer_bytes[layer] = detail["total"]
+            if progress is not None:
+                progress(reference, layer, status, detail.get("current"), detail.get("total"))
+
+        result.status = PULLED
+        result.bytes = sum(layer_bytes.values())
+        result.layers = len(layers)
+        result.shared_layers = len(shared)
+    except Exception as e:
+        result.status = FAILED
+        result.error = e
+        logger.error(f"Failed to pull image {reference}: {e}")
+        if job is not None:
+            job.check_cancelled()
+    finally:
+        result.duration = time.monotonic() - start
+    if result.status == PULLED:
+        logger.info(f"Pulled {reference}: {result.bytes} bytes, {result.layers} layers "
+                    f"({result.shared_layers} shared) in {result.duration:.2f} seconds "
+                    f"({result.throughput / 1e6:.2f} MB/s).")
+    return result
+
+
+def bulk_pull(client, references, concurrency=4, skip_existing=True, progress=None, on_result=None, job=None):
+    """Pull references in parallel and return their PullResults in input order.
+
+    Duplicate references are pulled once. on_result(result) is called as each pull finishes.
+    """
+    def pull(reference):
+        result = pull_image(client, reference, skip_existing, progress, job)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    unique = list(dict.fromkeys(references))
+    logger.info(f"Bulk pull of {len(unique)} images with concurrency {concurrency}.")
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="cms-pull") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, pull, ref) for ref in unique]
+        results = [future.result() for future in futures]
+    duration = time.monotonic() - start
+    total = sum(r.bytes for r in results)
+    logger.info(f"Bulk pull finished in {duration:.2f} seconds: "
+                f"{sum(r.status == PULLED for r in results)} pulled, "
+                f"{sum(r.status == SKIPPED for r in results)} skipped, "
+                f"{sum(r.status == FAILED for r in results)} failed, {total} bytes.")
+    return results
+
+
+class PullProgress:
+    """Thread-safe per-image progress state, filled by pull callbacks and read by a view."""
+
+    def __init__(self, references=()):
+        self._lock = threading.Lock()
+        self.images = {ref: {"status": "queued", "layers": {}, "started": None} for ref in references}
+
+    def __call__(self, reference, layer, status, current, total):
+        with self._lock:
+            state = self.images.setdefault(reference, {"status": "queued", "layers": {}, "started": None})
+            if state["started"] is None:
+                state["started"] = time.monotonic()
+            state["status"] = "pulling"
+            if layer and len(layer) == 12:
+                # [last status, bytes downloaded, layer size]
+                entry = state["layers"].setdefault(layer, [status, 0, 0])
+                entry[0] = status
+                if status == "Downloading":
+                    entry[1] = current or entry[1]
+                    entry[2] = total or entry[2]
+                elif status == "Download complete":
+                    entry[1] = entry[2]
+
+    def finish(self, result):
+        with self._lock:
+            state = self.images.setdefault(result.reference, {"status": "queued", "layers": {}, "started": None})
+            state["status"] = result.status
+            state["result"] = result
+
+    def snapshot(self):
+        """Return rows of (reference, status, layers done, layers total, bytes, bytes per second)."""
+        rows = []
+        now = time.monotonic()
+        with self._lock:
+            for ref, state in self.images.items():
+                layers = state["layers"]
+                done = sum(1 for status, _, _ in layers.values()
+                           if status in ("Pull complete", "Already exists"))
+                result = state.get("result")
+                if result is not None:
+                    received, rate = result.bytes, result.throughput
+                else:
+                    received = sum(downloaded for _, downloaded, _ in layers.values())
+                    elapsed = now - state["started"] if state["started"] else 0
+                    rate = received / elapsed if elapsed else 0.0
+                rows.append((ref, state["status"], done, len(layers), received, rate))
+        return rows
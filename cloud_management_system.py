@@ -1,23 +1,54 @@
 import tkinter as tk
-from tkinter import messagebox, filedialog
+from tkinter import messagebox, filedialog, simpledialog, ttk
 import os
-import subprocess
-import docker
 import json
 from datetime import datetime
 import logging
+import queue
 import time
 
-# Initialize Logger
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='cloud_management_system.log',
-    filemode='a'
-)
+import docker
+
+import batch_containers
+import bulk_pull
+import cms_core
+import dockerfile_lint
+import dockerfile_templates
+import history_store
+import image_browser
+import reclaim
+import registry_search
+import telemetry
+import vm_manager
+from virtual_treeview import VirtualTreeview
+from job_executor import JobExecutor, JobQueueFull, JobCancelled, FINISHED_STATES
+
+# Main window, created in main()
+root = None
+
+# Background executor for blocking Docker and QEMU operations
+jobs = JobExecutor(max_workers=4, max_queue=32)
+
+# Background disk reclamation started from the Reclaim Disk Space window
+reclaimer = None
+
+
+def submit_job(job_name, func, *args, on_success=None, on_error=None, **kwargs):
+    """Submit a job to the background executor, reporting a full queue to the user.
+
+    kwargs go to func, so they may include name (e.g. the VM name).
+    """
+    try:
+        return jobs.submit(job_name, func, *args, on_success=on_success, on_error=on_error, **kwargs)
+    except JobQueueFull as e:
+        messagebox.showerror("Busy", f"Cannot start '{job_name}': {e}")
+        return None
+
 
-# Initialize Docker client
-docker_client = docker.from_env()
+def pump_jobs():
+    """Deliver finished job results to the GUI; reschedules itself on the Tk loop."""
+    jobs.process_callbacks()
+    root.after(100, pump_jobs)
 
 def create_vm_gui():
     logging.info("Create VM GUI function initiated.")
@@ -33,12 +64,24 @@ def create_vm_gui():
             cpu_entry.config(state="normal")
             memory_entry.config(state="normal")
             disk_size_entry.config(state="disabled")
+            base_combo.config(state="disabled")
             logging.info("Existing image option selected. Enabled existing image fields.")
+
+        elif selected_option == "base":
+            # Overlay on a pool base image: only the base choice, CPU and memory apply
+            existing_image_entry.config(state="disabled")
+            browse_button.config(state="disabled")
+            cpu_entry.config(state="normal")
+            memory_entry.config(state="normal")
+            disk_size_entry.config(state="disabled")
+            base_combo.config(state="readonly")
+            logging.info("Base image option selected. Enabled base image fields.")
         
         elif selected_option == "new":
             # Enable new configuration fields, disable existing image fields
             existing_image_entry.config(state="disabled")
             browse_button.config(state="disabled")
+            base_combo.config(state="disabled")
             cpu_entry.config(state="normal")
             memory_entry.config(state="normal")
             disk_size_entry.config(state="normal")
@@ -69,13 +112,11 @@ def create_vm_gui():
         """Load configuration file and populate input fields."""
         config_file = config_var.get()
         try:
-            with open(config_file, 'r') as f:
-                config = json.load(f)
-                # Populate fields based on the config file
-                cpu_var.set(config.get("cpu", ""))
-                memory_var.set(config.get("memory", ""))
-                disk_size_var.set(config.get("disk_size", ""))
-                logging.info(f"Loaded configuration values from {config_file}: {config}")
+            config = cms_core.load_vm_config(config_file)
+            # Populate fields based on the config file
+            cpu_var.set(config.get("cpu", ""))
+            memory_var.set(config.get("memory", ""))
+            disk_size_var.set(config.get("disk_size", ""))
         except FileNotFoundError:
             logging.error(f"Configuration file not found: {config_file}")
             messagebox.showerror("Error", "Configuration file not found.")
@@ -89,58 +130,46 @@ def create_vm_gui():
             messagebox.showerror("Error", f"Failed to load configuration file: {e}")
             
         
+    def vm_options():
+        return {"name": name_var.get().strip() or None, "kvm": kvm_var.get(), "cache": cache_var.get(),
+                "aio": aio_var.get(), "hugepages": hugepages_var.get()}
+
+    def report_vm_started(vm):
+        accel = "KVM" if vm.accelerated else "TCG"
+        messagebox.showinfo("Success", f"VM {vm.name} started ({accel}, pid {vm.pid}) "
+                                       f"in {vm.launch_seconds:.2f} seconds.")
+
     def create_vm():
         try:
-            start_time = time.time()
+            cpu = cpu_var.get()
+            memory = memory_var.get()
             if option_var.get() == "existing":
                 image_path = existing_image_var.get()
                 if not os.path.exists(image_path):
                     messagebox.showerror("Error", "Selected image file does not exist.")
                     logging.error(f"Image file does not exist: {image_path}")
                     return
+                cms_core.validate_vm_settings(cpu, memory)
 
-                # Fetch CPU and memory values from GUI fields
-                cpu = cpu_var.get()
-                memory = memory_var.get()
+                # Start QEMU with user-specified CPU and memory in the background
+                submit_job(f"VM {os.path.basename(image_path)}", cms_core.create_vm, cpu, memory,
+                           image_path=image_path, on_success=report_vm_started, on_error=report_vm_error,
+                           **vm_options())
 
-                # Validate CPU and memory inputs
-                if not cpu.isdigit() or int(cpu) <= 0:
-                    logging.error("Invalid CPU count entered.")
-                    messagebox.showerror("Error", "Invalid CPU count.")
-                    return
-                if not memory.isdigit() or int(memory) <= 0:
-                    logging.error("Invalid memory size entered.")
-                    messagebox.showerror("Error", "Invalid memory size.")
+            elif option_var.get() == "base":
+                base_image = base_var.get()
+                if not base_image:
+                    messagebox.showerror("Error", "No base image selected.")
                     return
+                cms_core.validate_vm_settings(cpu, memory)
 
-                # Run QEMU command with user-specified CPU and memory
-                command = f"qemu-system-x86_64 -m {memory}M -smp cpus={cpu} -hda {image_path} -boot c"
-                logging.info(f"Running QEMU command: {command}")
-                os.system(command)
-
-                end_time = time.time()  # Record the end time
-                duration = end_time - start_time  # Calculate the duration
-                logging.info(f"Existing image VM creation completed in {duration:.2f} seconds.")  # Log the duration
-                messagebox.showinfo("Success", f"Existing image VM created successfully in {duration:.2f} seconds.")
+                # Thin copy-on-write overlay; the base image is never modified
+                submit_job(f"VM from base {base_image}", cms_core.create_vm, cpu, memory, base_image=base_image,
+                           on_success=report_vm_started, on_error=report_vm_error, **vm_options())
 
             elif option_var.get() == "new":
-                cpu = cpu_var.get()
-                memory = memory_var.get()
                 disk_size = disk_size_var.get()
-
-                # Validate inputs
-                if not cpu.isdigit() or int(cpu) <= 0:
-                    logging.error("Invalid CPU count entered.")
-                    messagebox.showerror("Error", "Invalid CPU count.")
-                    return
-                if not memory.isdigit() or int(memory) <= 0:
-                    logging.error("Invalid memory size entered.")
-                    messagebox.showerror("Error", "Invalid memory size.")
-                    return
-                if not disk_size.isdigit() or int(disk_size) <= 0:
-                    logging.error("Invalid memory size entered.")
-                    messagebox.showerror("Error", "Invalid disk size.")
-                    return
+                cms_core.validate_vm_settings(cpu, memory, disk_size)
 
                 # Prompt the user to select a save location for the disk image
                 save_path = filedialog.asksaveasfilename(
@@ -154,30 +183,28 @@ def create_vm_gui():
                     messagebox.showerror("Error", "No save location selected.")
                     return
 
-                # Create disk image at the selected location
-                logging.info(f"Creating disk image at {save_path} with size {disk_size}MB.")
-                os.system(f"qemu-img create -f qcow2 {save_path} {disk_size}M")
-
-                # Prompt for ISO file
+                # Prompt for ISO file before starting, so the job needs no further input
                 iso_path = filedialog.askopenfilename(title="Select Boot ISO", filetypes=[("ISO Files", "*.iso")])
                 if not iso_path:
                     logging.warning("No ISO file selected.")
                     messagebox.showerror("Error", "No ISO file selected.")
                     return
 
-                # Run QEMU command to create a new VM
-                command = f"qemu-system-x86_64 -m {memory}M -smp cpus={cpu} -hda {save_path} -cdrom {iso_path} -boot d"
-                logging.info(f"Running QEMU command to create new VM: {command}")
-                os.system(command)
-
-                end_time = time.time()  # Record the end time
-                duration = end_time - start_time  # Calculate the duration
-                logging.info(f"VM creation completed in {duration:.2f} seconds.")  # Log the duration
-                messagebox.showinfo("Success", f"VM created successfully in {duration:.2f} seconds.")
+                submit_job(f"New VM {os.path.basename(save_path)}", cms_core.create_vm, cpu, memory,
+                           disk_size=disk_size, disk_path=save_path, iso_path=iso_path,
+                           on_success=report_vm_started, on_error=report_vm_error, **vm_options())
 
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
         except Exception as e:
-            logging.error(f"Failed to create VM: {e}")
-            messagebox.showerror("Error", f"Failed to create VM: {e}")
+            report_vm_error(e)
+
+    def report_vm_error(e):
+        if isinstance(e, JobCancelled):
+            logging.info(f"VM job cancelled: {e}")
+            return
+        logging.error(f"Failed to create VM: {e}")
+        messagebox.showerror("Error", f"Failed to create VM: {e}")
 
 
 
@@ -188,8 +215,10 @@ def create_vm_gui():
     # Option selection
     option_var = tk.StringVar(value="existing")
     tk.Label(vm_window, text="Choose VM Creation Option:").pack(anchor="w")
-    tk.Radiobutton(vm_window, text="Use Existing Image", variable=option_var, value="existing", command=handle_option_selection).pack(anchor="w")
-    tk.Radiobutton(vm_window, text="Create New VM", variable=option_var, value="new", command=handle_option_selection).pack(anchor="w")
+    for text, value in (("Use Existing Image", "existing"), ("Overlay on Base Image (copy-on-write)", "base"),
+                        ("Create New VM", "new")):
+        tk.Radiobutton(vm_window, text=text, variable=option_var, value=value,
+                       command=handle_option_selection).pack(anchor="w")
 
     # Existing image fields
     tk.Label(vm_window, text="Existing Image Path:").pack(anchor="w")
@@ -199,6 +228,13 @@ def create_vm_gui():
     browse_button = tk.Button(vm_window, text="Browse", command=browse_image)
     browse_button.pack()
 
+    # Base image pool selection
+    tk.Label(vm_window, text="Base Image:").pack(anchor="w")
+    base_var = tk.StringVar()
+    base_combo = ttk.Combobox(vm_window, textvariable=base_var, values=sorted(cms_core.get_image_pool().bases()),
+                              state="disabled")
+    base_combo.pack(fill="x")
+
     # Configuration file selection
     config_var = tk.StringVar()
     tk.Label(vm_window, text="Configuration File (Optional):").pack(anchor="w")
@@ -223,12 +259,169 @@ def create_vm_gui():
     disk_size_entry = tk.Entry(vm_window, textvariable=disk_size_var, state="disabled")
     disk_size_entry.pack()
 
+    # Performance options
+    tk.Label(vm_window, text="VM Name (Optional):").pack(anchor="w")
+    name_var = tk.StringVar()
+    tk.Entry(vm_window, textvariable=name_var).pack()
+
+    kvm_var = tk.BooleanVar(value=vm_manager.kvm_available())
+    tk.Checkbutton(vm_window, text="KVM Acceleration", variable=kvm_var,
+                   state="normal" if vm_manager.kvm_available() else "disabled").pack(anchor="w")
+    hugepages_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(vm_window, text="Hugepages Memory", variable=hugepages_var).pack(anchor="w")
+
+    tk.Label(vm_window, text="Disk Cache Mode:").pack(anchor="w")
+    cache_var = tk.StringVar(value="none")
+    ttk.Combobox(vm_window, textvariable=cache_var, values=vm_manager.CACHE_MODES, state="readonly").pack()
+
+    tk.Label(vm_window, text="Disk AIO Mode:").pack(anchor="w")
+    aio_var = tk.StringVar(value="native")
+    ttk.Combobox(vm_window, textvariable=aio_var, values=vm_manager.AIO_MODES, state="readonly").pack()
+
     # Create VM button
     create_button = tk.Button(vm_window, text="Create VM", command=create_vm)
     create_button.pack()
 
 
+def manage_vms():
+    """List VMs started by the manager and control them over QMP."""
+    logging.info("VM manager window opened.")
+    manager = cms_core.get_vm_manager()
+
+    vms_window = tk.Toplevel(root)
+    vms_window.title("Virtual Machines")
+
+    columns = ("name", "status", "pid", "cpu", "memory", "accel", "disk")
+    tree = ttk.Treeview(vms_window, columns=columns, show="headings", height=10)
+    for column, heading, width in zip(columns, ("Name", "Status", "PID", "CPUs", "Memory (MB)", "Accel", "Disk"),
+                                      (140, 90, 70, 50, 90, 60, 300)):
+        tree.heading(column, text=heading)
+        tree.column(column, width=width)
+    tree.grid(row=0, column=0, columnspan=6, sticky="nsew")
+
+    def load_rows():
+        return [(vm, manager.status(vm.name)) for vm in manager.list()]
+
+    def show_rows(rows):
+        if not vms_window.winfo_exists():
+            return
+        tree.delete(*tree.get_children())
+        for vm, status in rows:
+            tree.insert("", "end", iid=vm.name, values=(vm.name, status, vm.pid, vm.cpu, vm.memory,
+                                                        "KVM" if vm.accelerated else "TCG", vm.disk))
+
+    def refresh():
+        submit_job("List VMs", load_rows, on_success=show_rows, on_error=report_error)
+
+    def report_error(e):
+        if isinstance(e, JobCancelled):
+            return
+        logging.error(f"VM operation failed: {e}")
+        messagebox.showerror("Error", f"VM operation failed: {e}")
+
+    def run_action(label, action):
+        for name in tree.selection():
+            submit_job(f"{label} VM {name}", action, name, on_success=lambda _: refresh(), on_error=report_error)
+
+    for column, (label, action) in enumerate([("Refresh", None), ("Pause", manager.pause),
+                                              ("Resume", manager.resume), ("Shutdown", manager.shutdown),
+                                              ("Force Stop", manager.kill), ("Remove", manager.remove)]):
+        command = refresh if action is None else (lambda label=label, action=action: run_action(label, action))
+        tk.Button(vms_window, text=label, command=command).grid(row=1, column=column)
+    refresh()
+
+
+def manage_image_pool():
+    """Manage golden base images and the copy-on-write overlays created from them."""
+    logging.info("Image pool window opened.")
+    pool = cms_core.get_image_pool()
+
+    pool_window = tk.Toplevel(root)
+    pool_window.title("Base Images and Overlays")
+
+    tk.Label(pool_window, text="Base Images:").grid(row=0, column=0, columnspan=4, sticky="w")
+    bases_tree = ttk.Treeview(pool_window, columns=("name", "overlays", "path"), show="headings", height=6)
+    for column, heading, width in (("name", "Name", 160), ("overlays", "Overlays", 70), ("path", "Path", 380)):
+        bases_tree.heading(column, text=heading)
+        bases_tree.column(column, width=width)
+    bases_tree.grid(row=1, column=0, columnspan=4, sticky="nsew")
+
+    tk.Label(pool_window, text="Overlays:").grid(row=3, column=0, columnspan=4, sticky="w")
+    overlays_tree = ttk.Treeview(pool_window, columns=("name", "base", "path"), show="headings", height=8)
+    for column, heading, width in (("name", "Name", 160), ("base", "Base", 140), ("path", "Path", 310)):
+        overlays_tree.heading(column, text=heading)
+        overlays_tree.column(column, width=width)
+    overlays_tree.grid(row=4, column=0, columnspan=4, sticky="nsew")
+
+    def refresh():
+        if not pool_window.winfo_exists():
+            return
+        bases_tree.delete(*bases_tree.get_children())
+        for name, info in sorted(pool.bases().items()):
+            bases_tree.insert("", "end", iid=name, values=(name, len(info["overlays"]), info["path"]))
+        overlays_tree.delete(*overlays_tree.get_children())
+        for name, info in sorted(pool.overlays().items()):
+            overlays_tree.insert("", "end", iid=name, values=(name, info["base"], info["path"]))
+
+    def report_error(e):
+        if isinstance(e, JobCancelled):
+            return
+        logging.error(f"Image pool operation failed: {e}")
+        messagebox.showerror("Error", f"Image pool operation failed: {e}")
+
+    def add_base():
+        source = filedialog.askopenfilename(title="Select Base Image", filetypes=[("QCOW2 Files", "*.qcow2")])
+        if source:
+            submit_job(f"Add base {os.path.basename(source)}", pool.add_base, source,
+                       on_success=lambda _: refresh(), on_error=report_error)
+
+    def remove_base():
+        for name in bases_tree.selection():
+            submit_job(f"Remove base {name}", pool.remove_base, name, on_success=lambda _: refresh(),
+                       on_error=report_error)
+
+    def timed_overlay(base, name):
+        start_time = time.time()
+        pool.create_overlay(base, name)
+        return name, time.time() - start_time
+
+    def report_overlay(result):
+        name, seconds = result
+        refresh()
+        messagebox.showinfo("Success", f"Overlay {name} created in {seconds:.3f} seconds.")
+
+    def create_overlay():
+        for base in bases_tree.selection():
+            name = f"{base}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+            submit_job(f"Create overlay {name}", timed_overlay, base, name, on_success=report_overlay,
+                       on_error=report_error)
+
+    def discard_overlay():
+        selection = overlays_tree.selection()
+        if selection and messagebox.askyesno("Discard Overlays",
+                                             f"Delete {len(selection)} overlay(s) and their changes?"):
+            for name in selection:
+                submit_job(f"Discard overlay {name}", cms_core.discard_overlay, name,
+                           on_success=lambda _: refresh(), on_error=report_error)
+
+    def commit_overlay(to_new_base):
+        for name in overlays_tree.selection():
+            new_base = f"{name}-base" if to_new_base else None
+            submit_job(f"Commit overlay {name}", cms_core.commit_overlay, name, new_base=new_base,
+                       on_success=lambda _: refresh(), on_error=report_error)
+
+    tk.Button(pool_window, text="Add Base Image", command=add_base).grid(row=2, column=0)
+    tk.Button(pool_window, text="Remove Base", command=remove_base).grid(row=2, column=1)
+    tk.Button(pool_window, text="New Overlay", command=create_overlay).grid(row=2, column=2)
+    tk.Button(pool_window, text="Refresh", command=refresh).grid(row=2, column=3)
+    tk.Button(pool_window, text="Discard Overlay", command=discard_overlay).grid(row=5, column=0)
+    tk.Button(pool_window, text="Commit to Base", command=lambda: commit_overlay(False)).grid(row=5, column=1)
+    tk.Button(pool_window, text="Save as New Base", command=lambda: commit_overlay(True)).grid(row=5, column=2)
+    refresh()
+
+
 def create_dockerfile():
+    """Dockerfile editor with templates and build-performance analysis that re-runs as the user types."""
     logging.info("Create Dockerfile function initiated.")
     path = filedialog.askdirectory(title="Select Directory to Save Dockerfile")
     if not path:
@@ -236,30 +429,125 @@ def create_dockerfile():
         messagebox.showwarning("No Directory Selected", "No directory was selected to save the Dockerfile.")
         return
 
+    analyzer = dockerfile_lint.Analyzer()
+    # (files, bytes, has_dockerignore) of the build context, measured once in the background
+    context = None
+    pending = None
+
     def submit_dockerfile():
-        content = text.get("1.0", "end").strip()
-        dockerfile_path = os.path.join(path, "Dockerfile")
+        content = text.get("1.0", "end").strip() + "\n"
         start_time = time.time()  # Record the start time
         try:
-            with open(dockerfile_path, 'w') as dockerfile:
-                dockerfile.write(content)
-            end_time = time.time()  # Record the end time
-            duration = end_time - start_time  # Calculate the duration
+            dockerfile_path = cms_core.create_dockerfile(path, content)
+            duration = time.time() - start_time  # Calculate the duration
             logging.info(f"Dockerfile created at {dockerfile_path} in {duration:.2f} seconds.")
             messagebox.showinfo("Success", f"Dockerfile created at {dockerfile_path} in {duration:.2f} seconds.")
         except Exception as e:
             logging.error(f"Failed to create Dockerfile: {e}")
             messagebox.showerror("Error", f"Failed to create Dockerfile: {e}")
+            return
         dockerfile_window.destroy()
 
-    dockerfile_window = tk.Toplevel(root)
-    dockerfile_window.title("Create Dockerfile")
+    def analyze():
+        nonlocal pending
+        pending = None
+        analysis = analyzer.analyze(text.get("1.0", "end"), context)
+        findings_tree.delete(*findings_tree.get_children())
+        for severity in (dockerfile_lint.ERROR, dockerfile_lint.WARNING, dockerfile_lint.INFO):
+            text.tag_remove(severity, "1.0", "end")
+        for index, finding in enumerate(analysis.findings):
+            findings_tree.insert("", "end", iid=str(index), values=(finding.line or "", finding.severity,
+                                                                    finding.rule, finding.message))
+            if finding.line:
+                text.tag_add(finding.severity, f"{finding.line}.0", f"{finding.line}.end")
+        summary_label.config(text=analysis.summary())
+
+    def on_modified(_event=None):
+        # Re-analyze once typing pauses instead of on every keystroke
+        nonlocal pending
+        text.edit_modified(False)
+        if pending is not None:
+            dockerfile_window.after_cancel(pending)
+        pending = dockerfile_window.after(300, analyze)
+
+    def on_context(stats):
+        nonlocal context
+        context = stats
+        if dockerfile_window.winfo_exists():
+            analyze()
+
+    def load_template():
+        name = template_var.get()
+        if not name:
+            return
+        if text.get("1.0", "end").strip() and not messagebox.askyesno(
+                "Replace Dockerfile", "Replace the current text with the template?", parent=dockerfile_window):
+            return
+        text.delete("1.0", "end")
+        text.insert("1.0", dockerfile_templates.template(name))
+
+    def add_dockerignore():
+        try:
+            ignore_path = cms_core.create_dockerignore(path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to create .dockerignore: {e}", parent=dockerfile_window)
+            return
+        messagebox.showinfo("Success", f"Created {ignore_path}", parent=dockerfile_window)
+        submit_job("Measure build context", cms_core.build_context_stats, path, on_success=on_context)
+
+    def goto_finding(_event=None):
+        for iid in findings_tree.selection():
+            line = findings_tree.item(iid, "values")[0]
+            if line:
+                text.see(f"{line}.0")
+                text.mark_set("insert", f"{line}.0")
+                text.focus_set()
 
-    text = tk.Text(dockerfile_window, width=50, height=15)
-    text.grid(row=0, column=0)
+    dockerfile_window = tk.Toplevel(root)
+    dockerfile_window.title(f"Dockerfile Editor - {path}")
+
+    toolbar = tk.Frame(dockerfile_window)
+    toolbar.grid(row=0, column=0, columnspan=2, sticky="w")
+    tk.Label(toolbar, text="Template:").pack(side=tk.LEFT)
+    template_var = tk.StringVar()
+    ttk.Combobox(toolbar, textvariable=template_var, values=sorted(dockerfile_templates.TEMPLATES),
+                 state="readonly", width=12).pack(side=tk.LEFT)
+    tk.Button(toolbar, text="Load Template", command=load_template).pack(side=tk.LEFT)
+    tk.Button(toolbar, text="Add .dockerignore", command=add_dockerignore).pack(side=tk.LEFT)
+
+    text = tk.Text(dockerfile_window, width=90, height=22, undo=True, font=("TkFixedFont",))
+    text.grid(row=1, column=0, sticky="nsew")
+    scrollbar = ttk.Scrollbar(dockerfile_window, orient="vertical", command=text.yview)
+    scrollbar.grid(row=1, column=1, sticky="ns")
+    text.config(yscrollcommand=scrollbar.set)
+    text.tag_configure(dockerfile_lint.ERROR, background="#f8d0d0")
+    text.tag_configure(dockerfile_lint.WARNING, background="#fff0b3")
+    text.tag_configure(dockerfile_lint.INFO, underline=True)
+
+    findings_tree = ttk.Treeview(dockerfile_window, columns=("line", "severity", "rule", "message"),
+                                 show="headings", height=7)
+    for column, heading, width in (("line", "Line", 50), ("severity", "Severity", 70), ("rule", "Rule", 100),
+                                   ("message", "Message", 560)):
+        findings_tree.heading(column, text=heading)
+        findings_tree.column(column, width=width)
+    findings_tree.grid(row=2, column=0, columnspan=2, sticky="nsew")
+    findings_tree.bind("<<TreeviewSelect>>", goto_finding)
+    summary_label = tk.Label(dockerfile_window, text="", anchor="w")
+    summary_label.grid(row=3, column=0, columnspan=2, sticky="w")
+    dockerfile_window.rowconfigure(1, weight=1)
+    dockerfile_window.columnconfigure(0, weight=1)
 
     submit_button = tk.Button(dockerfile_window, text="Submit", command=submit_dockerfile)
-    submit_button.grid(row=1, column=0)
+    submit_button.grid(row=4, column=0, columnspan=2)
+
+    existing = os.path.join(path, "Dockerfile")
+    if os.path.exists(existing):
+        with open(existing) as f:
+            text.insert("1.0", f.read())
+    text.edit_modified(False)
+    text.bind("<<Modified>>", on_modified)
+    analyze()
+    submit_job("Measure build context", cms_core.build_context_stats, path, on_success=on_context)
 
 
 def build_docker_image():
@@ -273,18 +561,56 @@ def build_docker_image():
     def submit_build():
         image_name = image_name_entry.get()
         tag = tag_entry.get()
-        logging.debug(f"Building image with name: {image_name} and tag: {tag}")
-        try:
-            docker_client.images.build(path=dockerfile_path, tag=f"{image_name}:{tag}")
-            logging.info(f"Docker image {image_name}:{tag} built successfully.")
-            messagebox.showinfo("Success", f"Docker image {image_name}:{tag} built successfully.")
-        except docker.errors.BuildError as e:
-            logging.error(f"Build failed: {e}")
-            messagebox.showerror("Build Error", f"Build failed: {e}")
-        except Exception as e:
-            logging.error(f"Failed to build image: {e}")
-            messagebox.showerror("Error", f"Failed to build image: {e}")
+        cache_from = cache_from_entry.get().split()
+        cache_to = cache_to_entry.get().strip() or None
+        log_lines = queue.SimpleQueue()
+
+        def on_success(report):
+            messagebox.showinfo("Success", report.summary())
+
+        def on_error(e):
+            if isinstance(e, JobCancelled):
+                return
+            if isinstance(e, RuntimeError):
+                logging.error(f"Build failed: {e}")
+                messagebox.showerror("Build Error", f"Build failed: {e}")
+            else:
+                logging.error(f"Failed to build image: {e}")
+                messagebox.showerror("Error", f"Failed to build image: {e}")
+
+        job = submit_job(f"Build {image_name}:{tag}", cms_core.build_docker_image, dockerfile_path, image_name, tag,
+                         buildkit=buildkit_var.get(), cache_from=cache_from, cache_to=cache_to,
+                         on_log=log_lines.put, on_success=on_success, on_error=on_error)
         build_window.destroy()
+        if job is not None:
+            show_build_log(job, log_lines)
+
+    def show_build_log(job, log_lines):
+        log_window = tk.Toplevel(root)
+        log_window.title(f"Build Log - {job.name}")
+        log_text = tk.Text(log_window, width=110, height=30)
+        log_text.grid(row=0, column=0, sticky="nsew")
+        scrollbar = tk.Scrollbar(log_window, command=log_text.yview)
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        log_text.config(yscrollcommand=scrollbar.set)
+        tk.Button(log_window, text="Cancel Build", command=lambda: jobs.cancel(job.id)).grid(row=1, column=0)
+
+        def drain():
+            if not log_window.winfo_exists():
+                return
+            lines = []
+            while True:
+                try:
+                    lines.append(log_lines.get_nowait())
+                except queue.Empty:
+                    break
+            if lines:
+                log_text.insert("end", "\n".join(lines) + "\n")
+                log_text.see("end")
+            if job.status not in FINISHED_STATES or not log_lines.empty():
+                log_window.after(100, drain)
+
+        drain()
 
     build_window = tk.Toplevel(root)
     build_window.title("Build Docker Image")
@@ -297,39 +623,182 @@ def build_docker_image():
     tag_entry = tk.Entry(build_window)
     tag_entry.grid(row=1, column=1)
 
+    buildkit_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(build_window, text="Use BuildKit", variable=buildkit_var).grid(row=2, column=0, columnspan=2)
+
+    tk.Label(build_window, text="Cache From (optional):").grid(row=3, column=0)
+    cache_from_entry = tk.Entry(build_window)
+    cache_from_entry.grid(row=3, column=1)
+
+    tk.Label(build_window, text="Cache To (BuildKit only):").grid(row=4, column=0)
+    cache_to_entry = tk.Entry(build_window)
+    cache_to_entry.grid(row=4, column=1)
+
     submit_button = tk.Button(build_window, text="Submit", command=submit_build)
-    submit_button.grid(row=2, column=0, columnspan=2)
+    submit_button.grid(row=5, column=0, columnspan=2)
 
 
 def list_docker_images():
+    """Browse local images with daemon-side filters, sortable columns and reclaimable space."""
     logging.info("Listing Docker images.")
-    try:
-        images = docker_client.images.list()
-        image_list = "\n".join([", ".join(image.tags) for image in images if image.tags])
-        logging.debug(f"Found Docker images: {image_list}")
-        messagebox.showinfo("Docker Images", image_list if image_list else "No images found.")
-    except Exception as e:
+    browser_window = tk.Toplevel(root)
+    browser_window.title("Docker Images")
+    state = {"records": [], "sort": "created", "reverse": False}
+
+    filter_frame = tk.Frame(browser_window)
+    filter_frame.grid(row=0, column=0, sticky="ew")
+    entries = {}
+    for column, (key, label) in enumerate((("reference", "Reference:"), ("label", "Label:"),
+                                           ("since", "Since:"), ("before", "Before:"))):
+        tk.Label(filter_frame, text=label).grid(row=0, column=2 * column, sticky="w")
+        entries[key] = tk.Entry(filter_frame, width=16)
+        entries[key].grid(row=0, column=2 * column + 1)
+    dangling_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(filter_frame, text="Dangling only", variable=dangling_var).grid(row=0, column=8)
+
+    columns = ("id", "tags", "size", "created", "containers")
+    view = VirtualTreeview(browser_window, columns, ("Image ID", "Tags", "Size", "Created", "Used By"),
+                           (110, 320, 90, 120, 70), height=25, on_sort=lambda column: sort_by(column),
+                           anchors={"size": "e", "containers": "e"})
+    view.grid(row=1, column=0, sticky="nsew")
+    status_label = tk.Label(browser_window, text="Loading...", anchor="w")
+    status_label.grid(row=2, column=0, sticky="ew")
+    browser_window.columnconfigure(0, weight=1)
+    browser_window.rowconfigure(1, weight=1)
+
+    def show():
+        records = image_browser.sort_images(state["records"], state["sort"], state["reverse"])
+        now = time.time()
+        view.set_rows([(r.short_id, ", ".join(r.tags) or "<none>", image_browser.format_size(r.size),
+                        image_browser.format_age(r.age(now)), r.containers if r.containers >= 0 else "")
+                       for r in records], keys=[r.id for r in records])
+
+    def sort_by(column):
+        key = {"tags": "tag", "size": "size", "created": "created"}.get(column)
+        if key is None:
+            return
+        state["reverse"] = not state["reverse"] if state["sort"] == key else False
+        state["sort"] = key
+        show()
+
+    def on_success(outcome):
+        records, usage = outcome
+        if not browser_window.winfo_exists():
+            return
+        state["records"] = records
+        show()
+        status_label.config(text=f"{len(records)} images, {image_browser.format_size(sum(r.size for r in records))}."
+                                 f"  Image store: {image_browser.format_size(usage['size'])}, "
+                                 f"{image_browser.format_size(usage['reclaimable'])} reclaimable "
+                                 f"({usage['active']} of {usage['images']} images in use).")
+
+    def on_error(e):
         logging.error(f"Failed to list Docker images: {e}")
         messagebox.showerror("Error", f"Failed to list Docker images: {e}")
 
+    def load(reference, label, since, before, dangling):
+        records = cms_core.browse_images(reference=reference, label=label, since=since, before=before,
+                                         dangling=dangling)
+        return records, cms_core.image_disk_usage()
+
+    def refresh():
+        status_label.config(text="Loading...")
+        values = {key: entry.get().strip() or None for key, entry in entries.items()}
+        submit_job("List images", load, dangling=True if dangling_var.get() else None, on_success=on_success,
+                   on_error=on_error, **values)
+
+    def inspect_selected():
+        for image_id in view.selection():
+            inspect_image_layers(image_id)
+
+    tk.Button(filter_frame, text="Apply Filters", command=refresh).grid(row=0, column=9)
+    tk.Button(filter_frame, text="Inspect Layers", command=inspect_selected).grid(row=0, column=10)
+    refresh()
+
+
+def inspect_image_layers(reference=None):
+    """Per-layer sizes, creating instructions, shared layers and largest files of one image."""
+    if reference is None:
+        reference = simpledialog.askstring("Inspect Image", "Image name or ID:", parent=root)
+        if not reference:
+            return
+    logging.info(f"Inspecting layers of {reference}.")
+    inspect_window = tk.Toplevel(root)
+    inspect_window.title(f"Layers of {reference}")
+
+    columns = ("size", "wasted", "shared", "instruction")
+    tree = ttk.Treeview(inspect_window, columns=columns, height=22)
+    tree.heading("#0", text="#")
+    tree.column("#0", width=70)
+    for column, heading, width in (("size", "Size", 90), ("wasted", "Wasted", 90), ("shared", "Shared With", 180),
+                                   ("instruction", "Created By / File", 520)):
+        tree.heading(column, text=heading)
+        tree.column(column, width=width, anchor="e" if column in ("size", "wasted") else "w")
+    tree.grid(row=0, column=0, columnspan=3, sticky="nsew")
+    status_label = tk.Label(inspect_window, text="Inspecting...", anchor="w")
+    status_label.grid(row=1, column=0, columnspan=3, sticky="ew")
+    files_var = tk.IntVar(value=10)
+    inspect_window.columnconfigure(0, weight=1)
+    inspect_window.rowconfigure(0, weight=1)
+
+    def show(report):
+        if not inspect_window.winfo_exists():
+            return
+        tree.delete(*tree.get_children())
+        largest = {layer.index for layer in report.largest(3)}
+        tree.tag_configure("largest", background="#fff0b3")
+        tree.tag_configure("empty", foreground="gray")
+        for layer in report.layers:
+            tags = ("largest",) if layer.index in largest else ("empty",) if layer.empty else ()
+            item = tree.insert("", "end", text=str(layer.index), tags=tags, values=(
+                image_browser.format_size(layer.size),
+                image_browser.format_size(layer.wasted) if layer.wasted else "",
+                ", ".join(layer.shared_with), layer.instruction))
+            for size, path in layer.top_files:
+                tree.insert(item, "end", text="", values=(image_browser.format_size(size), "", "", path))
+        status_label.config(text=report.summary())
+
+    def on_error(e):
+        logging.error(f"Failed to inspect {reference}: {e}")
+        if inspect_window.winfo_exists():
+            status_label.config(text=f"Failed: {e}")
+
+    def run(top_files):
+        status_label.config(text="Streaming image layers..." if top_files else "Inspecting...")
+        submit_job(f"Inspect {reference}", cms_core.inspect_image_layers, reference, top_files=top_files,
+                   on_success=show, on_error=on_error)
+
+    tk.Label(inspect_window, text="Largest files per layer:").grid(row=2, column=0, sticky="e")
+    tk.Spinbox(inspect_window, from_=1, to=100, textvariable=files_var, width=5).grid(row=2, column=1, sticky="w")
+    tk.Button(inspect_window, text="Scan Layer Files", command=lambda: run(files_var.get())).grid(row=2, column=2)
+    run(0)
+
 
 def list_running_containers():
     logging.info("Listing running Docker containers.")
-    try:
-        containers = docker_client.containers.list()
-        container_list = "\n".join([f"{container.id[:12]} - {container.name}" for container in containers])
-        logging.debug(f"Running containers: {container_list}")
+
+    def on_success(running):
+        container_list = "\n".join([f"{container_id} - {name}" for container_id, name in running])
         messagebox.showinfo("Running Containers", container_list if container_list else "No containers running.")
-    except Exception as e:
+
+    def on_error(e):
         logging.error(f"Failed to list running containers: {e}")
         messagebox.showerror("Error", f"Failed to list running containers: {e}")
 
+    submit_job("List containers", cms_core.list_running_containers, on_success=on_success, on_error=on_error)
+
 
 def stop_container():
     logging.info("Stop Container function initiated.")
-    try:
-        containers = docker_client.containers.list()
-        if not containers:
+
+    def report_error(e):
+        if isinstance(e, JobCancelled):
+            return
+        logging.error(f"Failed to stop container: {e}")
+        messagebox.showerror("Error", f"Failed to stop container: {e}")
+
+    def show_containers(running):
+        if not running:
             logging.info("No running containers to stop.")
             messagebox.showinfo("Stop Container", "No running containers to stop.")
             return
@@ -338,51 +807,53 @@ def stop_container():
         stop_window.title("Stop Container")
 
         tk.Label(stop_window, text="Select Container to Stop:").grid(row=0, column=0)
-        container_var = tk.StringVar(value=containers[0].id)
+        container_var = tk.StringVar(value=running[0][0])
 
-        for i, container in enumerate(containers):
-            tk.Radiobutton(stop_window, text=f"{container.id[:12]} - {container.name}", variable=container_var,
-                           value=container.id).grid(row=i + 1, column=0)
+        for i, (container_id, name) in enumerate(running):
+            tk.Radiobutton(stop_window, text=f"{container_id} - {name}", variable=container_var,
+                           value=container_id).grid(row=i + 1, column=0)
 
         def submit_stop():
-            try:
-                container = docker_client.containers.get(container_var.get())
-                container.stop()
-                logging.info(f"Container {container.name} stopped successfully.")
+            container_id = container_var.get()
+
+            def on_success(_):
                 messagebox.showinfo("Success", "Container stopped successfully.")
-            except Exception as e:
-                logging.error(f"Failed to stop container: {e}")
-                messagebox.showerror("Error", f"Failed to stop container: {e}")
+
+            submit_job(f"Stop {container_id[:12]}", cms_core.stop_container, container_id, on_success=on_success,
+                       on_error=report_error)
             stop_window.destroy()
 
         submit_button = tk.Button(stop_window, text="Stop", command=submit_stop)
-        submit_button.grid(row=len(containers) + 1, column=0)
-    except Exception as e:
-        logging.error(f"Failed to stop container: {e}")
-        messagebox.showerror("Error", f"Failed to stop container: {e}")
+        submit_button.grid(row=len(running) + 1, column=0)
 
+    # Listing talks to the daemon, so it runs on the executor like the stop itself
+    submit_job("List containers", cms_core.list_running_containers, on_success=show_containers,
+               on_error=report_error)
 
 def search_image():
     logging.info("Search Docker Image function initiated.")
     def submit_search():
         image_name = image_entry.get()
-        logging.debug(f"Searching for Docker image with name: {image_name}")
-        images = docker_client.images.list()
-        found = False
-
-        for image in images:
-            for tag in image.tags:
-                if image_name.lower() in tag.lower():
-                    logging.info(f"Image found: {tag}")
-                    messagebox.showinfo("Image Found", f"Image: {tag}")
-                    found = True
-                    break
-            if found:
-                break
 
-        if not found:
-            logging.info("Image not found.")
-            messagebox.showinfo("Search Result", "Image not found.")
+        def on_success(matches):
+            stats = cms_core.get_image_catalog().stats
+            if matches:
+                logging.info(f"Image found: {matches[0]}")
+                shown = "\n".join(f"Image: {tag}" for tag in matches[:50])
+                if len(matches) > 50:
+                    shown += f"\n... and {len(matches) - 50} more"
+                messagebox.showinfo("Image Found", f"{shown}\n\n{len(matches)} matches in "
+                                    f"{stats['last_query_seconds'] * 1000:.2f} ms "
+                                    f"(cache hits {stats['hits']}, misses {stats['misses']})")
+            else:
+                logging.info("Image not found.")
+                messagebox.showinfo("Search Result", "Image not found.")
+
+        def on_error(e):
+            logging.error(f"Failed to search images: {e}")
+            messagebox.showerror("Error", f"Failed to search images: {e}")
+
+        submit_job(f"Search {image_name}", cms_core.search_image, image_name, on_success=on_success, on_error=on_error)
         search_window.destroy()
 
     search_window = tk.Toplevel(root)
@@ -397,29 +868,88 @@ def search_image():
 
 
 def search_image_dockerhub():
+    """Search the registry, sort the results and list the tags of a repository."""
     logging.info("Search DockerHub function initiated.")
-
-    def submit_search_hub():
-        image_name = image_entry.get()
-        try:
-            command = ["docker", "search", image_name]
-            result = subprocess.run(command, capture_output=True, text=True)
-            logging.info(f"DockerHub search results: {result.stdout}")
-            messagebox.showinfo("Search DockerHub", result.stdout or "No results found.")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Failed to search DockerHub: {e}")
-            messagebox.showerror("Error", f"Failed to search DockerHub: {e}")
-        search_hub_window.destroy()
-
     search_hub_window = tk.Toplevel(root)
     search_hub_window.title("Search DockerHub")
+    state = {"results": [], "sort": "stars", "reverse": False}
+
+    tk.Label(search_hub_window, text="Enter Image Name:").grid(row=0, column=0, sticky="w")
+    image_entry = tk.Entry(search_hub_window, width=30)
+    image_entry.grid(row=0, column=1, sticky="w")
+
+    columns = ("name", "stars", "official", "description")
+    results_tree = ttk.Treeview(search_hub_window, columns=columns, show="headings", height=15)
+    for column, heading, width in zip(columns, ("Name", "Stars", "Official", "Description"), (220, 70, 70, 420)):
+        results_tree.heading(column, text=heading, command=lambda c=column: sort_by(c))
+        results_tree.column(column, width=width, anchor="e" if column == "stars" else "w")
+    results_tree.grid(row=1, column=0, columnspan=3, sticky="nsew")
+
+    tag_columns = ("tag", "size", "updated")
+    tags_tree = ttk.Treeview(search_hub_window, columns=tag_columns, show="headings", height=8)
+    for column, heading, width in zip(tag_columns, ("Tag", "Size (MB)", "Updated"), (220, 90, 200)):
+        tags_tree.heading(column, text=heading)
+        tags_tree.column(column, width=width, anchor="e" if column == "size" else "w")
+    tags_tree.grid(row=3, column=0, columnspan=3, sticky="nsew")
+    status_label = tk.Label(search_hub_window, text="", anchor="w")
+    status_label.grid(row=4, column=0, columnspan=3, sticky="ew")
+
+    def show():
+        results_tree.delete(*results_tree.get_children())
+        for result in registry_search.sort_results(state["results"], state["sort"], state["reverse"]):
+            results_tree.insert("", "end", iid=result.name, values=(result.name, result.stars,
+                                                                    "yes" if result.official else "",
+                                                                    result.description))
+
+    def sort_by(column):
+        key = {"name": "name", "stars": "stars", "official": "official"}.get(column)
+        if key is None:
+            return
+        state["reverse"] = not state["reverse"] if state["sort"] == key else False
+        state["sort"] = key
+        show()
 
-    tk.Label(search_hub_window, text="Enter Image Name:").grid(row=0, column=0)
-    image_entry = tk.Entry(search_hub_window)
-    image_entry.grid(row=0, column=1)
+    def on_error(e):
+        logging.error(f"Failed to search DockerHub: {e}")
+        messagebox.showerror("Error", f"Failed to search DockerHub: {e}")
 
-    submit_button = tk.Button(search_hub_window, text="Search", command=submit_search_hub)
-    submit_button.grid(row=1, column=0, columnspan=2)
+    def on_results(results):
+        if not search_hub_window.winfo_exists():
+            return
+        state["results"] = results
+        show()
+        stats = cms_core.get_registry_search().stats
+        status_label.config(text=f"{len(results)} repositories. Cache hits {stats['hits']}, "
+                                 f"registry requests {stats['requests']}.")
+
+    def on_tags(tags):
+        if not search_hub_window.winfo_exists():
+            return
+        tags_tree.delete(*tags_tree.get_children())
+        for tag in tags:
+            tags_tree.insert("", "end", values=(tag.name, f"{tag.size / 1e6:.1f}" if tag.size else "",
+                                                tag.updated or ""))
+
+    def submit_search_hub(_event=None):
+        image_name = image_entry.get().strip()
+        if not image_name:
+            return
+        status_label.config(text="Searching...")
+        submit_job(f"DockerHub search {image_name}", cms_core.search_registry, image_name,
+                   on_success=on_results, on_error=on_error)
+
+    def list_tags(_event=None):
+        selected = results_tree.selection()
+        if not selected:
+            messagebox.showwarning("No Selection", "Select a repository first.")
+            return
+        submit_job(f"List tags of {selected[0]}", cms_core.list_registry_tags, selected[0],
+                   on_success=on_tags, on_error=on_error)
+
+    image_entry.bind("<Return>", submit_search_hub)
+    results_tree.bind("<Double-1>", list_tags)
+    tk.Button(search_hub_window, text="Search", command=submit_search_hub).grid(row=0, column=2, sticky="w")
+    tk.Button(search_hub_window, text="List Tags", command=list_tags).grid(row=2, column=0, sticky="w")
 
 
 def download_image():
@@ -427,13 +957,18 @@ def download_image():
 
     def submit_download():
         image_name = image_entry.get()
-        try:
-            docker_client.images.pull(image_name)
-            logging.info(f"Downloaded Docker image: {image_name}")
+
+        def on_success(_):
             messagebox.showinfo("Success", f"Image {image_name} downloaded successfully.")
-        except docker.errors.APIError as e:
+
+        def on_error(e):
+            if isinstance(e, JobCancelled):
+                return
             logging.error(f"Failed to download image: {e}")
             messagebox.showerror("Error", f"Failed to download image: {e}")
+
+        submit_job(f"Pull {image_name}", cms_core.download_image, image_name,
+                   on_success=on_success, on_error=on_error)
         download_window.destroy()
 
     download_window = tk.Toplevel(root)
@@ -446,31 +981,127 @@ def download_image():
     submit_button = tk.Button(download_window, text="Download", command=submit_download)
     submit_button.grid(row=1, column=0, columnspan=2)
 
+def bulk_download_images():
+    """Pull a list of images in parallel with live per-image progress."""
+    logging.info("Bulk Download function initiated.")
+
+    def load_manifest():
+        manifest = filedialog.askopenfilename(title="Select Image Manifest",
+                                              filetypes=[("Manifest Files", "*.txt *.json"), ("All Files", "*")])
+        if not manifest:
+            return
+        try:
+            references = bulk_pull.read_manifest(manifest)
+        except Exception as e:
+            logging.error(f"Failed to read manifest {manifest}: {e}")
+            messagebox.showerror("Error", f"Failed to read manifest: {e}")
+            return
+        images_text.delete("1.0", "end")
+        images_text.insert("1.0", "\n".join(references))
+
+    def submit_bulk_download():
+        references = [line.strip() for line in images_text.get("1.0", "end").splitlines() if line.strip()]
+        if not references:
+            messagebox.showwarning("No Images", "Enter at least one image name.")
+            return
+        try:
+            concurrency = int(concurrency_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid input: {e}")
+            return
+        progress = bulk_pull.PullProgress(references)
+
+        def on_success(results):
+            failed = [r for r in results if r.status == bulk_pull.FAILED]
+            total = sum(r.bytes for r in results)
+            summary = f"{len(results) - len(failed)} of {len(results)} images ready, {total / 1e6:.1f} MB downloaded."
+            if failed:
+                messagebox.showerror("Bulk Download", summary + "\nFailed: " + ", ".join(r.reference for r in failed))
+            else:
+                messagebox.showinfo("Bulk Download", summary)
+
+        def on_error(e):
+            if isinstance(e, JobCancelled):
+                return
+            logging.error(f"Bulk download failed: {e}")
+            messagebox.showerror("Error", f"Bulk download failed: {e}")
+
+        job = submit_job(f"Bulk pull ({len(references)} images)", cms_core.bulk_download_images, references,
+                         concurrency=concurrency, skip_existing=skip_var.get(), progress=progress,
+                         on_result=progress.finish, on_success=on_success, on_error=on_error)
+        if job is not None:
+            show_progress(progress, job)
+
+    def show_progress(progress, job):
+        progress_window = tk.Toplevel(root)
+        progress_window.title("Bulk Download Progress")
+        columns = ("image", "status", "layers", "size", "rate")
+        tree = ttk.Treeview(progress_window, columns=columns, show="headings", height=15)
+        for column, heading, width in zip(columns, ("Image", "Status", "Layers", "MB", "MB/s"),
+                                          (300, 80, 70, 80, 80)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width)
+        tree.grid(row=0, column=0, sticky="nsew")
+        tk.Button(progress_window, text="Cancel", command=lambda: jobs.cancel(job.id)).grid(row=1, column=0)
+
+        def refresh():
+            if not progress_window.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for ref, status, done, total, received, rate in progress.snapshot():
+                tree.insert("", "end", values=(ref, status, f"{done}/{total}", f"{received / 1e6:.1f}",
+                                               f"{rate / 1e6:.2f}"))
+            if job.status not in FINISHED_STATES:
+                progress_window.after(250, refresh)
+
+        refresh()
+
+    bulk_window = tk.Toplevel(root)
+    bulk_window.title("Bulk Download Images")
+
+    tk.Label(bulk_window, text="Images (one per line):").grid(row=0, column=0, columnspan=2, sticky="w")
+    images_text = tk.Text(bulk_window, width=50, height=12)
+    images_text.grid(row=1, column=0, columnspan=2)
+    tk.Button(bulk_window, text="Load Manifest", command=load_manifest).grid(row=2, column=0, columnspan=2)
+
+    tk.Label(bulk_window, text="Parallel Downloads:").grid(row=3, column=0)
+    concurrency_var = tk.StringVar(value="4")
+    tk.Spinbox(bulk_window, from_=1, to=32, textvariable=concurrency_var, width=5).grid(row=3, column=1)
+
+    skip_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(bulk_window, text="Skip images already present", variable=skip_var).grid(row=4, column=0,
+                                                                                           columnspan=2)
+
+    submit_button = tk.Button(bulk_window, text="Download", command=submit_bulk_download)
+    submit_button.grid(row=5, column=0, columnspan=2)
+
+
 def run_container():
     """Run a Docker container from an existing image."""
     logging.info("Run Docker Container function initiated.")
     def submit_run():
         image_name = image_entry.get()
         container_name = container_name_entry.get()
-        logging.debug(f"Attempting to run container from image: {image_name}, with name: {container_name}")
-        try:
-            # Run the container
-            container = docker_client.containers.run(
-                image_name,
-                name=container_name if container_name else None,
-                detach=True
-            )
-            logging.info(f"Container {container.name} is running.")
-            messagebox.showinfo("Success", f"Container {container.name} is running.")
-        except docker.errors.ImageNotFound:
-            logging.error("Image not found.")
-            messagebox.showerror("Error", "Image not found. Please pull the image first.")
-        except docker.errors.APIError as e:
-            logging.error(f"Failed to run container: {e}")
-            messagebox.showerror("Error", f"Failed to run container: {e}")
-        except Exception as e:
-            logging.error(f"An error occurred: {e}")
-            messagebox.showerror("Error", f"An error occurred: {e}")
+
+        def on_success(name):
+            messagebox.showinfo("Success", f"Container {name} is running.")
+
+        def on_error(e):
+            if isinstance(e, JobCancelled):
+                return
+            if isinstance(e, docker.errors.ImageNotFound):
+                logging.error("Image not found.")
+                messagebox.showerror("Error", "Image not found. Please pull the image first.")
+            elif isinstance(e, docker.errors.APIError):
+                logging.error(f"Failed to run container: {e}")
+                messagebox.showerror("Error", f"Failed to run container: {e}")
+            else:
+                logging.error(f"An error occurred: {e}")
+                messagebox.showerror("Error", f"An error occurred: {e}")
+
+        # Run the container in the background
+        submit_job(f"Run {image_name}", cms_core.run_container, image_name, container_name,
+                   on_success=on_success, on_error=on_error)
         run_window.destroy()
 
     run_window = tk.Toplevel(root)
@@ -488,20 +1119,695 @@ def run_container():
     submit_button.grid(row=2, column=0, columnspan=2)
 
 
-# Main GUI
-root = tk.Tk()
-root.title("Cloud Management System")
+def format_batch_summary(summary):
+    text = f"{summary['ok']} of {summary['count']} succeeded"
+    if summary["count"]:
+        text += (f" in {summary['wall_seconds']:.2f} seconds.\n"
+                 f"Per container: min {summary['min']:.2f}s, median {summary['median']:.2f}s, "
+                 f"max {summary['max']:.2f}s")
+    return text
+
+
+def launch_replicas():
+    """Start several replicas of an image in parallel."""
+    logging.info("Launch Replicas function initiated.")
+
+    def submit_launch():
+        image_name = fields["image"].get()
+        try:
+            replicas = int(fields["replicas"].get())
+            concurrency = int(fields["workers"].get())
+            env = batch_containers.parse_env(fields["env"].get().split())
+            ports = batch_containers.parse_ports(fields["ports"].get().split())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid input: {e}")
+            return
+
+        def on_success(outcome):
+            batch_id, results, summary = outcome
+            failed = [r for r in results if not r.ok]
+            text = f"Batch {batch_id}: {format_batch_summary(summary)}"
+            if failed:
+                text += f"\nFirst error: {failed[0].error}"
+            messagebox.showinfo("Launch Replicas", text)
+
+        def on_error(e):
+            if isinstance(e, JobCancelled):
+                return
+            logging.error(f"Failed to launch replicas: {e}")
+            messagebox.showerror("Error", f"Failed to launch replicas: {e}")
+
+        submit_job(f"Launch {replicas} x {image_name}", cms_core.launch_replicas, image_name, replicas,
+                   concurrency=concurrency, name_template=fields["name_template"].get(), env=env, ports=ports,
+                   cpus=fields["cpus"].get() or None, mem_limit=fields["memory"].get() or None,
+                   on_success=on_success, on_error=on_error)
+        launch_window.destroy()
+
+    launch_window = tk.Toplevel(root)
+    launch_window.title("Launch Replicas")
+
+    fields = {}
+    for row, (key, label, default) in enumerate([
+        ("image", "Image Name:", ""),
+        ("replicas", "Replicas:", "3"),
+        ("name_template", "Name Template:", "{image}-{batch}-{index}"),
+        ("env", "Environment (KEY=VALUE ...):", ""),
+        ("ports", "Ports (HOST:CONTAINER ...):", ""),
+        ("cpus", "CPU Limit (optional):", ""),
+        ("memory", "Memory Limit (optional, e.g. 256m):", ""),
+        ("workers", "Parallel Workers:", "8"),
+    ]):
+        tk.Label(launch_window, text=label).grid(row=row, column=0, sticky="w")
+        fields[key] = tk.Entry(launch_window)
+        fields[key].insert(0, default)
+        fields[key].grid(row=row, column=1)
+
+    submit_button = tk.Button(launch_window, text="Launch", command=submit_launch)
+    submit_button.grid(row=len(fields), column=0, columnspan=2)
+
+
+def bulk_stop_containers():
+    """Stop (and optionally remove) all containers matching a label or name pattern."""
+    logging.info("Bulk Stop function initiated.")
+
+    def submit_bulk_stop():
+        label = label_entry.get().strip() or None
+        name_pattern = name_entry.get().strip() or None
+        if not label and not name_pattern:
+            messagebox.showwarning("No Filter", "Enter a label or a name pattern.")
+            return
+        try:
+            timeout = int(timeout_entry.get())
+            concurrency = int(workers_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid input: {e}")
+            return
 
-tk.Button(root, text="1. Create VM", command=create_vm_gui).pack(fill=tk.X)
-tk.Button(root, text="2. Create Dockerfile", command=create_dockerfile).pack(fill=tk.X)
-tk.Button(root, text="3. Build Docker Image", command=build_docker_image).pack(fill=tk.X)
-tk.Button(root, text="4. List Docker Images", command=list_docker_images).pack(fill=tk.X)
-tk.Button(root, text="5. List Running Containers", command=list_running_containers).pack(fill=tk.X)
-tk.Button(root, text="6. Stop a Container", command=stop_container).pack(fill=tk.X)
-tk.Button(root, text="7. Search for Docker Image", command=search_image).pack(fill=tk.X)
-tk.Button(root, text="8. Search DockerHub", command=search_image_dockerhub).pack(fill=tk.X)
-tk.Button(root, text="9. Download Docker Image", command=download_image).pack(fill=tk.X)
-tk.Button(root, text="10. Run a Container", command=run_container).pack(fill=tk.X)
+        def on_success(outcome):
+            results, summary = outcome
+            if not results:
+                messagebox.showinfo("Bulk Stop", "No matching containers.")
+                return
+            messagebox.showinfo("Bulk Stop", format_batch_summary(summary))
+
+        def on_error(e):
+            if isinstance(e, JobCancelled):
+                return
+            logging.error(f"Failed to stop containers: {e}")
+            messagebox.showerror("Error", f"Failed to stop containers: {e}")
+
+        submit_job(f"Stop {label or name_pattern}", cms_core.stop_matching_containers, label=label,
+                   name_pattern=name_pattern, timeout=timeout, remove=remove_var.get(), concurrency=concurrency,
+                   on_success=on_success, on_error=on_error)
+        stop_window.destroy()
+
+    stop_window = tk.Toplevel(root)
+    stop_window.title("Bulk Stop Containers")
+
+    tk.Label(stop_window, text="Label (KEY or KEY=VALUE):").grid(row=0, column=0, sticky="w")
+    label_entry = tk.Entry(stop_window)
+    label_entry.grid(row=0, column=1)
+
+    tk.Label(stop_window, text="Name Pattern (e.g. web-*):").grid(row=1, column=0, sticky="w")
+    name_entry = tk.Entry(stop_window)
+    name_entry.grid(row=1, column=1)
+
+    tk.Label(stop_window, text="Stop Timeout (s):").grid(row=2, column=0, sticky="w")
+    timeout_entry = tk.Entry(stop_window)
+    timeout_entry.insert(0, "10")
+    timeout_entry.grid(row=2, column=1)
+
+    tk.Label(stop_window, text="Parallel Workers:").grid(row=3, column=0, sticky="w")
+    workers_entry = tk.Entry(stop_window)
+    workers_entry.insert(0, "8")
+    workers_entry.grid(row=3, column=1)
+
+    remove_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(stop_window, text="Remove after stopping", variable=remove_var).grid(row=4, column=0,
+                                                                                      columnspan=2)
+
+    submit_button = tk.Button(stop_window, text="Stop", command=submit_bulk_stop)
+    submit_button.grid(row=5, column=0, columnspan=2)
+
+
+def apply_spec_file():
+    """Converge containers and VMs to a JSON spec file after confirming the planned actions."""
+    logging.info("Apply Spec File function initiated.")
+    spec_path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
+    if not spec_path:
+        logging.warning("No spec file selected.")
+        return
 
+    def on_error(e):
+        if isinstance(e, JobCancelled):
+            return
+        logging.error(f"Failed to reconcile {spec_path}: {e}")
+        messagebox.showerror("Error", f"Failed to reconcile {spec_path}: {e}")
 
-root.mainloop()
+    def on_applied(outcome):
+        plan, results, summary = outcome
+        if not plan.actions:
+            messagebox.showinfo("Apply Spec", plan.describe())
+            return
+        failures = "".join(f"\n{r.action} {r.target}: {r.error}" for r in results if not r.ok)
+        messagebox.showinfo("Apply Spec", format_batch_summary(summary) + failures)
+
+    def on_planned(outcome):
+        plan = outcome[0]
+        if not plan.actions:
+            messagebox.showinfo("Apply Spec", plan.describe())
+        elif messagebox.askyesno("Apply Spec", f"{plan.describe()}\n\nApply these actions?"):
+            submit_job(f"Reconcile {os.path.basename(spec_path)}", cms_core.reconcile_spec, spec_path,
+                       on_success=on_applied, on_error=on_error)
+
+    submit_job(f"Plan {os.path.basename(spec_path)}", cms_core.reconcile_spec, spec_path, dry_run=True,
+               on_success=on_planned, on_error=on_error)
+
+
+def reclaim_disk_space():
+    """Preview and run disk reclamation, once or periodically in the background."""
+    logging.info("Reclaim Disk Space function initiated.")
+    reclaim_window = tk.Toplevel(root)
+    reclaim_window.title("Reclaim Disk Space")
+
+    fields = {}
+    labels = (("keep_tags", "Keep newest tags per repository:", "3"),
+              ("image_unused_days", "Remove images unused for (days):", ""),
+              ("container_age_days", "Remove stopped containers older than (days):", "7"),
+              ("cache_unused_days", "Prune build cache unused for (days):", "14"),
+              ("overlay_unused_days", "Discard VM overlays unused for (days):", ""),
+              ("high_water", "Disk high-water mark (0-1):", ""),
+              ("low_water", "Disk low-water mark (0-1):", ""))
+    for row, (key, label, default) in enumerate(labels):
+        tk.Label(reclaim_window, text=label).grid(row=row, column=0, sticky="w")
+        fields[key] = tk.Entry(reclaim_window, width=10)
+        fields[key].insert(0, default)
+        fields[key].grid(row=row, column=1, sticky="w")
+    dangling_var = tk.BooleanVar(value=False)
+    dangling_check = tk.Checkbutton(reclaim_window, text="Remove dangling images", variable=dangling_var)
+    dangling_check.grid(row=len(labels), column=0, sticky="w")
+
+    columns = ("kind", "target", "size", "reason")
+    tree = ttk.Treeview(reclaim_window, columns=columns, show="headings", height=12)
+    for column, heading, width in zip(columns, ("Kind", "Target", "Size (MB)", "Reason"), (90, 260, 90, 300)):
+        tree.heading(column, text=heading)
+        tree.column(column, width=width, anchor="e" if column == "size" else "w")
+    tree.grid(row=len(labels) + 1, column=0, columnspan=4, sticky="nsew")
+    status_label = tk.Label(reclaim_window, text="", anchor="w")
+    status_label.grid(row=len(labels) + 2, column=0, columnspan=4, sticky="ew")
+
+    def read_policy():
+        values = {}
+        for key, entry in fields.items():
+            text = entry.get().strip()
+            if text:
+                values[key] = int(text) if key == "keep_tags" else float(text)
+        return reclaim.ReclaimPolicy(dangling=dangling_var.get(), **values)
+
+    def on_error(e):
+        if isinstance(e, JobCancelled):
+            return
+        logging.error(f"Disk reclamation failed: {e}")
+        messagebox.showerror("Error", f"Disk reclamation failed: {e}")
+
+    def on_plan(plan):
+        if not reclaim_window.winfo_exists():
+            return
+        tree.delete(*tree.get_children())
+        for candidate in plan.candidates:
+            tree.insert("", "end", values=(candidate.kind, candidate.target, f"{candidate.size / 1e6:.1f}",
+                                           candidate.reason))
+        disks = ", ".join(f"{name} {disk['fraction']:.0%} full" for name, disk in plan.disk.items())
+        status_label.config(text=f"{len(plan.candidates)} removals, {plan.total_bytes / 1e6:.1f} MB reclaimable."
+                                 + (f"  Disk: {disks}." if disks else ""))
+
+    def on_reclaimed(outcome):
+        results, summary = outcome
+        failures = "".join(f"\n{r.action} {r.target}: {r.error}" for r in results if not r.ok)
+        messagebox.showinfo("Reclaim Disk Space", f"Reclaimed {summary['bytes'] / 1e6:.1f} MB.\n"
+                                                  f"{format_batch_summary(summary)}{failures}")
+        preview()
+
+    def with_policy(action):
+        def run():
+            try:
+                policy = read_policy()
+            except ValueError as e:
+                messagebox.showerror("Error", f"Invalid input: {e}")
+                return
+            action(policy)
+        return run
+
+    def preview(policy=None):
+        try:
+            policy = policy or read_policy()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid input: {e}")
+            return
+        status_label.config(text="Planning...")
+        submit_job("Plan disk reclamation", cms_core.reclaim_plan, policy, on_success=on_plan, on_error=on_error)
+
+    def run_now(policy):
+        if messagebox.askyesno("Reclaim Disk Space", "Remove everything the policy selects now?"):
+            submit_job("Reclaim disk space", cms_core.reclaim_disk_space, policy, on_success=on_reclaimed,
+                       on_error=on_error)
+
+    def toggle_background(policy):
+        global reclaimer
+        if reclaimer is not None:
+            reclaimer.stop()
+            reclaimer = None
+            background_button.config(text="Start Hourly Background Reclaim")
+            return
+        reclaimer = cms_core.start_reclaimer(policy, interval=3600)
+        background_button.config(text="Stop Background Reclaim")
+
+    buttons = tk.Frame(reclaim_window)
+    buttons.grid(row=len(labels) + 3, column=0, columnspan=4)
+    tk.Button(buttons, text="Preview", command=preview).pack(side=tk.LEFT)
+    tk.Button(buttons, text="Reclaim Now", command=with_policy(run_now)).pack(side=tk.LEFT)
+    background_button = tk.Button(buttons, command=with_policy(toggle_background),
+                                  text="Stop Background Reclaim" if reclaimer else "Start Hourly Background Reclaim")
+    background_button.pack(side=tk.LEFT)
+
+
+def container_dashboard():
+    """Live CPU, memory, network and block I/O of all running containers."""
+    logging.info("Container dashboard opened.")
+    aggregator = cms_core.container_stats_aggregator()
+    aggregator.start()
+
+    dashboard_window = tk.Toplevel(root)
+    dashboard_window.title("Container Resource Dashboard")
+
+    columns = ("name", "cpu", "history", "memory", "memory_percent", "net_rx", "net_tx", "block_read", "block_write")
+    headings = ("Container", "CPU %", "CPU History", "Memory (MB)", "Mem %", "Net RX KB/s", "Net TX KB/s",
+                "Block R KB/s", "Block W KB/s")
+    widths = (180, 60, 200, 90, 60, 90, 90, 90, 90)
+    tree = ttk.Treeview(dashboard_window, columns=columns, show="headings", height=20)
+    for column, heading, width in zip(columns, headings, widths):
+        tree.heading(column, text=heading)
+        tree.column(column, width=width, anchor="w" if column in ("name", "history") else "e")
+    tree.grid(row=0, column=0, sticky="nsew")
+
+    def refresh():
+        if not dashboard_window.winfo_exists():
+            return
+        rows = aggregator.snapshot(spark_width=30)
+        visible = set()
+        for row in rows:
+            values = (row["name"], f"{row['cpu']:.1f}", row["spark"], f"{row['memory'] / 2**20:.1f}",
+                      f"{row['memory_percent']:.1f}", f"{row['net_rx_rate'] / 1024:.1f}",
+                      f"{row['net_tx_rate'] / 1024:.1f}", f"{row['block_read_rate'] / 1024:.1f}",
+                      f"{row['block_write_rate'] / 1024:.1f}")
+            if tree.exists(row["id"]):
+                tree.item(row["id"], values=values)
+            else:
+                tree.insert("", "end", iid=row["id"], values=values)
+            visible.add(row["id"])
+        for iid in tree.get_children():
+            if iid not in visible:
+                tree.delete(iid)
+        # Keep the busiest containers on top
+        for index, row in enumerate(rows):
+            tree.move(row["id"], "", index)
+        dashboard_window.after(1000, refresh)
+
+    def close():
+        aggregator.stop()
+        dashboard_window.destroy()
+
+    dashboard_window.protocol("WM_DELETE_WINDOW", close)
+    refresh()
+
+
+def show_jobs():
+    """Show a live list of queued, running and finished background jobs."""
+    logging.info("Jobs window opened.")
+    jobs_window = tk.Toplevel(root)
+    jobs_window.title("Background Jobs")
+
+    columns = ("id", "name", "status", "duration")
+    tree = ttk.Treeview(jobs_window, columns=columns, show="headings", height=12)
+    for column, heading, width in zip(columns, ("ID", "Job", "Status", "Duration (s)"), (50, 300, 90, 100)):
+        tree.heading(column, text=heading)
+        tree.column(column, width=width)
+    tree.grid(row=0, column=0, columnspan=2, sticky="nsew")
+
+    def refresh():
+        if not jobs_window.winfo_exists():
+            return
+        selected = tree.selection()
+        tree.delete(*tree.get_children())
+        for job in jobs.jobs():
+            duration = f"{job.duration:.1f}" if job.duration is not None else ""
+            tree.insert("", "end", iid=str(job.id), values=(job.id, job.name, job.status, duration))
+        tree.selection_set([iid for iid in selected if tree.exists(iid)])
+        jobs_window.after(500, refresh)
+
+    def cancel_selected():
+        for iid in tree.selection():
+            jobs.cancel(int(iid))
+
+    tk.Button(jobs_window, text="Cancel Selected", command=cancel_selected).grid(row=1, column=0)
+    tk.Button(jobs_window, text="Clear Finished", command=jobs.clear_finished).grid(row=1, column=1)
+    refresh()
+
+
+def performance_stats():
+    """Latency percentiles of the operations run in this session, or loaded from a metrics file."""
+    logging.info("Performance stats window opened.")
+    stats_window = tk.Toplevel(root)
+    stats_window.title("Performance Stats")
+
+    columns = ("op", "count", "failures", "mean", "p50", "p95", "p99", "api_calls", "mb")
+    headings = ("Operation", "Count", "Failures", "Mean (s)", "p50 (s)", "p95 (s)", "p99 (s)", "API Calls", "MB")
+    widths = (200, 60, 60, 80, 80, 80, 80, 70, 80)
+    tree = ttk.Treeview(stats_window, columns=columns, show="headings", height=15)
+    for column, heading, width in zip(columns, headings, widths):
+        tree.heading(column, text=heading)
+        tree.column(column, width=width, anchor="w" if column == "op" else "e")
+    tree.grid(row=0, column=0, columnspan=2, sticky="nsew")
+    source_label = tk.Label(stats_window, text="This session")
+    source_label.grid(row=1, column=0, columnspan=2)
+
+    def show(summary):
+        tree.delete(*tree.get_children())
+        for operation, row in summary.items():
+            tree.insert("", "end", values=(operation, row["count"], row["failures"], f"{row['mean']:.3f}",
+                                           f"{row['p50']:.3f}", f"{row['p95']:.3f}", f"{row['p99']:.3f}",
+                                           row["api_calls"], f"{row['bytes'] / 1e6:.1f}"))
+
+    def refresh():
+        source_label.config(text="This session")
+        show(telemetry.get_recorder().summary())
+
+    def load_summary(path):
+        return telemetry.summarize(telemetry.load_records(path))
+
+    def show_file(path, summary):
+        if stats_window.winfo_exists():
+            source_label.config(text=path)
+            show(summary)
+
+    def report_error(e):
+        if isinstance(e, JobCancelled):
+            return
+        logging.error(f"Failed to load metrics file: {e}")
+        messagebox.showerror("Error", f"Failed to load metrics file: {e}")
+
+    def load_file():
+        path = filedialog.askopenfilename(filetypes=[("Metrics files", "*.jsonl"), ("All files", "*.*")])
+        if path:
+            source_label.config(text=f"Loading {path}...")
+            submit_job(f"Load metrics {os.path.basename(path)}", load_summary, path,
+                       on_success=lambda summary: show_file(path, summary), on_error=report_error)
+
+    tk.Button(stats_window, text="Refresh", command=refresh).grid(row=2, column=0)
+    tk.Button(stats_window, text="Load Metrics File", command=load_file).grid(row=2, column=1)
+    refresh()
+
+
+def manage_docker_hosts():
+    """Register Docker hosts, check their health and list or stop containers on all of them at once."""
+    logging.info("Docker hosts window opened.")
+    pool = cms_core.get_host_pool()
+
+    hosts_window = tk.Toplevel(root)
+    hosts_window.title("Docker Hosts")
+
+    hosts_tree = ttk.Treeview(hosts_window, columns=("name", "url", "status", "latency", "version"),
+                              show="headings", height=6)
+    for column, heading, width in (("name", "Name", 120), ("url", "URL", 260), ("status", "Status", 90),
+                                   ("latency", "Latency (ms)", 90), ("version", "Docker", 90)):
+        hosts_tree.heading(column, text=heading)
+        hosts_tree.column(column, width=width)
+    hosts_tree.grid(row=0, column=0, columnspan=6, sticky="nsew")
+
+    tk.Label(hosts_window, text="Name:").grid(row=1, column=0, sticky="e")
+    name_entry = tk.Entry(hosts_window, width=14)
+    name_entry.grid(row=1, column=1, sticky="w")
+    tk.Label(hosts_window, text="URL:").grid(row=1, column=2, sticky="e")
+    url_entry = tk.Entry(hosts_window, width=36)
+    url_entry.insert(0, "ssh://user@host")
+    url_entry.grid(row=1, column=3, columnspan=2, sticky="w")
+
+    results_tree = ttk.Treeview(hosts_window, columns=("host", "id", "name", "detail"), show="headings", height=14)
+    for column, heading, width in (("host", "Host", 120), ("id", "ID", 110), ("name", "Name / Tag", 260),
+                                   ("detail", "Image / Size", 220)):
+        results_tree.heading(column, text=heading)
+        results_tree.column(column, width=width)
+    results_tree.grid(row=4, column=0, columnspan=6, sticky="nsew")
+    status_label = tk.Label(hosts_window, text="")
+    status_label.grid(row=5, column=0, columnspan=6, sticky="w")
+    hosts_window.rowconfigure(4, weight=1)
+    hosts_window.columnconfigure(3, weight=1)
+
+    def refresh_hosts():
+        if not hosts_window.winfo_exists():
+            return
+        hosts_tree.delete(*hosts_tree.get_children())
+        for name, config in pool.hosts().items():
+            status = pool.status(name)
+            latency = f"{status.latency * 1000:.1f}" if status.latency is not None else ""
+            hosts_tree.insert("", "end", iid=name, values=(name, config["url"] or "(environment)", status.status,
+                                                           latency, status.version or status.error or ""))
+
+    def report_error(e):
+        if isinstance(e, JobCancelled):
+            return
+        logging.error(f"Docker host operation failed: {e}")
+        messagebox.showerror("Error", f"Docker host operation failed: {e}")
+
+    def selected_hosts():
+        return list(hosts_tree.selection()) or None
+
+    def add_host():
+        name = name_entry.get().strip()
+        submit_job(f"Add Docker host {name}", pool.add, name, url_entry.get().strip(),
+                   on_success=lambda _: refresh_hosts(), on_error=report_error)
+
+    def remove_host():
+        for name in hosts_tree.selection():
+            submit_job(f"Remove Docker host {name}", pool.remove, name, on_success=lambda _: refresh_hosts(),
+                       on_error=report_error)
+
+    def show_imported(added):
+        refresh_hosts()
+        status_label.config(text=f"Imported {len(added)} Docker contexts.")
+
+    def import_contexts():
+        submit_job("Import Docker contexts", pool.import_contexts, on_success=show_imported, on_error=report_error)
+
+    def check_hosts():
+        submit_job("Check Docker hosts", pool.check, selected_hosts(), on_success=lambda _: refresh_hosts(),
+                   on_error=report_error)
+
+    def use_host():
+        selection = hosts_tree.selection()
+        if selection:
+            submit_job(f"Use Docker host {selection[0]}", cms_core.use_host, selection[0],
+                       on_success=lambda _: status_label.config(text=f"Using {selection[0]} for single-host "
+                                                                     "operations."),
+                       on_error=report_error)
+
+    def show_rows(rows, errors, values_of):
+        results_tree.delete(*results_tree.get_children())
+        for index, row in enumerate(rows):
+            results_tree.insert("", "end", iid=f"{row['host']}|{row['id']}|{index}", values=values_of(row))
+        failed = f"; unreachable: {', '.join(sorted(errors))}" if errors else ""
+        status_label.config(text=f"{len(rows)} results from {len({r['host'] for r in rows})} hosts{failed}.")
+
+    def fleet_containers():
+        submit_job("Fleet containers", cms_core.fleet_containers, selected_hosts(),
+                   on_success=lambda result: show_rows(*result, lambda r: (r["host"], r["id"], r["name"],
+                                                                           r["image"])),
+                   on_error=report_error)
+
+    def fleet_images():
+        submit_job("Fleet images", cms_core.fleet_images, selected_hosts(),
+                   on_success=lambda result: show_rows(*result, lambda r: (
+                       r["host"], r["id"], ", ".join(r["tags"]) or "<none>", image_browser.format_size(r["size"]))),
+                   on_error=report_error)
+
+    def fleet_search():
+        query = search_entry.get().strip()
+        if query:
+            submit_job(f"Fleet search {query}", cms_core.fleet_search, query, selected_hosts(),
+                       on_success=lambda result: show_rows(*result, lambda r: (r["host"], r["id"], r["tag"], "")),
+                       on_error=report_error)
+
+    def stop_selected():
+        for iid in results_tree.selection():
+            host, container_id, _ = iid.rsplit("|", 2)
+            submit_job(f"Stop {container_id} on {host}", cms_core.fleet_stop, container_id, [host],
+                       on_success=lambda _: fleet_containers(), on_error=report_error)
+
+    host_buttons = tk.Frame(hosts_window)
+    host_buttons.grid(row=2, column=0, columnspan=6, sticky="w")
+    for label, command in (("Add", add_host), ("Remove", remove_host), ("Import Contexts", import_contexts),
+                           ("Check Health", check_hosts), ("Use for Single-Host Operations", use_host)):
+        tk.Button(host_buttons, text=label, command=command).pack(side=tk.LEFT)
+
+    fleet_buttons = tk.Frame(hosts_window)
+    fleet_buttons.grid(row=3, column=0, columnspan=6, sticky="w")
+    tk.Button(fleet_buttons, text="All Containers", command=fleet_containers).pack(side=tk.LEFT)
+    tk.Button(fleet_buttons, text="All Images", command=fleet_images).pack(side=tk.LEFT)
+    search_entry = tk.Entry(fleet_buttons, width=20)
+    search_entry.pack(side=tk.LEFT)
+    tk.Button(fleet_buttons, text="Search Images", command=fleet_search).pack(side=tk.LEFT)
+    tk.Button(fleet_buttons, text="Stop Selected", command=stop_selected).pack(side=tk.LEFT)
+    refresh_hosts()
+
+
+def operation_history():
+    """Search the operation history database: recent, slowest and failure rates."""
+    logging.info("Operation history window opened.")
+    store = cms_core.get_history_store()
+    history_window = tk.Toplevel(root)
+    history_window.title("Operation History")
+
+    filter_frame = tk.Frame(history_window)
+    filter_frame.grid(row=0, column=0, sticky="w")
+    tk.Label(filter_frame, text="Operation:").pack(side=tk.LEFT)
+    op_var = tk.StringVar()
+    op_box = ttk.Combobox(filter_frame, textvariable=op_var, width=20)
+    op_box.pack(side=tk.LEFT)
+    tk.Label(filter_frame, text="Target:").pack(side=tk.LEFT)
+    target_entry = tk.Entry(filter_frame, width=20)
+    target_entry.pack(side=tk.LEFT)
+    tk.Label(filter_frame, text="Outcome:").pack(side=tk.LEFT)
+    outcome_var = tk.StringVar()
+    ttk.Combobox(filter_frame, textvariable=outcome_var, width=9, state="readonly",
+                 values=("", telemetry.OK, telemetry.ERROR, telemetry.CANCELLED)).pack(side=tk.LEFT)
+    tk.Label(filter_frame, text="Since:").pack(side=tk.LEFT)
+    since_var = tk.StringVar(value="7d")
+    ttk.Combobox(filter_frame, textvariable=since_var, width=5, values=("1h", "24h", "7d", "30d", "")).pack(
+        side=tk.LEFT)
+
+    tree = ttk.Treeview(history_window, show="headings", height=22)
+    tree.grid(row=1, column=0, sticky="nsew")
+    status_label = tk.Label(history_window, text="", anchor="w")
+    status_label.grid(row=2, column=0, sticky="ew")
+    history_window.columnconfigure(0, weight=1)
+    history_window.rowconfigure(1, weight=1)
+
+    def filters():
+        since = since_var.get().strip()
+        return {"op": op_var.get().strip() or None, "since": time.time() - history_store.parse_age(since)
+                if since else None}
+
+    def show(columns, rows, values_of):
+        tree.delete(*tree.get_children())
+        tree.config(columns=[c for c, _, _ in columns])
+        for column, heading, width in columns:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor="w" if column in ("ts", "op", "target", "key", "error") else "e")
+        for row in rows:
+            tree.insert("", "end", values=values_of(row))
+        status_label.config(text=f"{len(rows)} rows.")
+
+    def show_operations(rows):
+        show((("ts", "Time", 150), ("op", "Operation", 150), ("target", "Target", 220), ("seconds", "Seconds", 80),
+              ("outcome", "Outcome", 80), ("api_calls", "API Calls", 70), ("bytes", "Bytes", 90),
+              ("error", "Error", 260)), rows,
+             lambda r: (datetime.fromtimestamp(r["ts"]).strftime("%Y-%m-%d %H:%M:%S"), r["op"], r["target"] or "",
+                        f"{r['seconds']:.3f}", r["outcome"], r["api_calls"], image_browser.format_size(r["bytes"]),
+                        r["error"] or ""))
+
+    def report_error(e):
+        if isinstance(e, JobCancelled):
+            return
+        status_label.config(text="")
+        messagebox.showerror("Error", str(e), parent=history_window)
+
+    def show_failure_rates(rows):
+        show((("key", "Target", 300), ("count", "Count", 80), ("failures", "Failures", 80),
+              ("rate", "Failure Rate", 90), ("mean", "Mean Seconds", 100)), rows,
+             lambda r: (r["key"] or "", r["count"], r["failures"], f"{r['rate']:.1%}", f"{r['mean_seconds']:.3f}"))
+
+    # SQLite queries run on the job executor like every other blocking call; only parsing the filters is done here
+    def run_query(order):
+        try:
+            options = filters()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=history_window)
+            return
+        status_label.config(text="Searching...")
+        submit_job("Query operation history", store.query, target=target_entry.get().strip() or None,
+                   outcome=outcome_var.get() or None, order=order, limit=500, on_success=show_operations,
+                   on_error=report_error, **options)
+
+    def failure_rates():
+        try:
+            options = filters()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=history_window)
+            return
+        status_label.config(text="Searching...")
+        submit_job("Operation failure rates", store.failure_rates, by="target", on_success=show_failure_rates,
+                   on_error=report_error, **options)
+
+    def load_operations():
+        # Records of operations that just finished may still be queued for the recorder or the writer
+        telemetry.get_recorder().flush(timeout=2)
+        store.flush(timeout=2)
+        return store.operations()
+
+    def show_operation_names(names):
+        op_box.config(values=[""] + names)
+        run_query("ts")
+
+    buttons = tk.Frame(history_window)
+    buttons.grid(row=3, column=0, sticky="w")
+    tk.Button(buttons, text="Recent", command=lambda: run_query("ts")).pack(side=tk.LEFT)
+    tk.Button(buttons, text="Slowest", command=lambda: run_query("seconds")).pack(side=tk.LEFT)
+    tk.Button(buttons, text="Failure Rate per Target", command=failure_rates).pack(side=tk.LEFT)
+
+    status_label.config(text="Loading...")
+    submit_job("Load operation history", load_operations, on_success=show_operation_names, on_error=report_error)
+
+
+def main():
+    global root
+    cms_core.configure_logging()
+    cms_core.get_history_store()
+
+    # Main GUI
+    root = tk.Tk()
+    root.title("Cloud Management System")
+
+    tk.Button(root, text="1. Create VM", command=create_vm_gui).pack(fill=tk.X)
+    tk.Button(root, text="2. Create Dockerfile", command=create_dockerfile).pack(fill=tk.X)
+    tk.Button(root, text="3. Build Docker Image", command=build_docker_image).pack(fill=tk.X)
+    tk.Button(root, text="4. List Docker Images", command=list_docker_images).pack(fill=tk.X)
+    tk.Button(root, text="5. List Running Containers", command=list_running_containers).pack(fill=tk.X)
+    tk.Button(root, text="6. Stop a Container", command=stop_container).pack(fill=tk.X)
+    tk.Button(root, text="7. Search for Docker Image", command=search_image).pack(fill=tk.X)
+    tk.Button(root, text="8. Search DockerHub", command=search_image_dockerhub).pack(fill=tk.X)
+    tk.Button(root, text="9. Download Docker Image", command=download_image).pack(fill=tk.X)
+    tk.Button(root, text="10. Run a Container", command=run_container).pack(fill=tk.X)
+    tk.Button(root, text="11. Background Jobs", command=show_jobs).pack(fill=tk.X)
+    tk.Button(root, text="12. Bulk Download Images", command=bulk_download_images).pack(fill=tk.X)
+    tk.Button(root, text="13. Launch Replicas", command=launch_replicas).pack(fill=tk.X)
+    tk.Button(root, text="14. Bulk Stop Containers", command=bulk_stop_containers).pack(fill=tk.X)
+    tk.Button(root, text="15. Container Dashboard", command=container_dashboard).pack(fill=tk.X)
+    tk.Button(root, text="16. Manage VMs", command=manage_vms).pack(fill=tk.X)
+    tk.Button(root, text="17. Base Images and Overlays", command=manage_image_pool).pack(fill=tk.X)
+    tk.Button(root, text="18. Performance Stats", command=performance_stats).pack(fill=tk.X)
+    tk.Button(root, text="19. Apply Spec File", command=apply_spec_file).pack(fill=tk.X)
+    tk.Button(root, text="20. Reclaim Disk Space", command=reclaim_disk_space).pack(fill=tk.X)
+    tk.Button(root, text="21. Docker Hosts", command=manage_docker_hosts).pack(fill=tk.X)
+    tk.Button(root, text="22. Inspect Image Layers", command=inspect_image_layers).pack(fill=tk.X)
+    tk.Button(root, text="23. Operation History", command=operation_history).pack(fill=tk.X)
+
+    # Keep the local image catalog current from Docker events
+    cms_core.get_image_catalog().start_watching()
+
+    root.after(100, pump_jobs)
+    root.mainloop()
+    jobs.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,728 @@
+"""Command line interface for the Cloud Management System.
+
+Runs the same operations as the GUI without Tkinter, e.g.:
+
+    python cms.py images
+    python cms.py run nginx:latest --name web
+    python cms.py create-vm --cpu 2 --memory 2048 --image disk.qcow2
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+import batch_containers
+import bulk_pull
+import cms_core
+import dockerfile_lint
+import dockerfile_templates
+import history_store
+import image_browser
+import reclaim
+import registry_search
+import cms_logging
+import telemetry
+import vm_manager
+
+
+def _print(args, value, text):
+    if args.json:
+        print(json.dumps(value))
+    elif text:
+        print(text)
+
+
+def cmd_create_vm(args):
+    if args.config:
+        config = cms_core.load_vm_config(args.config)
+        args.cpu = args.cpu or config.get("cpu")
+        args.memory = args.memory or config.get("memory")
+        args.disk_size = args.disk_size or config.get("disk_size")
+    vm_options = {"cache": args.cache, "aio": args.aio, "hugepages": args.hugepages}
+    if args.no_kvm:
+        vm_options["kvm"] = False
+    vm = cms_core.create_vm(args.cpu, args.memory, image_path=args.image, disk_size=args.disk_size,
+                            disk_path=args.disk_path, iso_path=args.iso, name=args.name, base_image=args.base,
+                            wait=args.wait, **vm_options)
+    _print(args, vm.as_dict(), f"VM {vm.name} started (pid {vm.pid}, {'KVM' if vm.accelerated else 'TCG'}) "
+                               f"in {vm.launch_seconds:.2f} seconds.")
+
+
+def cmd_base(args):
+    pool = cms_core.get_image_pool()
+    if args.action == "list":
+        bases = pool.bases()
+        _print(args, bases, "\n".join(f"{name:20} {len(info['overlays'])} overlays  {info['path']}"
+                                      for name, info in bases.items()) or "No base images.")
+    elif args.action == "add":
+        if not args.source:
+            raise ValueError("'base add' needs a source image.")
+        path = pool.add_base(args.source, name=args.name, move=args.move)
+        _print(args, {"path": path}, f"Base image added at {path}")
+    elif args.action == "remove":
+        name = args.name or args.source
+        pool.remove_base(name)
+        _print(args, {"name": name}, f"Base image {name} removed.")
+
+
+def cmd_overlay(args):
+    pool = cms_core.get_image_pool()
+    if args.action == "list":
+        overlays = pool.overlays()
+        _print(args, overlays, "\n".join(f"{name:24} base {info['base']:16} {info['path']}"
+                                         for name, info in overlays.items()) or "No overlays.")
+        return
+    if not args.name:
+        raise ValueError(f"'overlay {args.action}' needs an overlay name.")
+    if args.action == "create":
+        if not args.base:
+            raise ValueError("'overlay create' needs --base.")
+        start = time.monotonic()
+        path = pool.create_overlay(args.base, args.name, size=args.size, preallocation=args.preallocation,
+                                   cluster_size=args.cluster_size)
+        duration = time.monotonic() - start
+        _print(args, {"path": path, "seconds": duration}, f"Overlay created at {path} in {duration:.3f} seconds.")
+    elif args.action == "commit":
+        cms_core.commit_overlay(args.name, new_base=args.new_base)
+        _print(args, {"name": args.name}, f"Overlay {args.name} committed into {args.new_base or 'its base'}.")
+    elif args.action == "discard":
+        cms_core.discard_overlay(args.name)
+        _print(args, {"name": args.name}, f"Overlay {args.name} discarded.")
+
+
+def cmd_vm(args):
+    manager = cms_core.get_vm_manager()
+    if args.action == "list":
+        vms = manager.list()
+        rows = [dict(vm.as_dict(), status=manager.status(vm.name)) for vm in vms]
+        _print(args, rows, "\n".join(f"{r['name']:20} {r['status']:12} pid {r['pid']:<8} {r['cpu']} CPU "
+                                      f"{r['memory']}MB  {r['disk']}" for r in rows) or "No VMs.")
+        return
+    if not args.name:
+        raise ValueError(f"'vm {args.action}' needs a VM name.")
+    if args.action == "status":
+        status = manager.status(args.name)
+        _print(args, {"name": args.name, "status": status}, status)
+        return
+    action = {"pause": manager.pause, "resume": manager.resume, "shutdown": manager.shutdown,
+              "kill": manager.kill, "remove": manager.remove}[args.action]
+    action(args.name)
+    _print(args, {"name": args.name, "action": args.action}, f"VM {args.name}: {args.action} done.")
+
+
+def cmd_create_dockerfile(args):
+    if args.template:
+        content = dockerfile_templates.template(args.template)
+    elif args.file == "-":
+        content = sys.stdin.read()
+    else:
+        with open(args.file) as f:
+            content = f.read()
+    path = cms_core.create_dockerfile(args.directory, content.strip() + "\n")
+    _print(args, {"path": path}, f"Dockerfile created at {path}")
+
+
+def cmd_lint(args):
+    analysis = cms_core.analyze_dockerfile(args.directory)
+    _print(args, analysis.as_dict(), "\n".join([str(f) for f in analysis.findings] + [analysis.summary()]))
+    failing = (dockerfile_lint.ERROR,) if not args.strict else (dockerfile_lint.ERROR, dockerfile_lint.WARNING)
+    if any(f.severity in failing for f in analysis.findings):
+        raise RuntimeError("Dockerfile analysis found problems.")
+
+
+def cmd_build(args):
+    on_log = None if args.json or args.quiet else (lambda line: print(line, flush=True))
+    report = cms_core.build_docker_image(args.path, args.name, args.tag, buildkit=args.buildkit,
+                                         cache_from=args.cache_from or (), cache_to=args.cache_to, on_log=on_log)
+    _print(args, report.as_dict(), report.summary())
+
+
+def cmd_images(args):
+    filters = (args.reference, args.dangling, args.label, args.since, args.before)
+    if not args.long and not any(filters):
+        image_tags = cms_core.list_docker_images()
+        _print(args, image_tags, "\n".join(", ".join(tags) for tags in image_tags) or "No images found.")
+        return
+    records = cms_core.browse_images(reference=args.reference, dangling=args.dangling, label=args.label,
+                                     since=args.since, before=args.before, sort=args.sort, reverse=args.reverse)
+    if not args.long:
+        _print(args, [r.tags for r in records], "\n".join(r.name for r in records) or "No images found.")
+        return
+    usage = cms_core.image_disk_usage()
+    if args.json:
+        print(json.dumps({"images": [r.as_dict() for r in records], "disk_usage": usage}))
+        return
+    now = time.time()
+    print(f"{'IMAGE ID':12}  {'SIZE':>9}  {'CREATED':16}  {'USED BY':>7}  TAGS")
+    for r in records:
+        used_by = str(r.containers) if r.containers >= 0 else "-"
+        print(f"{r.short_id:12}  {image_browser.format_size(r.size):>9}  {image_browser.format_age(r.age(now)):16}  "
+              f"{used_by:>7}  {', '.join(r.tags) or '<none>'}")
+    print(f"{len(records)} images, {image_browser.format_size(sum(r.size for r in records))}. "
+          f"Image store: {image_browser.format_size(usage['size'])}, "
+          f"{image_browser.format_size(usage['reclaimable'])} reclaimable.")
+
+
+def cmd_inspect(args):
+    report = cms_core.inspect_image_layers(args.image, top_files=args.files, shared=not args.no_shared)
+    if args.json:
+        print(json.dumps(report.as_dict()))
+        return
+    print(f"{'#':>3}  {'SIZE':>9}  {'WASTED':>9}  {'SHARED WITH':20}  CREATED BY")
+    for layer in report.layers:
+        if layer.empty and not args.all:
+            continue
+        shared = ", ".join(layer.shared_with)
+        wasted = image_browser.format_size(layer.wasted) if layer.wasted else ""
+        print(f"{layer.index:3}  {image_browser.format_size(layer.size):>9}  {wasted:>9}  {shared[:20]:20}  "
+              f"{layer.instruction[:70]}")
+        for size, path in layer.top_files:
+            print(f"{'':5}{image_browser.format_size(size):>9}  {path}")
+    print(report.summary())
+
+
+def cmd_containers(args):
+    running = cms_core.list_running_containers()
+    _print(args, [{"id": cid, "name": name} for cid, name in running],
+           "\n".join(f"{cid} - {name}" for cid, name in running) or "No containers running.")
+
+
+def cmd_stop(args):
+    name = cms_core.stop_container(args.container)
+    _print(args, {"name": name}, f"Container {name} stopped successfully.")
+
+
+def cmd_search(args):
+    matches = cms_core.search_image(args.name, limit=args.limit)
+    _print(args, matches, "\n".join(matches) or "Image not found.")
+    if args.stats:
+        print(json.dumps(cms_core.get_image_catalog().stats), file=sys.stderr)
+
+
+def cmd_search_hub(args):
+    if args.registry:
+        cms_core.set_registry(args.registry)
+    results = cms_core.search_registry(args.name, limit=args.limit, sort=args.sort)
+    lines = [f"{'NAME':40} {'STARS':>7} {'OFFICIAL':8}  DESCRIPTION"]
+    lines += [f"{r.name[:40]:40} {r.stars:7} {'[OK]' if r.official else '':8}  {r.description[:60]}" for r in results]
+    _print(args, [r.as_dict() for r in results], "\n".join(lines) if results else "No results found.")
+
+
+def cmd_tags(args):
+    if args.registry:
+        cms_core.set_registry(args.registry)
+    tags = cms_core.list_registry_tags(args.repository, limit=args.limit)
+    lines = [f"{t.name:30} {f'{t.size / 1e6:.1f} MB' if t.size else '':>10}  {t.updated or ''}" for t in tags]
+    _print(args, [t.as_dict() for t in tags], "\n".join(lines) or "No tags found.")
+
+
+def cmd_pull(args):
+    image = cms_core.download_image(args.image)
+    _print(args, {"id": image.id, "tags": image.tags}, f"Image {args.image} downloaded successfully.")
+
+
+def cmd_pull_batch(args):
+    references = list(args.images)
+    if args.manifest:
+        references += bulk_pull.read_manifest(args.manifest)
+    if not references:
+        raise ValueError("No images given.")
+
+    def report(result):
+        if not args.json:
+            line = (f"{result.status:8} {result.reference}  {result.bytes / 1e6:.1f} MB  "
+                    f"{result.duration:.2f}s  {result.throughput / 1e6:.2f} MB/s  "
+                    f"layers {result.layers} (shared {result.shared_layers})")
+            print(line + (f"  error: {result.error}" if result.error else ""), flush=True)
+
+    results = cms_core.bulk_download_images(references, concurrency=args.concurrency,
+                                            skip_existing=not args.no_skip, on_result=report)
+    total = sum(r.bytes for r in results)
+    _print(args, [r.as_dict() for r in results],
+           f"Total: {len(results)} images, {total / 1e6:.1f} MB")
+    if any(r.status == bulk_pull.FAILED for r in results):
+        raise RuntimeError("Some images failed to download.")
+
+
+def cmd_run(args):
+    name = cms_core.run_container(args.image, args.name)
+    _print(args, {"name": name}, f"Container {name} is running.")
+
+
+def _print_batch(args, results, summary):
+    if args.json:
+        print(json.dumps({"results": [r.as_dict() for r in results], "summary": summary}))
+        return
+    for r in results:
+        print(f"{'ok' if r.ok else 'FAILED':6} {r.action} {r.target}  {r.seconds:.2f}s"
+              + (f"  error: {r.error}" if r.error else ""))
+    if results:
+        print(f"{summary['ok']}/{summary['count']} succeeded in {summary['wall_seconds']:.2f}s "
+              f"(per operation min {summary['min']:.2f}s, median {summary['median']:.2f}s, "
+              f"max {summary['max']:.2f}s)")
+    else:
+        print("No matching containers.")
+
+
+def cmd_run_batch(args):
+    labels = batch_containers.parse_env(args.label)
+    batch_id, results, summary = cms_core.launch_replicas(
+        args.image, args.replicas, concurrency=args.concurrency, name_template=args.name_template,
+        env=batch_containers.parse_env(args.env), ports=batch_containers.parse_ports(args.port),
+        cpus=args.cpus, mem_limit=args.memory, labels=labels)
+    summary["batch"] = batch_id
+    _print_batch(args, results, summary)
+    if not args.json:
+        print(f"Batch label: {batch_containers.BATCH_LABEL}={batch_id}")
+    if summary["failed"]:
+        raise RuntimeError(f"{summary['failed']} containers failed to start.")
+
+
+def cmd_stop_batch(args):
+    results, summary = cms_core.stop_matching_containers(label=args.label, name_pattern=args.name,
+                                                         timeout=args.timeout, remove=args.remove,
+                                                         concurrency=args.concurrency)
+    _print_batch(args, results, summary)
+    if summary["failed"]:
+        raise RuntimeError(f"{summary['failed']} containers failed to stop.")
+
+
+def cmd_hosts(args):
+    pool = cms_core.get_host_pool()
+    if args.action == "add":
+        if not args.name or not args.url:
+            raise ValueError("'hosts add' needs a name and a URL.")
+        tls = {k: v for k, v in (("ca_cert", args.tls_ca), ("client_cert", args.tls_cert),
+                                 ("client_key", args.tls_key)) if v}
+        pool.add(args.name, args.url, tls=tls or None)
+        _print(args, {"name": args.name, "url": args.url}, f"Docker host {args.name} added.")
+    elif args.action == "remove":
+        if not args.name:
+            raise ValueError("'hosts remove' needs a name.")
+        pool.remove(args.name)
+        _print(args, {"name": args.name}, f"Docker host {args.name} removed.")
+    elif args.action == "import":
+        added = pool.import_contexts()
+        _print(args, added, f"Imported Docker contexts: {', '.join(added)}" if added else "No new Docker contexts.")
+    elif args.action == "check":
+        statuses = pool.check([args.name] if args.name else None)
+        lines = [f"{s.name:16} {s.status:10} "
+                 + (f"{s.latency * 1000:7.1f} ms  Docker {s.version}" if s.latency is not None else s.error or "")
+                 for s in statuses]
+        _print(args, [s.as_dict() for s in statuses], "\n".join(lines))
+    else:
+        hosts = pool.hosts()
+        _print(args, hosts, "\n".join(f"{name:16} {config['url'] or '(environment)'}"
+                                      for name, config in hosts.items()))
+
+
+def _print_fleet(args, rows, errors, columns, empty):
+    if args.json:
+        print(json.dumps({"rows": rows, "errors": {host: str(e) for host, e in errors.items()}}))
+    else:
+        if rows:
+            print("  ".join(f"{c.upper():{w}}" for c, w in columns).rstrip())
+            for row in rows:
+                print("  ".join(f"{str(row[c])[:w]:{w}}" for c, w in columns).rstrip())
+        else:
+            print(empty)
+    for host, error in errors.items():
+        print(f"{host}: {error}", file=sys.stderr)
+
+
+def cmd_fleet(args):
+    hosts = args.hosts.split(",") if args.hosts else None
+    if args.action == "containers":
+        rows, errors = cms_core.fleet_containers(hosts, include_stopped=args.all)
+        _print_fleet(args, rows, errors, (("host", 16), ("id", 12), ("name", 24), ("image", 30), ("status", 20)),
+                     "No containers found.")
+    elif args.action == "images":
+        rows, errors = cms_core.fleet_images(hosts)
+        for row in rows:
+            row["tags"] = ", ".join(row["tags"]) or "<none>"
+            if not args.json:
+                row["size"] = image_browser.format_size(row["size"])
+        _print_fleet(args, rows, errors, (("host", 16), ("id", 12), ("size", 9), ("tags", 60)), "No images found.")
+    else:
+        if not args.target:
+            raise ValueError(f"'fleet {args.action}' needs a {'query' if args.action == 'search' else 'container'}.")
+        if args.action == "search":
+            rows, errors = cms_core.fleet_search(args.target, hosts)
+            _print_fleet(args, rows, errors, (("host", 16), ("id", 12), ("tag", 60)), "Image not found.")
+        else:
+            rows, errors = cms_core.fleet_stop(args.target, hosts)
+            _print_fleet(args, rows, errors, (("host", 16), ("id", 12), ("name", 24)),
+                         f"No host has a container {args.target}.")
+    if errors:
+        raise RuntimeError(f"{len(errors)} of the hosts failed.")
+
+
+def cmd_reconcile(args):
+    plan, results, summary = cms_core.reconcile_spec(args.spec, dry_run=args.dry_run, prune=not args.no_prune,
+                                                     concurrency=args.concurrency)
+    if args.dry_run or not plan.actions:
+        _print(args, plan.as_dict(), plan.describe())
+        return
+    _print_batch(args, results, summary)
+    if summary["failed"]:
+        raise RuntimeError(f"{summary['failed']} reconcile actions failed.")
+
+
+def _reclaim_policy(args):
+    policy = reclaim.ReclaimPolicy.load(args.policy).as_dict() if args.policy else {}
+    for field in reclaim.ReclaimPolicy.FIELDS:
+        if getattr(args, field) is not None:
+            policy[field] = getattr(args, field)
+    if not any(value not in (None, False) for value in policy.values()):
+        raise ValueError("No reclaim rules given; see 'cms reclaim --help'.")
+    return reclaim.ReclaimPolicy(**policy)
+
+
+def cmd_reclaim(args):
+    policy = _reclaim_policy(args)
+    targets = {"include_docker": not args.no_docker, "include_overlays": not args.no_overlays}
+    if args.watch:
+        reclaimer = cms_core.start_reclaimer(policy, interval=args.watch, concurrency=args.concurrency, **targets)
+        print(f"Reclaiming every {args.watch:.0f} seconds, press Ctrl-C to stop.", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            reclaimer.stop()
+        return
+    if args.dry_run:
+        plan = cms_core.reclaim_plan(policy, **targets)
+        _print(args, plan.as_dict(), plan.describe())
+        return
+    results, summary = cms_core.reclaim_disk_space(policy, concurrency=args.concurrency, **targets)
+    if not results:
+        _print(args, {"results": [], "summary": summary}, "Nothing to reclaim.")
+        return
+    _print_batch(args, results, summary)
+    if not args.json:
+        print(f"Reclaimed {summary['bytes'] / 1e6:.1f} MB.")
+    if summary["failed"]:
+        raise RuntimeError(f"{summary['failed']} removals failed.")
+
+
+def cmd_stats(args):
+    aggregator = cms_core.container_stats_aggregator()
+    aggregator.start()
+    try:
+        for i in range(args.count):
+            time.sleep(args.interval)
+            rows = aggregator.snapshot(spark_width=20)
+            if args.json:
+                print(json.dumps(rows), flush=True)
+                continue
+            print(f"{'NAME':24} {'CPU %':>7} {'MEM MB':>9} {'MEM %':>6} {'NET RX/s':>10} {'NET TX/s':>10} "
+                  f"{'BLK R/s':>10} {'BLK W/s':>10}  CPU HISTORY")
+            for row in rows:
+                print(f"{row['name'][:24]:24} {row['cpu']:7.1f} {row['memory'] / 2**20:9.1f} "
+                      f"{row['memory_percent']:6.1f} {row['net_rx_rate'] / 1024:9.1f}K "
+                      f"{row['net_tx_rate'] / 1024:9.1f}K {row['block_read_rate'] / 1024:9.1f}K "
+                      f"{row['block_write_rate'] / 1024:9.1f}K  {row['spark']}")
+            print(flush=True)
+    finally:
+        aggregator.stop()
+
+
+def cmd_report(args):
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    summary = telemetry.summarize(telemetry.load_records(args.file, operation=args.op, since=since))
+    if args.json:
+        print(json.dumps(summary))
+        return
+    if not summary:
+        print(f"No metrics recorded in {args.file}.")
+        return
+    print(f"{'OPERATION':24} {'COUNT':>6} {'FAIL':>5} {'MEAN s':>8} {'P50 s':>8} {'P95 s':>8} {'P99 s':>8} "
+          f"{'API':>6} {'MB':>9}")
+    for operation, row in summary.items():
+        print(f"{operation[:24]:24} {row['count']:6} {row['failures']:5} {row['mean']:8.3f} {row['p50']:8.3f} "
+              f"{row['p95']:8.3f} {row['p99']:8.3f} {row['api_calls']:6} {row['bytes'] / 1e6:9.1f}")
+
+
+def cmd_history(args):
+    store = cms_core.get_history_store()
+    since = time.time() - history_store.parse_age(args.since) if args.since else None
+    if args.action == "import":
+        written, duplicates = store.written, store.duplicates
+        count = store.import_jsonl(args.file)
+        store.flush()
+        skipped = store.duplicates - duplicates
+        _print(args, {"read": count, "imported": store.written - written, "skipped": skipped},
+               f"Imported {store.written - written} of {count} records from {args.file} "
+               f"({skipped} were already recorded).")
+        return
+    if args.action == "prune":
+        if not args.since:
+            raise ValueError("'history prune' needs --since; older operations are deleted.")
+        deleted = store.prune(since)
+        _print(args, {"deleted": deleted}, f"Deleted {deleted} operations.")
+        return
+    if args.action == "failures":
+        rows = store.failure_rates(by=args.by, op=args.op, since=since, min_count=args.min_count)[:args.limit]
+        lines = [f"{args.by.upper():40} {'COUNT':>7} {'FAIL':>6} {'RATE':>6} {'MEAN s':>8}"]
+        lines += [f"{str(r['key'])[:40]:40} {r['count']:7} {r['failures']:6} {r['rate']:6.1%} {r['mean_seconds']:8.3f}"
+                  for r in rows]
+        _print(args, rows, "\n".join(lines) if rows else "No operations recorded.")
+        return
+    if args.action == "summary":
+        rows = store.summary(since=since, op=args.op)
+        lines = [f"{'OPERATION':24} {'COUNT':>7} {'FAIL':>6} {'MEAN s':>8} {'MAX s':>8} {'API':>7} {'MB':>9}"]
+        lines += [f"{r['op'][:24]:24} {r['count']:7} {r['failures']:6} {r['mean']:8.3f} {r['max']:8.3f} "
+                  f"{r['api_calls']:7} {r['bytes'] / 1e6:9.1f}" for r in rows]
+        _print(args, rows, "\n".join(lines) if rows else "No operations recorded.")
+        return
+    order = "seconds" if args.action == "slowest" else "ts"
+    rows = store.query(op=args.op, target=args.target, outcome=args.outcome, since=since, order=order,
+                       limit=args.limit)
+    lines = [f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(r['ts']))}  {r['op'][:20]:20} "
+             f"{str(r['target'] or '')[:30]:30} {r['seconds']:9.3f}s  {r['outcome']:9} {r['error'] or ''}".rstrip()
+             for r in rows]
+    _print(args, rows, "\n".join(lines) or "No operations recorded.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cms", description="Cloud Management System command line.")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON output")
+    parser.add_argument("--log-level", type=str.upper, choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="log level for cloud_management_system.log (default INFO or $CMS_LOG_LEVEL)")
+    parser.add_argument("--log-levels", type=cms_logging.parse_levels,
+                        help="per-subsystem levels, e.g. vm=DEBUG,registry=WARNING (subsystems: "
+                             f"{', '.join(cms_logging.SUBSYSTEMS)})")
+    parser.add_argument("--log-json", action="store_true", default=None, help="write the log as JSON lines")
+    parser.add_argument("--host", help="registered Docker host to use (see 'cms hosts'; default: $DOCKER_HOST)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("create-vm", help="boot an existing image or install a new VM")
+    p.add_argument("--cpu")
+    p.add_argument("--memory", help="memory size in MB")
+    p.add_argument("--image", help="existing qcow2 image to boot")
+    p.add_argument("--disk-size", help="size in MB of a new disk image")
+    p.add_argument("--disk-path", help="where to create the new disk image")
+    p.add_argument("--iso", help="boot ISO for a new VM")
+    p.add_argument("--config", help="JSON file with cpu, memory and disk_size")
+    p.add_argument("--base", help="boot a copy-on-write overlay of this pool base image")
+    p.add_argument("--name", help="VM name (defaults to the disk file name)")
+    p.add_argument("--no-kvm", action="store_true", help="use TCG emulation even if /dev/kvm is available")
+    p.add_argument("--cache", default="none", choices=vm_manager.CACHE_MODES, help="disk cache mode")
+    p.add_argument("--aio", default="native", choices=vm_manager.AIO_MODES, help="disk AIO mode")
+    p.add_argument("--hugepages", action="store_true", help="back guest memory with /dev/hugepages")
+    p.add_argument("--wait", action="store_true", help="wait until the VM exits")
+    p.set_defaults(func=cmd_create_vm)
+
+    p = subparsers.add_parser("base", help="manage golden base images")
+    p.add_argument("action", choices=("list", "add", "remove"))
+    p.add_argument("source", nargs="?", help="qcow2 image to add, or the base name to remove")
+    p.add_argument("--name", help="base image name (defaults to the file name)")
+    p.add_argument("--move", action="store_true", help="move the image into the pool instead of copying it")
+    p.set_defaults(func=cmd_base)
+
+    p = subparsers.add_parser("overlay", help="manage copy-on-write VM overlays")
+    p.add_argument("action", choices=("list", "create", "commit", "discard"))
+    p.add_argument("name", nargs="?")
+    p.add_argument("--base", help="base image for 'create'")
+    p.add_argument("--size", help="virtual size, e.g. 40G (defaults to the base size)")
+    p.add_argument("--preallocation", choices=("off", "metadata"), help="qcow2 preallocation mode")
+    p.add_argument("--cluster-size", help="qcow2 cluster size, e.g. 64k or 2M")
+    p.add_argument("--new-base", help="for 'commit': flatten into a new base image instead")
+    p.set_defaults(func=cmd_overlay)
+
+    p = subparsers.add_parser("vm", help="list and control running VMs")
+    p.add_argument("action", choices=("list", "status", "pause", "resume", "shutdown", "kill", "remove"))
+    p.add_argument("name", nargs="?")
+    p.set_defaults(func=cmd_vm)
+
+    p = subparsers.add_parser("create-dockerfile", help="write a Dockerfile from a file, stdin or a template")
+    p.add_argument("directory")
+    p.add_argument("file", nargs="?", default="-", help="source file, or - for stdin")
+    p.add_argument("--template", choices=sorted(dockerfile_templates.TEMPLATES), help="start from a template")
+    p.set_defaults(func=cmd_create_dockerfile)
+
+    p = subparsers.add_parser("lint", help="check a Dockerfile for build-performance problems")
+    p.add_argument("directory", nargs="?", default=".", help="directory with the Dockerfile (the build context)")
+    p.add_argument("--strict", action="store_true", help="also fail on warnings")
+    p.set_defaults(func=cmd_lint)
+
+    p = subparsers.add_parser("build", help="build a Docker image")
+    p.add_argument("path", help="directory containing the Dockerfile")
+    p.add_argument("name")
+    p.add_argument("tag", nargs="?", default="latest")
+    p.add_argument("--buildkit", action="store_true", help="build with BuildKit through the docker CLI")
+    p.add_argument("--cache-from", action="append",
+                   help="cache source, repeatable (image ref; with BuildKit e.g. type=local,src=DIR)")
+    p.add_argument("--cache-to", help="BuildKit cache export, e.g. type=local,dest=DIR,mode=max")
+    p.add_argument("-q", "--quiet", action="store_true", help="do not stream build output")
+    p.set_defaults(func=cmd_build)
+
+    p = subparsers.add_parser("images", help="list local Docker images")
+    p.add_argument("reference", nargs="?", help="repository pattern, e.g. nginx or 'registry.local/*'")
+    p.add_argument("-l", "--long", action="store_true", help="show ids, sizes, ages and reclaimable space")
+    p.add_argument("--dangling", action="store_true", default=None, help="only untagged images")
+    p.add_argument("--label", action="append", help="KEY or KEY=VALUE, repeatable")
+    p.add_argument("--since", help="only images created after this image")
+    p.add_argument("--before", help="only images created before this image")
+    p.add_argument("--sort", default="created", choices=image_browser.SORT_KEYS)
+    p.add_argument("--reverse", action="store_true", help="reverse the sort order")
+    p.set_defaults(func=cmd_images)
+
+    p = subparsers.add_parser("inspect", help="show the layers of an image and what makes it large")
+    p.add_argument("image")
+    p.add_argument("--files", type=int, default=0, metavar="N",
+                   help="stream the image and list the N largest files of each layer")
+    p.add_argument("--no-shared", action="store_true", help="do not compare layers with other local images")
+    p.add_argument("-a", "--all", action="store_true", help="also show steps that created no layer")
+    p.set_defaults(func=cmd_inspect)
+
+    p = subparsers.add_parser("containers", help="list running containers")
+    p.set_defaults(func=cmd_containers)
+
+    p = subparsers.add_parser("stats", help="show live resource usage of running containers")
+    p.add_argument("-i", "--interval", type=float, default=2.0, help="seconds between reports")
+    p.add_argument("-n", "--count", type=int, default=10, help="number of reports")
+    p.set_defaults(func=cmd_stats)
+
+    p = subparsers.add_parser("stop", help="stop a container")
+    p.add_argument("container", help="container id or name")
+    p.set_defaults(func=cmd_stop)
+
+    p = subparsers.add_parser("search", help="search local images by name")
+    p.add_argument("name")
+    p.add_argument("--limit", type=int, help="maximum number of matches")
+    p.add_argument("--stats", action="store_true", help="print image catalog statistics to stderr")
+    p.set_defaults(func=cmd_search)
+
+    p = subparsers.add_parser("search-hub", help="search DockerHub (or another registry)")
+    p.add_argument("name")
+    p.add_argument("--limit", type=int, default=25)
+    p.add_argument("--sort", default="stars", choices=registry_search.SORT_KEYS)
+    p.add_argument("--registry", help="v2 registry URL to search instead of Docker Hub ($CMS_REGISTRY_URL)")
+    p.set_defaults(func=cmd_search_hub)
+
+    p = subparsers.add_parser("tags", help="list the tags of a registry repository")
+    p.add_argument("repository", help="e.g. nginx or bitnami/redis")
+    p.add_argument("--limit", type=int, default=100)
+    p.add_argument("--registry", help="v2 registry URL instead of Docker Hub ($CMS_REGISTRY_URL)")
+    p.set_defaults(func=cmd_tags)
+
+    p = subparsers.add_parser("pull", help="download a Docker image")
+    p.add_argument("image")
+    p.set_defaults(func=cmd_pull)
+
+    p = subparsers.add_parser("pull-batch", help="download many images in parallel")
+    p.add_argument("images", nargs="*", help="image references")
+    p.add_argument("-f", "--manifest", help="file with one image per line, or a JSON list")
+    p.add_argument("-c", "--concurrency", type=int, default=4)
+    p.add_argument("--no-skip", action="store_true", help="pull even if the reference is already present")
+    p.set_defaults(func=cmd_pull_batch)
+
+    p = subparsers.add_parser("run", help="run a detached container")
+    p.add_argument("image")
+    p.add_argument("--name")
+    p.set_defaults(func=cmd_run)
+
+    p = subparsers.add_parser("run-batch", help="start many replicas of an image in parallel")
+    p.add_argument("image")
+    p.add_argument("-n", "--replicas", type=int, default=1)
+    p.add_argument("--name-template", default="{image}-{batch}-{index}",
+                   help="container name; may use {image}, {index} and {batch}")
+    p.add_argument("-e", "--env", action="append", help="KEY=VALUE, repeatable")
+    p.add_argument("-p", "--port", action="append",
+                   help="HOST:CONTAINER; the host port is offset by the replica index")
+    p.add_argument("-l", "--label", action="append", help="KEY=VALUE, repeatable")
+    p.add_argument("--cpus", help="CPU limit per container, e.g. 0.5")
+    p.add_argument("--memory", help="memory limit per container, e.g. 256m")
+    p.add_argument("-c", "--concurrency", type=int, default=8)
+    p.set_defaults(func=cmd_run_batch)
+
+    p = subparsers.add_parser("stop-batch", help="stop containers by label or name pattern in parallel")
+    p.add_argument("-l", "--label", help="label filter, KEY or KEY=VALUE")
+    p.add_argument("--name", help="shell-style name pattern, e.g. 'web-*'")
+    p.add_argument("-t", "--timeout", type=int, default=10, help="seconds to wait before killing")
+    p.add_argument("--remove", action="store_true", help="also remove the containers")
+    p.add_argument("-c", "--concurrency", type=int, default=8)
+    p.set_defaults(func=cmd_stop_batch)
+
+    p = subparsers.add_parser("hosts", help="manage the Docker hosts used by --host and fleet")
+    p.add_argument("action", choices=("list", "add", "remove", "check", "import"), nargs="?", default="list")
+    p.add_argument("name", nargs="?")
+    p.add_argument("url", nargs="?", help="unix:///var/run/docker.sock, tcp://host:2376 or ssh://user@host")
+    p.add_argument("--tls-ca", help="CA certificate for a TLS tcp:// host")
+    p.add_argument("--tls-cert", help="client certificate for a TLS tcp:// host")
+    p.add_argument("--tls-key", help="client key for a TLS tcp:// host")
+    p.set_defaults(func=cmd_hosts)
+
+    p = subparsers.add_parser("fleet", help="list, search and stop across all Docker hosts at once")
+    p.add_argument("action", choices=("containers", "images", "search", "stop"))
+    p.add_argument("target", nargs="?", help="search query or container to stop")
+    p.add_argument("--hosts", help="comma-separated host names (default: all)")
+    p.add_argument("-a", "--all", action="store_true", help="include stopped containers")
+    p.set_defaults(func=cmd_fleet)
+
+    p = subparsers.add_parser("reconcile", help="converge containers and VMs to a JSON spec file")
+    p.add_argument("spec", help="JSON file with 'containers' and/or 'vms'")
+    p.add_argument("--dry-run", action="store_true", help="only print the planned actions")
+    p.add_argument("--no-prune", action="store_true", help="keep containers of services not in the spec")
+    p.add_argument("-c", "--concurrency", type=int, default=8)
+    p.set_defaults(func=cmd_reconcile)
+
+    p = subparsers.add_parser("reclaim", help="free disk space used by images, containers, build cache and overlays")
+    p.add_argument("--policy", help="JSON file with reclaim policy keys")
+    p.add_argument("--keep-tags", type=int, help="untag all but the newest N tags of each repository")
+    p.add_argument("--dangling", action="store_true", default=None,
+                   help="remove untagged images that were not pulled by digest")
+    p.add_argument("--image-unused-days", type=float, help="remove images unused for N days")
+    p.add_argument("--container-age-days", type=float, help="remove stopped containers created N days ago")
+    p.add_argument("--cache-unused-days", type=float, help="prune build cache unused for N days")
+    p.add_argument("--overlay-unused-days", type=float, help="discard VM overlays unused for N days")
+    p.add_argument("--high-water", type=float, help="disk usage fraction that triggers LRU eviction, e.g. 0.85")
+    p.add_argument("--low-water", type=float, help="evict until usage is below this fraction")
+    p.add_argument("--no-docker", action="store_true", help="leave images, containers and build cache alone")
+    p.add_argument("--no-overlays", action="store_true", help="leave VM overlays alone")
+    p.add_argument("--dry-run", action="store_true", help="only print what would be removed")
+    p.add_argument("--watch", type=float, metavar="SECONDS", help="keep applying the policy every N seconds")
+    p.add_argument("-c", "--concurrency", type=int, default=4)
+    p.set_defaults(func=cmd_reclaim)
+
+    p = subparsers.add_parser("report", help="summarize recorded operation latencies")
+    p.add_argument("--file", default=telemetry.METRICS_FILE, help="metrics file to read")
+    p.add_argument("--op", help="only this operation, e.g. image.pull")
+    p.add_argument("--since-hours", type=float, help="only operations from the last N hours")
+    p.set_defaults(func=cmd_report)
+
+    p = subparsers.add_parser("history", help="query the operation history database")
+    p.add_argument("action", nargs="?", default="list",
+                   choices=("list", "slowest", "failures", "summary", "import", "prune"))
+    p.add_argument("--op", help="operation, or a prefix ending in * (e.g. image.*)")
+    p.add_argument("--target", help="image, container or VM, or a prefix ending in *")
+    p.add_argument("--outcome", choices=(telemetry.OK, telemetry.ERROR, telemetry.CANCELLED))
+    p.add_argument("--since", help="only the last 30m, 24h, 7d, ... (prune: delete older operations)")
+    p.add_argument("--by", choices=history_store.GROUP_KEYS, default="target", help="grouping for failures")
+    p.add_argument("--min-count", type=int, default=1, help="failures: skip groups with fewer operations")
+    p.add_argument("--limit", type=int, default=20)
+    p.add_argument("--file", default=telemetry.METRICS_FILE, help="metrics file for import")
+    p.set_defaults(func=cmd_history)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    cms_core.configure_logging(level=args.log_level, levels=args.log_levels, json_format=args.log_json)
+    cms_core.get_history_store()
+    try:
+        if args.host:
+            cms_core.use_host(args.host)
+        args.func(args)
+    except Exception as e:
+        logging.error(f"cms {args.command} failed: {e}")
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,576 @@
+"""GUI-independent Cloud Management System operations.
+
+Used by the Tk front end (cloud_management_system.py) and the command line
+(cms.py). Nothing here touches Tkinter, and the Docker client is only created
+the first time an operation needs it.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import batch_containers
+import cms_logging
+import docker_hosts
+import dockerfile_lint
+import dockerfile_templates
+import image_browser
+import image_inspector
+import history_store
+import reclaim
+import registry_search
+import reconcile
+import telemetry
+from bulk_pull import FAILED, bulk_pull, parse_reference, pull_image
+from container_stats import StatsAggregator
+from docker_build import build_image, context_size
+from image_catalog import ImageCatalog
+from image_pool import ImagePool
+from job_executor import run_process
+from vm_manager import VMManager
+
+LOG_FILE = cms_logging.LOG_FILE
+
+vm_log = logging.getLogger("cms.vm")
+build_log = logging.getLogger("cms.build")
+registry_log = logging.getLogger("cms.registry")
+container_log = logging.getLogger("cms.containers")
+
+_docker_client = None
+_docker_client_lock = threading.Lock()
+_image_catalog = None
+_vm_manager = None
+_image_pool = None
+_usage_tracker = None
+_registry_search = None
+_host_pool = None
+_history_store = None
+
+
+def configure_logging(level=None, filename=LOG_FILE, levels=None, json_format=None):
+    """Send logging to a rotating log file through a background thread; see cms_logging.configure."""
+    cms_logging.configure(filename=filename, level=level, levels=levels, json_format=json_format)
+
+
+def get_docker_client():
+    """Return the shared Docker client, connecting to the daemon on first use."""
+    global _docker_client
+    if _docker_client is None:
+        with _docker_client_lock:
+            if _docker_client is None:
+                import docker
+                logging.info("Connecting to Docker daemon.")
+                _docker_client = telemetry.instrument_client(docker.from_env())
+    return _docker_client
+
+
+def set_docker_client(client):
+    """Replace the shared Docker client (e.g. with one for another daemon)."""
+    global _docker_client
+    with _docker_client_lock:
+        _docker_client = telemetry.instrument_client(client)
+    if _image_catalog is not None:
+        _image_catalog.invalidate()
+
+
+def get_host_pool():
+    """Return the shared pool of registered Docker hosts; see docker_hosts.HostPool."""
+    global _host_pool
+    if _host_pool is None:
+        with _docker_client_lock:
+            if _host_pool is None:
+                _host_pool = docker_hosts.HostPool()
+    return _host_pool
+
+
+def use_host(name):
+    """Run single-host operations against the registered Docker host name from now on."""
+    set_docker_client(get_host_pool().client(name))
+    logging.info(f"Using Docker host {name}.")
+
+
+def get_history_store():
+    """Return the operation history database, recording every operation from now on.
+
+    The database is $CMS_HISTORY_DB or ~/.cms/history.db; see history_store.
+    """
+    global _history_store
+    if _history_store is None:
+        with _docker_client_lock:
+            if _history_store is None:
+                _history_store = history_store.attach(
+                    telemetry.get_recorder(), os.environ.get("CMS_HISTORY_DB") or history_store.DEFAULT_DB_FILE)
+    return _history_store
+
+
+def get_image_catalog():
+    """Return the shared local image catalog (loaded on first query)."""
+    global _image_catalog
+    if _image_catalog is None:
+        with _docker_client_lock:
+            if _image_catalog is None:
+                _image_catalog = ImageCatalog(get_docker_client)
+    return _image_catalog
+
+
+def get_vm_manager():
+    """Return the shared VM manager."""
+    global _vm_manager
+    if _vm_manager is None:
+        with _docker_client_lock:
+            if _vm_manager is None:
+                _vm_manager = VMManager()
+    return _vm_manager
+
+
+def get_image_pool():
+    """Return the shared base image / overlay pool."""
+    global _image_pool
+    if _image_pool is None:
+        with _docker_client_lock:
+            if _image_pool is None:
+                _image_pool = ImagePool()
+    return _image_pool
+
+
+def get_registry_search():
+    """Return the shared registry search client (Docker Hub unless $CMS_REGISTRY_URL names a v2 registry)."""
+    global _registry_search
+    if _registry_search is None:
+        with _docker_client_lock:
+            if _registry_search is None:
+                _registry_search = registry_search.RegistrySearch(
+                    registry_search.backend_for(os.environ.get("CMS_REGISTRY_URL")))
+    return _registry_search
+
+
+def set_registry(url):
+    """Search url (a v2 registry, or "hub" for Docker Hub) from now on; the cache is shared."""
+    get_registry_search().backend = registry_search.backend_for(url)
+
+
+def get_usage_tracker():
+    """Return the shared last-used timestamp store used by disk reclamation."""
+    global _usage_tracker
+    if _usage_tracker is None:
+        with _docker_client_lock:
+            if _usage_tracker is None:
+                _usage_tracker = reclaim.UsageTracker()
+    return _usage_tracker
+
+
+def _touch_images(*references):
+    keys = []
+    for reference in references:
+        repository, tag = parse_reference(reference)
+        keys.append(f"{repository}@{tag}" if "@" in reference else f"{repository}:{tag}")
+    if keys:
+        get_usage_tracker().touch("images", *keys)
+
+
+def overlay_in_use(name):
+    """Return the running VM whose disk is the named overlay, or None."""
+    path = get_image_pool().overlay_path(name)
+    manager = get_vm_manager()
+    return next((vm for vm in manager.list() if vm.disk == path and vm.is_running()), None)
+
+
+def commit_overlay(name, new_base=None):
+    """Commit an overlay (see ImagePool.commit_overlay), refusing while a VM is using it."""
+    vm = overlay_in_use(name)
+    if vm is not None:
+        raise ValueError(f"Overlay '{name}' is in use by running VM '{vm.name}'.")
+    get_image_pool().commit_overlay(name, new_base=new_base)
+
+
+def discard_overlay(name):
+    """Delete an overlay, refusing while a VM is using it."""
+    vm = overlay_in_use(name)
+    if vm is not None:
+        raise ValueError(f"Overlay '{name}' is in use by running VM '{vm.name}'.")
+    get_image_pool().discard_overlay(name)
+
+
+def load_vm_config(config_file):
+    """Load VM settings (cpu, memory, disk_size) from a JSON configuration file."""
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+    vm_log.info(f"Loaded configuration values from {config_file}: {config}")
+    return config
+
+
+def validate_vm_settings(cpu, memory, disk_size=None):
+    """Raise ValueError if the VM settings are not positive integers."""
+    cpu, memory = str(cpu), str(memory)
+    if not cpu.isdigit() or int(cpu) <= 0:
+        vm_log.error("Invalid CPU count entered.")
+        raise ValueError("Invalid CPU count.")
+    if not memory.isdigit() or int(memory) <= 0:
+        vm_log.error("Invalid memory size entered.")
+        raise ValueError("Invalid memory size.")
+    if disk_size is not None:
+        disk_size = str(disk_size)
+        if not disk_size.isdigit() or int(disk_size) <= 0:
+            vm_log.error("Invalid disk size entered.")
+            raise ValueError("Invalid disk size.")
+
+
+@telemetry.instrumented("vm.create", target=("name", "base_image", "image_path", "disk_path"))
+def create_vm(cpu, memory, image_path=None, disk_size=None, disk_path=None, iso_path=None, name=None,
+              base_image=None, wait=False, job=None, **vm_options):
+    """Start a VM with QEMU and return its vm_manager.VM record.
+
+    With base_image a copy-on-write overlay of that pool base image is created
+    (named after the VM) and booted. With image_path the existing disk image
+    is booted directly. Otherwise a new qcow2 disk of disk_size MB is created
+    at disk_path and booted from iso_path.
+    vm_options (kvm, cache, aio, hugepages, ...) go to build_qemu_command.
+    With wait=True the call blocks until the VM exits.
+    """
+    start_time = time.monotonic()
+    if base_image:
+        validate_vm_settings(cpu, memory)
+        name = name or f"{base_image}-{time.strftime('%Y%m%d-%H%M%S')}"
+        disk = get_image_pool().create_overlay(base_image, name)
+    elif image_path:
+        validate_vm_settings(cpu, memory)
+        if not os.path.exists(image_path):
+            vm_log.error(f"Image file does not exist: {image_path}")
+            raise FileNotFoundError("Selected image file does not exist.")
+        disk = image_path
+    else:
+        validate_vm_settings(cpu, memory, disk_size)
+        if not disk_path:
+            raise ValueError("No save location selected.")
+        if not iso_path:
+            raise ValueError("No ISO file selected.")
+
+        vm_log.info(f"Creating disk image at {disk_path} with size {disk_size}MB.")
+        if run_process(["qemu-img", "create", "-f", "qcow2", disk_path, f"{disk_size}M"], job=job) != 0:
+            raise RuntimeError(f"qemu-img failed to create {disk_path}")
+        disk = disk_path
+
+    manager = get_vm_manager()
+    iso = iso_path if not (image_path or base_image) else None
+    try:
+        vm = manager.launch(disk, cpu, memory, name=name, iso=iso, **vm_options)
+    except Exception:
+        if base_image:
+            # Do not leave an overlay nobody will boot in the pool
+            try:
+                get_image_pool().discard_overlay(name)
+            except (KeyError, ValueError, OSError) as e:
+                vm_log.warning(f"Could not discard overlay {name} after the failed launch: {e}")
+        raise
+    if base_image:
+        get_usage_tracker().touch("overlays", vm.name)
+    duration = time.monotonic() - start_time
+    vm_log.info(f"VM {vm.name} creation completed in {duration:.2f} seconds.")
+    if wait:
+        manager.wait(vm.name, job=job)
+    return vm
+
+
+@telemetry.instrumented("dockerfile.create", target="directory")
+def create_dockerfile(directory, content):
+    """Write content to <directory>/Dockerfile and return the file path."""
+    dockerfile_path = os.path.join(directory, "Dockerfile")
+    with open(dockerfile_path, 'w') as dockerfile:
+        dockerfile.write(content)
+    build_log.info(f"Dockerfile created at {dockerfile_path}.")
+    return dockerfile_path
+
+
+def build_context_stats(directory):
+    """Return (files, bytes, has_dockerignore) of a build context, or None if it cannot be measured."""
+    try:
+        return context_size(directory)
+    except Exception as e:
+        build_log.warning(f"Could not measure build context {directory}: {e}")
+        return None
+
+
+@telemetry.instrumented("dockerfile.lint", target="directory")
+def analyze_dockerfile(directory, content=None):
+    """Lint <directory>/Dockerfile (or content) and return a dockerfile_lint.Analysis."""
+    if content is None:
+        with open(os.path.join(directory, "Dockerfile")) as dockerfile:
+            content = dockerfile.read()
+    analysis = dockerfile_lint.analyze(content, build_context_stats(directory))
+    build_log.info(f"Dockerfile analysis of {directory}: {analysis.summary()}")
+    return analysis
+
+
+def create_dockerignore(directory):
+    """Write a default .dockerignore to directory unless one exists; returns its path."""
+    path = os.path.join(directory, ".dockerignore")
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists.")
+    with open(path, "w") as ignore_file:
+        ignore_file.write(dockerfile_templates.DOCKERIGNORE)
+    build_log.info(f".dockerignore created at {path}.")
+    return path
+
+
+@telemetry.instrumented("image.build", target="image_name", bytes_of=lambda report: report.context_bytes)
+def build_docker_image(path, image_name, tag, buildkit=False, cache_from=(), cache_to=None, on_log=None, job=None):
+    """Build the Dockerfile in path as image_name:tag and return a docker_build.BuildReport.
+
+    buildkit=True builds through the docker CLI with BuildKit, which also
+    supports exporting the build cache (cache_to). on_log receives each line
+    of build output as it is produced.
+    """
+    build_log.debug(f"Building image with name: {image_name} and tag: {tag}")
+    client = None if buildkit else get_docker_client()
+    report = build_image(client, path, f"{image_name}:{tag}", buildkit=buildkit, cache_from=cache_from,
+                         cache_to=cache_to, on_log=on_log, job=job)
+    _touch_images(f"{image_name}:{tag}")
+    build_log.info(f"Docker image {image_name}:{tag} built successfully.")
+    return report
+
+
+@telemetry.instrumented("image.list")
+def list_docker_images():
+    """Return the tags of every tagged local image, one list per image."""
+    image_tags = [entry.tags for entry in get_image_catalog().images() if entry.tags]
+    registry_log.debug(f"Found {len(image_tags)} tagged Docker images.")
+    return image_tags
+
+
+@telemetry.instrumented("image.browse", target="reference")
+def browse_images(reference=None, dangling=None, label=None, since=None, before=None, sort="created",
+                  reverse=False):
+    """Return image_browser.ImageRecords matching daemon-side filters, sorted by size, created or tag."""
+    records = image_browser.list_images(get_docker_client(), reference=reference, dangling=dangling, label=label,
+                                        since=since, before=before)
+    return image_browser.sort_images(records, sort, reverse)
+
+
+@telemetry.instrumented("image.disk_usage")
+def image_disk_usage():
+    """Total and reclaimable bytes of the local image store; see image_browser.disk_usage."""
+    return image_browser.disk_usage(get_docker_client())
+
+
+@telemetry.instrumented("image.inspect", target="reference", bytes_of=lambda report: report.scanned_bytes)
+def inspect_image_layers(reference, top_files=0, shared=True):
+    """Return an image_inspector.ImageReport: per-layer sizes, instructions, shared layers and largest files."""
+    return image_inspector.inspect_image(get_docker_client(), reference, top_files=top_files, shared=shared)
+
+
+@telemetry.instrumented("container.list")
+def list_running_containers():
+    """Return (short id, name) for every running container."""
+    containers = get_docker_client().containers.list()
+    running = [(container.id[:12], container.name) for container in containers]
+    container_log.debug(f"Found {len(running)} running containers.")
+    return running
+
+
+@telemetry.instrumented("container.stop", target="container_id")
+def stop_container(container_id):
+    """Stop a container by id or name and return its name."""
+    container = get_docker_client().containers.get(container_id)
+    container.stop()
+    container_log.info(f"Container {container.name} stopped successfully.")
+    return container.name
+
+
+@telemetry.instrumented("image.search", target="image_name")
+def search_image(image_name, limit=None):
+    """Return local image tags containing image_name (case-insensitive), best matches first."""
+    registry_log.debug(f"Searching for Docker image with name: {image_name}")
+    matches = get_image_catalog().search(image_name, limit=limit)
+    registry_log.info(f"Image search for '{image_name}' matched {len(matches)} tags.")
+    return matches
+
+
+@telemetry.instrumented("registry.search", target="query")
+def search_registry(query, limit=25, sort="stars"):
+    """Search the configured registry and return registry_search.SearchResults (cached)."""
+    results = registry_search.sort_results(get_registry_search().search(query, limit=limit), sort)
+    registry_log.info(f"Registry search for '{query}' returned {len(results)} repositories.")
+    return results
+
+
+@telemetry.instrumented("registry.tags", target="repository")
+def list_registry_tags(repository, limit=100):
+    """Return registry_search.TagInfos for a repository in the configured registry (cached)."""
+    return get_registry_search().tags(repository, limit=limit)
+
+
+def download_image(image_name, job=None):
+    """Pull an image from its registry and return it (recorded as an image.pull metric)."""
+    client = get_docker_client()
+    result = pull_image(client, image_name, skip_existing=False, job=job)
+    if result.error is not None:
+        raise result.error
+    _touch_images(image_name)
+    registry_log.info(f"Downloaded Docker image: {image_name}")
+    return client.images.get(image_name)
+
+
+@telemetry.instrumented("image.pull_batch", bytes_of=lambda results: sum(r.bytes for r in results))
+def bulk_download_images(references, concurrency=4, skip_existing=True, progress=None, on_result=None, job=None):
+    """Pull many images in parallel; see bulk_pull.bulk_pull."""
+    results = bulk_pull(get_docker_client(), references, concurrency=concurrency, skip_existing=skip_existing,
+                        progress=progress, on_result=on_result, job=job)
+    _touch_images(*(r.reference for r in results if r.status != FAILED))
+    return results
+
+
+@telemetry.instrumented("container.run", target="image_name")
+def run_container(image_name, container_name=None):
+    """Start a detached container from image_name and return its name."""
+    container_log.debug(f"Attempting to run container from image: {image_name}, with name: {container_name}")
+    container = get_docker_client().containers.run(
+        image_name,
+        name=container_name if container_name else None,
+        detach=True
+    )
+    _touch_images(image_name)
+    container_log.info(f"Container {container.name} is running.")
+    return container.name
+
+
+@telemetry.instrumented("container.launch_batch", target="image_name")
+def launch_replicas(image_name, replicas, concurrency=8, job=None, **options):
+    """Start replicas containers of image_name in parallel; see batch_containers.launch_replicas."""
+    _touch_images(image_name)
+    return batch_containers.launch_replicas(get_docker_client(), image_name, replicas,
+                                            concurrency=concurrency, job=job, **options)
+
+
+@telemetry.instrumented("container.stop_batch", target=("label", "name_pattern"))
+def stop_matching_containers(label=None, name_pattern=None, timeout=10, remove=False, concurrency=8, job=None):
+    """Stop every running container matching label and/or name_pattern in parallel.
+
+    Returns (results, summary) as batch_containers.stop_containers does.
+    """
+    if not label and not name_pattern:
+        raise ValueError("A label or name pattern is required.")
+    client = get_docker_client()
+    containers = batch_containers.select_containers(client, label=label, name_pattern=name_pattern,
+                                                    include_stopped=remove)
+    return batch_containers.stop_containers(client, containers, timeout=timeout, remove=remove,
+                                            concurrency=concurrency, job=job)
+
+
+@telemetry.instrumented("fleet.containers")
+def fleet_containers(hosts=None, include_stopped=False):
+    """List containers on every registered host (or the named hosts) at once.
+
+    Returns (rows, errors): rows are dicts with host, id, name, image and
+    status; errors maps unreachable hosts to their exception.
+    """
+    def containers(client):
+        return client.api.containers(all=include_stopped)
+
+    rows, errors = docker_hosts.merge(
+        get_host_pool().fan_out(containers, hosts),
+        lambda items: [{"id": c["Id"][:12], "name": (c.get("Names") or ["/"])[0].lstrip("/"),
+                        "image": c.get("Image"), "status": c.get("Status")} for c in items])
+    container_log.debug(f"Found {len(rows)} containers on {len({r['host'] for r in rows})} hosts.")
+    return rows, errors
+
+
+@telemetry.instrumented("fleet.images")
+def fleet_images(hosts=None):
+    """List images on every registered host at once; rows have host, id, tags, size and created."""
+    def images(client):
+        return client.api.images()
+
+    return docker_hosts.merge(
+        get_host_pool().fan_out(images, hosts),
+        lambda items: [{"id": i["Id"].split(":")[-1][:12], "tags": [t for t in i.get("RepoTags") or ()
+                                                                     if t != "<none>:<none>"],
+                        "size": i.get("Size", 0), "created": i.get("Created", 0)} for i in items])
+
+
+@telemetry.instrumented("fleet.search", target="query")
+def fleet_search(query, hosts=None):
+    """Find local image tags containing query (case-insensitive) on every host; rows have host, id and tag."""
+    needle = query.lower()
+    rows, errors = fleet_images(hosts)
+    matches = [{"host": row["host"], "id": row["id"], "tag": tag}
+               for row in rows for tag in row["tags"] if needle in tag.lower()]
+    registry_log.info(f"Fleet image search for '{query}' matched {len(matches)} tags.")
+    return matches, errors
+
+
+@telemetry.instrumented("fleet.stop", target="container")
+def fleet_stop(container, hosts=None, timeout=10):
+    """Stop the container with this id or name on every host that has it.
+
+    Returns (rows, errors); rows have host, id and name of each stopped
+    container. Hosts without such a container are skipped.
+    """
+    import docker.errors
+
+    def stop(client):
+        try:
+            found = client.containers.get(container)
+        except docker.errors.NotFound:
+            return []
+        found.stop(timeout=timeout)
+        return [{"id": found.id[:12], "name": found.name}]
+
+    rows, errors = docker_hosts.merge(get_host_pool().fan_out(stop, hosts), lambda stopped: stopped)
+    container_log.info(f"Container {container} stopped on {len(rows)} hosts.")
+    return rows, errors
+
+
+def container_stats_aggregator(history=120):
+    """Return a StatsAggregator for the running containers; call start() to begin streaming."""
+    return StatsAggregator(get_docker_client, history=history)
+
+
+def reconcile_spec(spec, dry_run=False, prune=True, concurrency=8, job=None, name=None):
+    """Converge containers and VMs to a spec (a dict or a JSON file path); see reconcile.plan.
+
+    name is the target recorded for the operation; it defaults to the spec
+    file path, and a spec dict without one is recorded without a target.
+    Returns (plan, results, summary); with dry_run the plan is not applied and
+    results and summary are None.
+    """
+    if name is None and isinstance(spec, str):
+        name = spec
+    with telemetry.measure("reconcile", target=name):
+        if isinstance(spec, str):
+            spec = reconcile.load_spec(spec)
+        client = get_docker_client() if "containers" in spec else None
+        manager = get_vm_manager() if "vms" in spec else None
+        pool = get_image_pool() if any("base" in vm for vm in spec.get("vms", {}).values()) else None
+        plan = reconcile.plan(spec, client=client, manager=manager, pool=pool, prune=prune)
+        if dry_run:
+            return plan, None, None
+        results, summary = reconcile.apply(plan, concurrency=concurrency, job=job)
+        return plan, results, summary
+
+
+def reclaim_plan(policy, include_docker=True, include_overlays=True):
+    """Dry-run a reclaim.ReclaimPolicy and return the ReclaimPlan (nothing is removed)."""
+    return reclaim.plan(policy, client=get_docker_client() if include_docker else None,
+                        pool=get_image_pool() if include_overlays else None, manager=get_vm_manager(),
+                        usage=get_usage_tracker())
+
+
+@telemetry.instrumented("reclaim", bytes_of=lambda outcome: outcome[1]["bytes"])
+def reclaim_disk_space(policy, include_docker=True, include_overlays=True, concurrency=4, job=None):
+    """Plan and execute a reclaim policy. Returns (results, summary); summary["bytes"] is the space freed."""
+    plan = reclaim_plan(policy, include_docker, include_overlays)
+    if job is not None:
+        job.check_cancelled()
+    results, summary = reclaim.execute(plan, concurrency=concurrency, job=job)
+    if include_docker and _image_catalog is not None:
+        _image_catalog.invalidate()
+    return results, summary
+
+
+def start_reclaimer(policy, interval=600.0, include_docker=True, include_overlays=True, concurrency=4):
+    """Apply policy every interval seconds on a background thread; returns the reclaim.Reclaimer."""
+    reclaimer = reclaim.Reclaimer(lambda: reclaim_disk_space(policy, include_docker, include_overlays, concurrency),
+                                  interval=interval)
+    reclaimer.start()
+    return reclaimer
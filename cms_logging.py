@@ -0,0 +1,163 @@
+"""Non-blocking logging for the Cloud Management System.
+
+Callers only put records on an in-memory queue (QueueHandler); a single
+QueueListener thread formats them and writes the log file, so disk I/O,
+rotation and compression of rotated files never run on the GUI thread or in
+worker pools.
+
+Operations log to per-subsystem loggers whose levels can be set separately:
+
+    cms.vm          QEMU VMs, base images and overlays
+    cms.build       Dockerfiles and image builds
+    cms.registry    pulls, image search and the local image catalog
+    cms.images      layer and size inspection of local images
+    cms.containers  running, stopping and monitoring containers
+    cms.reclaim     pruning images, containers, build cache and overlays
+
+Everything else (GUI, command line, job executor) logs to the root logger.
+Without explicit arguments, configure() reads CMS_LOG_LEVEL, CMS_LOG_LEVELS
+(e.g. "vm=DEBUG,registry=WARNING") and CMS_LOG_FORMAT ("text" or "json").
+"""
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime, timezone
+
+LOG_FILE = 'cloud_management_system.log'
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+SUBSYSTEMS = {
+    "vm": "cms.vm",
+    "build": "cms.build",
+    "registry": "cms.registry",
+    "images": "cms.images",
+    "containers": "cms.containers",
+    "reclaim": "cms.reclaim",
+}
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+_atexit_registered = False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, thread, message and exception."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def parse_levels(text):
+    """Turn "vm=DEBUG,build=WARNING" into {"vm": logging.DEBUG, "build": logging.WARNING}."""
+    levels = {}
+    for item in (text or "").split(","):
+        if not item.strip():
+            continue
+        subsystem, sep, level = item.partition("=")
+        subsystem = subsystem.strip().lower()
+        if not sep or subsystem not in SUBSYSTEMS:
+            raise ValueError(f"Invalid log level '{item}', expected one of "
+                             f"{', '.join(SUBSYSTEMS)} as SUBSYSTEM=LEVEL.")
+        levels[subsystem] = _level(level)
+    return levels
+
+
+def _level(value):
+    if isinstance(value, int):
+        return value
+    level = logging.getLevelName(value.strip().upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Invalid log level '{value}'.")
+    return level
+
+
+def _file_handler(filename, max_bytes, backup_count, when, compress):
+    if when:
+        handler = logging.handlers.TimedRotatingFileHandler(filename, when=when, backupCount=backup_count,
+                                                            delay=True)
+    else:
+        handler = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                                       delay=True)
+    if compress:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def configure(filename=LOG_FILE, level=None, levels=None, json_format=None, max_bytes=10 * 2**20,
+              backup_count=5, when=None, compress=True):
+    """Route all logging through a background listener writing a rotating log file.
+
+    level is the root level (default INFO) and levels maps subsystem names to
+    their own levels. Rotation is by size (max_bytes) unless when is given
+    ("midnight", "H", ... as for TimedRotatingFileHandler). Rotated files are
+    gzip-compressed by the listener thread. Calling configure() again replaces
+    the previous configuration.
+    """
+    global _listener, _queue_handler, _atexit_registered
+    if level is None:
+        level = os.environ.get("CMS_LOG_LEVEL", "INFO")
+    if levels is None:
+        levels = parse_levels(os.environ.get("CMS_LOG_LEVELS"))
+    if json_format is None:
+        json_format = os.environ.get("CMS_LOG_FORMAT", "text").lower() == "json"
+
+    handler = _file_handler(filename, max_bytes, backup_count, when, compress)
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    with _lock:
+        shutdown()
+        # Unbounded queue: logging never blocks the caller
+        log_queue = queue.SimpleQueue()
+        _queue_handler = logging.handlers.QueueHandler(log_queue)
+        root = logging.getLogger()
+        root.addHandler(_queue_handler)
+        root.setLevel(_level(level))
+        for subsystem, name in SUBSYSTEMS.items():
+            logging.getLogger(name).setLevel(_level(levels[subsystem]) if subsystem in levels else logging.NOTSET)
+        _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        if not _atexit_registered:
+            atexit.register(shutdown)
+            _atexit_registered = True
+
+
+def shutdown():
+    """Flush queued records, stop the listener thread and close the log file."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
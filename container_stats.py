@@ -0,0 +1,178 @@
+"""Streaming resource statistics for running containers.
+
+One thread per container follows its streamed stats (api.stats) and feeds a
+shared StatsAggregator, which keeps a fixed-size ring buffer of samples per
+container. Readers (the dashboard window or the CLI) take snapshots at their
+own rate and never wait on the Docker API.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("cms.containers")
+
+SPARK_CHARS = " ▁▂▃▄▅▆▇█"
+
+
+class StatsSample:
+    """Resource usage of one container at one point in time."""
+
+    def __init__(self, timestamp, cpu_percent, memory_usage, memory_limit, net_rx, net_tx, block_read,
+                 block_write):
+        self.timestamp = timestamp
+        self.cpu_percent = cpu_percent
+        self.memory_usage = memory_usage
+        self.memory_limit = memory_limit
+        self.net_rx = net_rx
+        self.net_tx = net_tx
+        self.block_read = block_read
+        self.block_write = block_write
+
+    @property
+    def memory_percent(self):
+        return 100.0 * self.memory_usage / self.memory_limit if self.memory_limit else 0.0
+
+
+def parse_stats(stats):
+    """Convert one decoded Docker stats document into a StatsSample."""
+    cpu = stats.get("cpu_stats") or {}
+    precpu = stats.get("precpu_stats") or {}
+    cpu_delta = (cpu.get("cpu_usage", {}).get("total_usage", 0)
+                 - precpu.get("cpu_usage", {}).get("total_usage", 0))
+    system_delta = cpu.get("system_cpu_usage", 0) - precpu.get("system_cpu_usage", 0)
+    online_cpus = cpu.get("online_cpus") or len(cpu.get("cpu_usage", {}).get("percpu_usage") or []) or 1
+    cpu_percent = cpu_delta / system_delta * online_cpus * 100.0 if cpu_delta > 0 and system_delta > 0 else 0.0
+
+    memory = stats.get("memory_stats") or {}
+    # Page cache is reclaimable, so report usage without it (as `docker stats` does)
+    cache = (memory.get("stats") or {}).get("inactive_file", (memory.get("stats") or {}).get("cache", 0))
+    memory_usage = max(memory.get("usage", 0) - cache, 0)
+
+    networks = stats.get("networks") or {}
+    net_rx = sum(n.get("rx_bytes", 0) for n in networks.values())
+    net_tx = sum(n.get("tx_bytes", 0) for n in networks.values())
+
+    block_read = block_write = 0
+    for entry in (stats.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        op = entry.get("op", "").lower()
+        if op == "read":
+            block_read += entry.get("value", 0)
+        elif op == "write":
+            block_write += entry.get("value", 0)
+
+    return StatsSample(time.monotonic(), cpu_percent, memory_usage, memory.get("limit", 0),
+                       net_rx, net_tx, block_read, block_write)
+
+
+def sparkline(values, maximum=None):
+    """Render values as a unicode sparkline string."""
+    values = list(values)
+    if not values:
+        return ""
+    top = maximum if maximum else max(values) or 1
+    steps = len(SPARK_CHARS) - 1
+    return "".join(SPARK_CHARS[min(steps, max(0, round(v / top * steps)))] for v in values)
+
+
+class StatsAggregator:
+    """Collects streamed stats for many containers into per-container ring buffers."""
+
+    def __init__(self, get_client, history=120, refresh_interval=5.0):
+        self._get_client = get_client
+        self.history = history
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._names = {}
+        self._streams = {}
+        self._stop = threading.Event()
+        self._discovery = None
+
+    def start(self):
+        """Start streaming stats for all running containers, following containers as they start and stop."""
+        self._stop.clear()
+        self._discovery = threading.Thread(target=self._discover, name="cms-stats-discovery", daemon=True)
+        self._discovery.start()
+
+    def stop(self):
+        """Stop following containers; stream threads exit on their next sample."""
+        self._stop.set()
+
+    def _discover(self):
+        while not self._stop.is_set():
+            try:
+                # One GET /containers/json; containers.list() would inspect every container on every round
+                client = self._get_client()
+                containers = {c["Id"]: (c.get("Names") or ["/" + c["Id"][:12]])[0].lstrip("/")
+                              for c in client.api.containers()}
+                with self._lock:
+                    for container_id, name in containers.items():
+                        self._names[container_id] = name
+                        if container_id not in self._streams:
+                            self._samples[container_id] = deque(maxlen=self.history)
+                            thread = threading.Thread(target=self._follow, args=(client, container_id, name),
+                                                      name=f"cms-stats-{name}", daemon=True)
+                            self._streams[container_id] = thread
+                            thread.start()
+                    for container_id in list(self._samples):
+                        if container_id not in containers and container_id not in self._streams:
+                            del self._samples[container_id]
+                            self._names.pop(container_id, None)
+            except Exception as e:
+                logger.warning(f"Container stats discovery failed: {e}")
+            self._stop.wait(self.refresh_interval)
+
+    def _follow(self, client, container_id, name):
+        try:
+            for stats in client.api.stats(container_id, stream=True, decode=True):
+                if self._stop.is_set():
+                    break
+                if not stats.get("read") or stats.get("read", "").startswith("0001-01-01"):
+                    # Container has stopped; Docker sends zeroed documents
+                    break
+                sample = parse_stats(stats)
+                with self._lock:
+                    buffer = self._samples.get(container_id)
+                    if buffer is not None:
+                        buffer.append(sample)
+        except Exception as e:
+            logger.debug(f"Stats stream for {name} ended: {e}")
+        finally:
+            with self._lock:
+                self._streams.pop(container_id, None)
+
+    def history_for(self, container_id):
+        with self._lock:
+            return list(self._samples.get(container_id, ()))
+
+    def snapshot(self, spark_width=30):
+        """Return one row dict per container with the latest sample, I/O rates and a CPU sparkline."""
+        rows = []
+        with self._lock:
+            items = [(cid, self._names.get(cid, cid[:12]), list(samples)) for cid, samples in self._samples.items()]
+        for container_id, name, samples in items:
+            if not samples:
+                rows.append({"id": container_id[:12], "name": name, "cpu": 0.0, "memory": 0, "memory_limit": 0,
+                             "memory_percent": 0.0, "net_rx_rate": 0.0, "net_tx_rate": 0.0,
+                             "block_read_rate": 0.0, "block_write_rate": 0.0, "spark": ""})
+                continue
+            last = samples[-1]
+            rates = {"net_rx_rate": 0.0, "net_tx_rate": 0.0, "block_read_rate": 0.0, "block_write_rate": 0.0}
+            if len(samples) > 1:
+                previous = samples[-2]
+                elapsed = last.timestamp - previous.timestamp or 1.0
+                rates = {
+                    "net_rx_rate": max(last.net_rx - previous.net_rx, 0) / elapsed,
+                    "net_tx_rate": max(last.net_tx - previous.net_tx, 0) / elapsed,
+                    "block_read_rate": max(last.block_read - previous.block_read, 0) / elapsed,
+                    "block_write_rate": max(last.block_write - previous.block_write, 0) / elapsed,
+                }
+            cpu_history = [s.cpu_percent for s in samples[-spark_width:]]
+            rows.append({"id": container_id[:12], "name": name, "cpu": last.cpu_percent,
+                         "memory": last.memory_usage, "memory_limit": last.memory_limit,
+                         "memory_percent": last.memory_percent,
+                         "spark": sparkline(cpu_history, max(100.0, *cpu_history)), **rates})
+        rows.sort(key=lambda row: row["cpu"], reverse=True)
+        return rows
+
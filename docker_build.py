@@ -0,0 +1,267 @@
+"""Docker image builds with BuildKit, build cache import/export and live logs.
+
+Two backends are supported:
+
+* buildkit - runs `docker buildx build --progress=plain` (or `docker build`
+  with DOCKER_BUILDKIT=1 when buildx is missing), which allows registry or
+  local cache import/export via --cache-from/--cache-to.
+* api - streams the classic builder output from the Docker API
+  (client.api.build), with cache_from support.
+
+Both stream every output line to an on_log callback and produce a BuildReport
+with per-step durations and the cache hit ratio.
+"""
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("cms.build")
+
+BUILDKIT_LINE = re.compile(r"^#(\d+) (.*)$")
+BUILDKIT_DONE = re.compile(r"^DONE (\d+(?:\.\d+)?)s$")
+API_STEP = re.compile(r"^Step (\d+)/(\d+) : (.*)$")
+
+
+class BuildStep:
+    def __init__(self, number, description):
+        self.number = number
+        self.description = description
+        self.seconds = 0.0
+        self.cached = False
+        self.failed = False
+
+    @property
+    def is_from(self):
+        return re.search(r"(^|\] )FROM ", self.description, re.IGNORECASE) is not None
+
+    def as_dict(self):
+        return {"step": self.number, "description": self.description, "seconds": round(self.seconds, 3),
+                "cached": self.cached, "failed": self.failed}
+
+
+class BuildReport:
+    """Summary of one image build."""
+
+    def __init__(self, backend, tag):
+        self.backend = backend
+        self.tag = tag
+        self.image_id = None
+        self.steps = []
+        self.seconds = 0.0
+        self.context_bytes = None
+        self.context_files = None
+        self.dockerignore = False
+
+    @property
+    def cache_hit_ratio(self):
+        """Fraction of cacheable steps (everything but FROM) served from the build cache."""
+        cacheable = [step for step in self.steps if not step.is_from]
+        if not cacheable:
+            return 0.0
+        return sum(step.cached for step in cacheable) / len(cacheable)
+
+    def as_dict(self):
+        return {"backend": self.backend, "tag": self.tag, "image_id": self.image_id,
+                "seconds": round(self.seconds, 3), "cache_hit_ratio": round(self.cache_hit_ratio, 3),
+                "context_bytes": self.context_bytes, "context_files": self.context_files,
+                "dockerignore": self.dockerignore, "steps": [step.as_dict() for step in self.steps]}
+
+    def summary(self):
+        lines = [f"Built {self.tag} in {self.seconds:.2f} seconds ({self.backend}), "
+                 f"cache hit ratio {self.cache_hit_ratio:.0%}."]
+        if self.context_bytes is not None:
+            lines.append(f"Build context: {self.context_files} files, {self.context_bytes / 1e6:.1f} MB"
+                         f"{'' if self.dockerignore else ' (no .dockerignore)'}.")
+        for step in sorted(self.steps, key=lambda s: s.seconds, reverse=True)[:5]:
+            lines.append(f"  {step.seconds:7.2f}s {'CACHED ' if step.cached else ''}{step.description}")
+        return "\n".join(lines)
+
+
+def context_size(path, dockerfile="Dockerfile"):
+    """Return (files, bytes, has_dockerignore) for the build context after .dockerignore filtering."""
+    from docker.utils.build import exclude_paths
+
+    ignore_file = os.path.join(path, ".dockerignore")
+    has_dockerignore = os.path.exists(ignore_file)
+    patterns = []
+    if has_dockerignore:
+        with open(ignore_file) as f:
+            patterns = [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+    files = total = 0
+    for relative in exclude_paths(path, patterns, dockerfile=dockerfile):
+        full = os.path.join(path, relative)
+        if os.path.isfile(full) and not os.path.islink(full):
+            files += 1
+            total += os.path.getsize(full)
+    # An empty .dockerignore still counts: the user has decided nothing needs excluding
+    return files, total, has_dockerignore
+
+
+def _terminate_on_cancel(process, job, poll_interval=0.2):
+    """Terminate process once job is cancelled, even while it prints nothing (a long, silent RUN step)."""
+    while process.poll() is None:
+        if job.cancelled:
+            logger.info(f"Terminating build process {process.pid} for cancelled job {job.id}.")
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            return
+        time.sleep(poll_interval)
+
+
+def buildx_available():
+    if shutil.which("docker") is None:
+        return False
+    result = subprocess.run(["docker", "buildx", "version"], capture_output=True, text=True)
+    return result.returncode == 0
+
+
+def build_buildkit(path, tag, cache_from=(), cache_to=None, build_args=None, target=None, on_log=None, job=None):
+    """Build with BuildKit through the docker CLI and return a BuildReport.
+
+    cache_from entries and cache_to use BuildKit syntax, e.g.
+    "type=registry,ref=registry.local/app:cache" or "type=local,src=/tmp/cache"
+    (cache_to: "type=local,dest=/tmp/cache,mode=max").
+    """
+    report = BuildReport("buildkit", tag)
+    iid_file = tempfile.NamedTemporaryFile(prefix="cms-iid-", delete=False)
+    iid_file.close()
+    env = dict(os.environ)
+    if buildx_available():
+        command = ["docker", "buildx", "build", "--load"]
+    else:
+        if cache_to:
+            raise ValueError("Exporting build cache (cache_to) needs docker buildx.")
+        command = ["docker", "build"]
+        env["DOCKER_BUILDKIT"] = "1"
+    command += ["--progress=plain", "--iidfile", iid_file.name, "-t", tag]
+    for source in cache_from or ():
+        command += ["--cache-from", source]
+    if cache_to:
+        command += ["--cache-to", cache_to]
+    for key, value in (build_args or {}).items():
+        command += ["--build-arg", f"{key}={value}"]
+    if target:
+        command += ["--target", target]
+    command.append(path)
+
+    logger.info(f"Running BuildKit build: {' '.join(command)}")
+    steps = {}
+    start = time.monotonic()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
+    if job is not None:
+        # Reading the output blocks until the CLI prints, so cancellation is watched on a timer instead
+        threading.Thread(target=_terminate_on_cancel, args=(process, job), name=f"cms-build-cancel-{process.pid}",
+                         daemon=True).start()
+    try:
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            if on_log is not None:
+                on_log(line)
+            match = BUILDKIT_LINE.match(line)
+            if not match:
+                continue
+            vertex, text = int(match.group(1)), match.group(2)
+            step = steps.get(vertex)
+            if step is None:
+                # Dockerfile instructions look like "[2/4] RUN ..." or "[stage 2/4] RUN ..."
+                if not text.startswith("[") or text.startswith("[internal]"):
+                    steps[vertex] = None
+                    continue
+                step = steps[vertex] = BuildStep(vertex, text)
+                report.steps.append(step)
+                continue
+            if text == "CACHED":
+                step.cached = True
+            elif text.startswith("ERROR"):
+                step.failed = True
+            else:
+                done = BUILDKIT_DONE.match(text)
+                if done:
+                    step.seconds = float(done.group(1))
+        returncode = process.wait()
+        report.seconds = time.monotonic() - start
+        if job is not None:
+            job.check_cancelled()
+        if returncode != 0:
+            failed = next((step.description for step in report.steps if step.failed), None)
+            raise RuntimeError(f"BuildKit build failed{f' at {failed}' if failed else ''} (exit code {returncode}).")
+        with open(iid_file.name) as f:
+            report.image_id = f.read().strip() or None
+    finally:
+        if process.poll() is None:
+            process.kill()
+        os.unlink(iid_file.name)
+    return report
+
+
+def build_api(client, path, tag, cache_from=(), build_args=None, target=None, on_log=None, job=None):
+    """Build through the Docker API (classic builder) and return a BuildReport."""
+    report = BuildReport("api", tag)
+    start = time.monotonic()
+    step = None
+    step_started = start
+    stream = client.api.build(path=path, tag=tag, cache_from=list(cache_from or ()) or None,
+                              buildargs=build_args, target=target, rm=True, decode=True)
+    for chunk in stream:
+        if job is not None:
+            job.check_cancelled()
+        if "error" in chunk:
+            if step is not None:
+                step.failed = True
+            message = chunk["error"].strip()
+            if on_log is not None:
+                on_log(message)
+            raise RuntimeError(f"Build failed: {message}")
+        if "aux" in chunk and "ID" in chunk["aux"]:
+            report.image_id = chunk["aux"]["ID"]
+        text = chunk.get("stream")
+        if not text:
+            continue
+        for line in text.splitlines():
+            if on_log is not None:
+                on_log(line)
+            match = API_STEP.match(line.strip())
+            if match:
+                now = time.monotonic()
+                if step is not None:
+                    step.seconds = now - step_started
+                step_started = now
+                step = BuildStep(int(match.group(1)), match.group(3))
+                report.steps.append(step)
+            elif step is not None and line.strip() == "---> Using cache":
+                step.cached = True
+    if step is not None:
+        step.seconds = time.monotonic() - step_started
+    report.seconds = time.monotonic() - start
+    return report
+
+
+def build_image(client, path, tag, buildkit=False, cache_from=(), cache_to=None, build_args=None, target=None,
+                on_log=None, job=None):
+    """Build path as tag with the chosen backend and return a BuildReport."""
+    try:
+        files, size, has_ignore = context_size(path)
+    except Exception as e:
+        logger.warning(f"Could not measure build context {path}: {e}")
+        files = size = None
+        has_ignore = os.path.exists(os.path.join(path, ".dockerignore"))
+    if not has_ignore:
+        logger.warning(f"Build context {path} has no .dockerignore; every file is sent to the daemon.")
+    if buildkit:
+        report = build_buildkit(path, tag, cache_from, cache_to, build_args, target, on_log, job)
+    else:
+        if cache_to:
+            raise ValueError("Exporting build cache needs the BuildKit backend.")
+        report = build_api(client, path, tag, cache_from, build_args, target, on_log, job)
+    report.context_files, report.context_bytes, report.dockerignore = files, size, has_ignore
+    logger.info(f"Built {tag} ({report.backend}) in {report.seconds:.2f} seconds, "
+                f"{len(report.steps)} steps, cache hit ratio {report.cache_hit_ratio:.0%}.")
+    return report
@@ -0,0 +1,268 @@
+"""A registry of Docker daemons and fan-out operations across them.
+
+Hosts are stored in ~/.cms/hosts.json as {name: {"url": ..., "tls": {...}}}
+where url is a unix socket (unix:///var/run/docker.sock), tcp://host:2376 or
+ssh://user@host endpoint. Docker CLI contexts can be imported. The implicit
+host "local" uses the environment (DOCKER_HOST or the default socket).
+
+Each host gets one lazily created client that is reused for every call, so
+its HTTP connection pool stays warm. fan_out() runs a function against all
+hosts at once on a shared worker pool: a fleet-wide listing takes about as
+long as the slowest host instead of the sum of all of them.
+"""
+import contextvars
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import telemetry
+
+logger = logging.getLogger("cms.containers")
+
+DEFAULT_HOSTS_FILE = os.path.join(os.path.expanduser("~"), ".cms", "hosts.json")
+DOCKER_CONTEXTS_DIR = os.path.join(os.path.expanduser("~"), ".docker", "contexts", "meta")
+LOCAL = "local"
+
+HEALTHY = "healthy"
+UNHEALTHY = "unhealthy"
+UNKNOWN = "unknown"
+
+
+class HostStatus:
+    """Result of the last health check of a host."""
+
+    def __init__(self, name):
+        self.name = name
+        self.status = UNKNOWN
+        self.latency = None
+        self.version = None
+        self.error = None
+        self.checked_at = None
+
+    def as_dict(self):
+        return {"host": self.name, "status": self.status, "latency": self.latency, "version": self.version,
+                "error": self.error, "checked_at": self.checked_at}
+
+
+class HostResult:
+    """What one host returned (or raised) in a fan-out call."""
+
+    def __init__(self, host, value=None, error=None, seconds=0.0):
+        self.host = host
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def read_docker_contexts(contexts_dir=DOCKER_CONTEXTS_DIR):
+    """Return {context name: docker endpoint url} from the Docker CLI context store."""
+    contexts = {}
+    for meta_file in glob.glob(os.path.join(contexts_dir, "*", "meta.json")):
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            url = meta["Endpoints"]["docker"]["Host"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Skipping Docker context {meta_file}: {e}")
+            continue
+        contexts[meta.get("Name") or os.path.basename(os.path.dirname(meta_file))] = url
+    return contexts
+
+
+class HostPool:
+    """Named Docker endpoints with one pooled, lazily connected client each."""
+
+    def __init__(self, path=DEFAULT_HOSTS_FILE, timeout=10, max_workers=16):
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._status = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cms-hosts")
+
+    # Registry
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, hosts):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(hosts, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def hosts(self):
+        """Return {name: config} including the implicit local host."""
+        hosts = {LOCAL: {"url": os.environ.get("DOCKER_HOST", "")}}
+        hosts.update(self._load())
+        return hosts
+
+    def add(self, name, url, tls=None):
+        """Register a host. tls may hold ca_cert, client_cert, client_key and verify."""
+        # Same characters as Docker context names; the GUI uses "|" to separate host and container in row ids
+        if not re.fullmatch(r"[A-Za-z0-9][A-Za-z0-9_.+-]*", name or ""):
+            raise ValueError(f"Invalid host name '{name}'.")
+        if not url.startswith(("unix://", "tcp://", "ssh://", "npipe://", "http://", "https://")):
+            raise ValueError(f"Unsupported Docker endpoint '{url}'.")
+        with self._lock:
+            hosts = self._load()
+            hosts[name] = {"url": url, **({"tls": tls} if tls else {})}
+            self._save(hosts)
+            self._drop(name)
+        logger.info(f"Added Docker host {name} at {url}.")
+
+    def remove(self, name):
+        with self._lock:
+            hosts = self._load()
+            if name not in hosts:
+                raise KeyError(f"Unknown Docker host '{name}'.")
+            del hosts[name]
+            self._save(hosts)
+            self._drop(name)
+        logger.info(f"Removed Docker host {name}.")
+
+    def import_contexts(self, contexts_dir=DOCKER_CONTEXTS_DIR):
+        """Add every Docker CLI context not registered yet; returns the names added."""
+        existing = self.hosts()
+        added = []
+        for name, url in read_docker_contexts(contexts_dir).items():
+            if name not in existing:
+                self.add(name, url)
+                added.append(name)
+        return added
+
+    # Clients
+
+    def client(self, name):
+        """Return the shared client for a host, connecting on first use."""
+        with self._lock:
+            client = self._clients.get(name)
+            if client is not None:
+                return client
+            config = self.hosts().get(name)
+        if config is None:
+            raise KeyError(f"Unknown Docker host '{name}'.")
+        client = telemetry.instrument_client(self._connect(config))
+        with self._lock:
+            # Another thread may have connected meanwhile; keep the first client
+            client = self._clients.setdefault(name, client)
+        return client
+
+    def _connect(self, config):
+        import docker
+
+        url = config.get("url")
+        if not url:
+            return docker.from_env(timeout=self.timeout)
+        tls = None
+        if config.get("tls"):
+            options = config["tls"]
+            client_cert = (options["client_cert"], options["client_key"]) if options.get("client_cert") else None
+            tls = docker.tls.TLSConfig(client_cert=client_cert, ca_cert=options.get("ca_cert"),
+                                       verify=options.get("verify", True))
+        return docker.DockerClient(base_url=url, tls=tls, timeout=self.timeout,
+                                   use_ssh_client=url.startswith("ssh://"))
+
+    def _drop(self, name):
+        client = self._clients.pop(name, None)
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def set_client(self, name, client):
+        """Use an existing client for a host (e.g. a test double)."""
+        with self._lock:
+            self._drop(name)
+            self._clients[name] = telemetry.instrument_client(client)
+
+    # Fan-out
+
+    def fan_out(self, func, hosts=None, timeout=None):
+        """Run func(client) on every host (or the named hosts) concurrently.
+
+        Returns one HostResult per host in host order; a host that fails or
+        does not answer within timeout seconds has error set instead of value.
+        """
+        names = list(hosts) if hosts else list(self.hosts())
+
+        def call(name):
+            start = time.monotonic()
+            try:
+                return HostResult(name, func(self.client(name)), seconds=time.monotonic() - start)
+            except Exception as e:
+                logger.warning(f"Docker host {name} failed: {e}")
+                return HostResult(name, error=e, seconds=time.monotonic() - start)
+
+        futures = {name: self._executor.submit(contextvars.copy_context().run, call, name) for name in names}
+        wait(futures.values(), timeout=timeout)
+        results = []
+        for name, future in futures.items():
+            if future.done():
+                results.append(future.result())
+            else:
+                results.append(HostResult(name, error=TimeoutError(f"No answer within {timeout} seconds.")))
+        return results
+
+    def check(self, hosts=None):
+        """Ping every host concurrently and return their HostStatus records."""
+        def ping(client):
+            start = time.monotonic()
+            client.api.ping()
+            latency = time.monotonic() - start
+            return latency, client.api.version().get("Version")
+
+        statuses = []
+        for result in self.fan_out(ping, hosts, timeout=self.timeout):
+            status = self._status.setdefault(result.host, HostStatus(result.host))
+            status.checked_at = time.time()
+            if result.ok:
+                status.status, status.error = HEALTHY, None
+                status.latency, status.version = result.value
+            else:
+                status.status, status.error, status.latency = UNHEALTHY, str(result.error), None
+                # Reconnect from scratch next time
+                with self._lock:
+                    self._drop(result.host)
+            statuses.append(status)
+        return statuses
+
+    def status(self, name):
+        return self._status.get(name) or HostStatus(name)
+
+    def close(self):
+        with self._lock:
+            for name in list(self._clients):
+                self._drop(name)
+        self._executor.shutdown(wait=False)
+
+
+def merge(results, rows_of):
+    """Flatten fan-out results into rows tagged with their host.
+
+    rows_of(value) returns a list of dicts for one host's value. Returns
+    (rows, errors) where errors maps failed hosts to their exception.
+    """
+    rows, errors = [], {}
+    for result in results:
+        if not result.ok:
+            errors[result.host] = result.error
+            continue
+        for row in rows_of(result.value):
+            rows.append({"host": result.host, **row})
+    return rows, errors
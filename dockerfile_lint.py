@@ -0,0 +1,292 @@
+"""Static analysis of Dockerfiles for build-performance problems.
+
+Flags what makes builds slow or images large before anything is built:
+
+    cache-bust        COPY/ADD of the whole context before dependencies are
+                      installed, so every source change reinstalls them
+    combine-run       consecutive RUN instructions that each add a layer
+    package-cache     package manager caches left in the image
+    apt-update        apt-get update in its own RUN (stale cached index)
+    multi-stage       build toolchains shipped in a single-stage image
+    context           a large build context without a .dockerignore
+    base-tag          unpinned (latest) base images that defeat layer reuse
+    syntax            unknown instructions and a missing FROM
+
+Analyzer re-parses only the instructions whose text changed since the last
+call, so an editor can re-run it on every (debounced) edit.
+"""
+import re
+
+ERROR = "error"
+WARNING = "warning"
+INFO = "info"
+
+INSTRUCTIONS = {"ADD", "ARG", "CMD", "COPY", "ENTRYPOINT", "ENV", "EXPOSE", "FROM", "HEALTHCHECK", "LABEL",
+                "MAINTAINER", "ONBUILD", "RUN", "SHELL", "STOPSIGNAL", "USER", "VOLUME", "WORKDIR"}
+LAYER_INSTRUCTIONS = {"RUN", "COPY", "ADD"}
+
+# Contexts above this size without a .dockerignore are reported
+LARGE_CONTEXT_BYTES = 50 * 2**20
+
+DEPENDENCY_INSTALL = re.compile(
+    r"\b(pip3?\s+install|poetry\s+install|pipenv\s+install|npm\s+(install|ci)|yarn\s+install|yarn\s*($|&&|;)|"
+    r"pnpm\s+install|go\s+mod\s+download|bundle\s+install|composer\s+install|mvn\s+[^&;|]*dependency:|"
+    r"gradle\s+[^&;|]*dependencies|cargo\s+fetch|apt-get\s+install|apk\s+add|yum\s+install|dnf\s+install)")
+BUILD_TOOLCHAIN = re.compile(
+    r"\b(build-essential|gcc|g\+\+|make\b|go\s+build|cargo\s+build|mvn\s+[^&;|]*package|gradle\s+[^&;|]*build|"
+    r"npm\s+run\s+build|yarn\s+build|tsc\b|dotnet\s+publish)")
+WHOLE_CONTEXT = re.compile(r"^(--\S+\s+)*(\.|\./|\*)\s+\S+$")
+
+
+class Instruction:
+    """One logical Dockerfile instruction (continuation lines joined)."""
+
+    def __init__(self, line, keyword, arguments):
+        self.line = line
+        self.keyword = keyword
+        self.arguments = arguments
+
+    def __repr__(self):
+        return f"Instruction({self.line}, {self.keyword} {self.arguments[:30]!r})"
+
+
+class Finding:
+    def __init__(self, rule, severity, line, message):
+        self.rule = rule
+        self.severity = severity
+        self.line = line
+        self.message = message
+
+    def as_dict(self):
+        return {"rule": self.rule, "severity": self.severity, "line": self.line, "message": self.message}
+
+    def __str__(self):
+        return f"{self.line or '-'}: {self.severity} [{self.rule}] {self.message}"
+
+
+class Analysis:
+    """Findings plus layer and stage counts of one Dockerfile."""
+
+    def __init__(self, instructions, findings):
+        self.instructions = instructions
+        self.findings = findings
+        self.stages = split_stages(instructions)
+
+    @property
+    def layers(self):
+        """Layers the final image adds on top of its base image."""
+        final = self.stages[-1] if self.stages else []
+        return sum(1 for i in final if i.keyword in LAYER_INSTRUCTIONS)
+
+    @property
+    def total_layers(self):
+        """Layer-creating instructions built across all stages."""
+        return sum(1 for i in self.instructions if i.keyword in LAYER_INSTRUCTIONS)
+
+    def count(self, severity):
+        return sum(1 for f in self.findings if f.severity == severity)
+
+    def as_dict(self):
+        return {"layers": self.layers, "total_layers": self.total_layers, "stages": len(self.stages),
+                "findings": [f.as_dict() for f in self.findings]}
+
+    def summary(self):
+        return (f"{len(self.stages)} stage(s), {self.layers} layers in the final image "
+                f"({self.total_layers} built), {self.count(ERROR)} errors, {self.count(WARNING)} warnings, "
+                f"{self.count(INFO)} suggestions.")
+
+
+def logical_lines(text):
+    """Yield (first line number, joined text) of each instruction, skipping comments and blank lines."""
+    escape = "\\"
+    directives = True
+    start, parts = None, []
+    for number, raw in enumerate(text.splitlines(), 1):
+        stripped = raw.strip()
+        if directives:
+            match = re.match(r"#\s*escape\s*=\s*(\S)", stripped, re.IGNORECASE)
+            if match:
+                escape = match.group(1)
+                continue
+            if not stripped.startswith("#") or "=" not in stripped:
+                directives = False
+        if stripped.startswith("#") or (not stripped and not parts):
+            continue
+        if start is None:
+            start = number
+        if stripped.endswith(escape):
+            parts.append(stripped[:-1].strip())
+            continue
+        parts.append(stripped)
+        yield start, " ".join(p for p in parts if p)
+        start, parts = None, []
+    if parts:
+        yield start, " ".join(p for p in parts if p)
+
+
+def parse_instruction(line, text):
+    keyword, _, arguments = text.partition(" ")
+    return Instruction(line, keyword.upper(), arguments.strip())
+
+
+def split_stages(instructions):
+    """Group instructions into build stages, each starting at a FROM."""
+    stages = []
+    for instruction in instructions:
+        if instruction.keyword == "FROM" or not stages:
+            stages.append([])
+        stages[-1].append(instruction)
+    return stages
+
+
+def _check_syntax(instructions, findings):
+    for instruction in instructions:
+        if instruction.keyword not in INSTRUCTIONS:
+            findings.append(Finding("syntax", ERROR, instruction.line,
+                                    f"Unknown instruction '{instruction.keyword}'."))
+    first = next((i for i in instructions if i.keyword != "ARG"), None)
+    if first is None or first.keyword != "FROM":
+        findings.append(Finding("syntax", ERROR, first.line if first else None,
+                                "A Dockerfile must start with FROM (only ARG may come before it)."))
+
+
+def _check_base_tags(stages, findings):
+    stage_names = set()
+    for stage in stages:
+        instruction = stage[0]
+        if instruction.keyword != "FROM":
+            continue
+        words = [w for w in instruction.arguments.split() if not w.startswith("--")]
+        if not words:
+            continue
+        image = words[0]
+        if image.lower() not in stage_names and image != "scratch" and "$" not in image and "@" not in image:
+            name = image.rsplit("/", 1)[-1]
+            if ":" not in name or name.endswith(":latest"):
+                findings.append(Finding("base-tag", INFO, instruction.line,
+                                        f"Pin the base image '{image}' to a version tag or digest; 'latest' "
+                                        "changes underneath the build cache."))
+        if len(words) >= 3 and words[1].upper() == "AS":
+            stage_names.add(words[2].lower())
+
+
+def _check_cache_bust(stage, findings):
+    whole_copy = None
+    for instruction in stage:
+        if instruction.keyword in ("COPY", "ADD") and WHOLE_CONTEXT.match(instruction.arguments):
+            if not re.search(r"--from=", instruction.arguments):
+                whole_copy = whole_copy or instruction
+        elif instruction.keyword == "RUN" and whole_copy is not None and DEPENDENCY_INSTALL.search(
+                instruction.arguments):
+            findings.append(Finding(
+                "cache-bust", WARNING, whole_copy.line,
+                f"The whole build context is copied before dependencies are installed (line {instruction.line}); "
+                "any source change re-runs the install. Copy only the dependency manifests first, install, "
+                "then copy the rest."))
+            return
+
+
+def _check_run_layers(stage, findings):
+    run = []
+    for instruction in stage + [None]:
+        if instruction is not None and instruction.keyword == "RUN":
+            run.append(instruction)
+            continue
+        if len(run) > 1:
+            findings.append(Finding("combine-run", INFO, run[0].line,
+                                    f"{len(run)} consecutive RUN instructions (lines {run[0].line}-{run[-1].line}) "
+                                    "create one layer each; combine them with && to save layers."))
+        run = []
+
+
+def _check_package_caches(stage, findings):
+    for instruction in stage:
+        if instruction.keyword != "RUN":
+            continue
+        command = instruction.arguments
+        if "apt-get update" in command and "apt-get install" not in command:
+            findings.append(Finding("apt-update", WARNING, instruction.line,
+                                    "Run apt-get update in the same RUN as apt-get install, otherwise a cached "
+                                    "update layer installs stale packages."))
+        if "apt-get install" in command and "/var/lib/apt/lists" not in command:
+            findings.append(Finding("package-cache", WARNING, instruction.line,
+                                    "apt-get install leaves the package index in the layer; end the RUN with "
+                                    "'&& rm -rf /var/lib/apt/lists/*'."))
+        if re.search(r"\bapk\s+add\b", command) and "--no-cache" not in command:
+            findings.append(Finding("package-cache", WARNING, instruction.line,
+                                    "Use 'apk add --no-cache' so the package index is not kept in the layer."))
+        if re.search(r"\bpip3?\s+install\b", command) and "--no-cache-dir" not in command:
+            findings.append(Finding("package-cache", INFO, instruction.line,
+                                    "Use 'pip install --no-cache-dir' to keep the pip cache out of the image."))
+        if re.search(r"\b(yum|dnf)\s+install\b", command) and not re.search(r"\b(yum|dnf)\s+clean\s+all", command):
+            findings.append(Finding("package-cache", WARNING, instruction.line,
+                                    "End the RUN with 'yum clean all' (or 'dnf clean all') to drop the package "
+                                    "cache."))
+
+
+def _check_multi_stage(stages, findings):
+    if len(stages) != 1:
+        return
+    for instruction in stages[0]:
+        if instruction.keyword == "RUN":
+            match = BUILD_TOOLCHAIN.search(instruction.arguments)
+            if match:
+                findings.append(Finding("multi-stage", INFO, instruction.line,
+                                        f"'{match.group(0)}' ships the build toolchain in the final image; build "
+                                        "in a separate stage and COPY --from only the artifacts."))
+                return
+
+
+def check_context(context, findings):
+    """Report a large build context without .dockerignore; context is (files, bytes, has_dockerignore)."""
+    files, size, has_ignore = context
+    if not has_ignore and size is not None and size >= LARGE_CONTEXT_BYTES:
+        findings.append(Finding("context", WARNING, None,
+                                f"The build context is {size / 2**20:.0f} MB in {files} files and there is no "
+                                ".dockerignore; all of it is sent to the daemon on every build."))
+
+
+class Analyzer:
+    """Incremental analyzer: parsed instructions are cached by their text."""
+
+    def __init__(self):
+        self._parsed = {}
+        self._last = None
+
+    def analyze(self, text, context=None):
+        """Return the Analysis of a Dockerfile; context is the (files, bytes, has_dockerignore) of its directory."""
+        key = (text, context)
+        if self._last is not None and self._last[0] == key:
+            return self._last[1]
+        parsed = {}
+        instructions = []
+        for line, joined in logical_lines(text):
+            instruction = self._parsed.get(joined)
+            if instruction is None:
+                instruction = parse_instruction(line, joined)
+            elif instruction.line != line:
+                instruction = Instruction(line, instruction.keyword, instruction.arguments)
+            parsed[joined] = instruction
+            instructions.append(instruction)
+        self._parsed = parsed
+
+        findings = []
+        stages = split_stages(instructions)
+        _check_syntax(instructions, findings)
+        _check_base_tags(stages, findings)
+        for stage in stages:
+            _check_cache_bust(stage, findings)
+            _check_run_layers(stage, findings)
+            _check_package_caches(stage, findings)
+        _check_multi_stage(stages, findings)
+        if context is not None:
+            check_context(context, findings)
+        findings.sort(key=lambda f: (f.line or 0, f.rule))
+        analysis = Analysis(instructions, findings)
+        self._last = (key, analysis)
+        return analysis
+
+
+def analyze(text, context=None):
+    """Analyze Dockerfile text once; see Analyzer.analyze."""
+    return Analyzer().analyze(text, context)
@@ -0,0 +1,77 @@
+"""Starting-point Dockerfiles for the editor and `cms create-dockerfile --template`.
+
+Each template already follows the rules checked by dockerfile_lint: dependency
+manifests are copied before the sources, package caches are removed in the
+same layer, and compiled languages use a multi-stage build.
+"""
+
+TEMPLATES = {
+    "python": """\
+FROM python:3.12-slim
+WORKDIR /app
+COPY requirements.txt .
+RUN pip install --no-cache-dir -r requirements.txt
+COPY . .
+CMD ["python", "app.py"]
+""",
+    "node": """\
+FROM node:20-alpine AS build
+WORKDIR /app
+COPY package.json package-lock.json ./
+RUN npm ci
+COPY . .
+RUN npm run build
+
+FROM node:20-alpine
+WORKDIR /app
+ENV NODE_ENV=production
+COPY package.json package-lock.json ./
+RUN npm ci --omit=dev && npm cache clean --force
+COPY --from=build /app/dist ./dist
+CMD ["node", "dist/index.js"]
+""",
+    "go": """\
+FROM golang:1.22 AS build
+WORKDIR /src
+COPY go.mod go.sum ./
+RUN go mod download
+COPY . .
+RUN CGO_ENABLED=0 go build -o /out/app .
+
+FROM gcr.io/distroless/static-debian12:nonroot
+COPY --from=build /out/app /app
+ENTRYPOINT ["/app"]
+""",
+    "debian": """\
+FROM debian:12-slim
+RUN apt-get update \\
+    && apt-get install -y --no-install-recommends ca-certificates curl \\
+    && rm -rf /var/lib/apt/lists/*
+WORKDIR /app
+COPY . .
+CMD ["bash"]
+""",
+    "nginx": """\
+FROM nginx:1.27-alpine
+COPY site/ /usr/share/nginx/html/
+EXPOSE 80
+""",
+}
+
+DOCKERIGNORE = """\
+.git
+**/__pycache__
+**/node_modules
+*.log
+*.qcow2
+Dockerfile
+.dockerignore
+"""
+
+
+def template(name):
+    """Return the Dockerfile text of a template."""
+    try:
+        return TEMPLATES[name]
+    except KeyError:
+        raise KeyError(f"Unknown Dockerfile template '{name}', expected one of {', '.join(TEMPLATES)}.") from None
@@ -0,0 +1,271 @@
+"""Queryable history of every operation in an embedded SQLite database.
+
+Each telemetry record (see telemetry.py) becomes one row of the operations
+table, indexed by time, operation, target and outcome, so questions such as
+"slowest 20 pulls this week" or "failure rate per image" are answered with an
+index lookup instead of scanning log files.
+
+Callers never wait for the database: record() puts the row on a queue and a
+background writer inserts queued rows in batches, one transaction per batch.
+Queries run on their own connections and see everything flushed so far (the
+database uses WAL mode, so readers do not block the writer).
+
+An operation is identified by (ts, op, target, seconds): rows are inserted
+with INSERT OR IGNORE against a unique index on those columns, so importing a
+metrics file whose records the live listener already stored adds nothing.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_FILE = os.path.join(os.path.expanduser("~"), ".cms", "history.db")
+ORDER_KEYS = ("ts", "seconds", "bytes", "api_calls")
+GROUP_KEYS = ("op", "target", "outcome")
+COLUMNS = ("ts", "op", "target", "seconds", "outcome", "api_calls", "bytes", "error")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    op TEXT NOT NULL,
+    target TEXT,
+    seconds REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    api_calls INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS operations_ts ON operations (ts);
+CREATE INDEX IF NOT EXISTS operations_op_ts ON operations (op, ts);
+CREATE INDEX IF NOT EXISTS operations_op_seconds ON operations (op, seconds);
+CREATE INDEX IF NOT EXISTS operations_target_ts ON operations (target, ts);
+CREATE INDEX IF NOT EXISTS operations_outcome_ts ON operations (outcome, ts);
+"""
+IDENTITY_INDEX = "operations_identity"
+IDENTITY = "ts, op, IFNULL(target, ''), seconds"
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)\s*([smhdw])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_age(text):
+    """Turn "30m", "24h", "7d" or "2w" into seconds."""
+    match = _DURATION.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid duration '{text}', expected a number followed by s, m, h, d or w.")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+def _row(record):
+    return (record.get("ts") or time.time(), record["op"], record.get("target"), record.get("seconds", 0.0),
+            record.get("outcome", "ok"), record.get("api_calls", 0), record.get("bytes", 0), record.get("error"))
+
+
+class HistoryStore:
+    """SQLite operation history with a batching background writer."""
+
+    def __init__(self, path=DEFAULT_DB_FILE, batch_size=500, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._queue = queue.SimpleQueue()
+        self._local = threading.local()
+        self._closed = False
+        self.written = 0
+        self.duplicates = 0
+        # The writer owns this connection; queries use per-thread connections
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._create_identity_index()
+        self._writer = threading.Thread(target=self._write_loop, name="cms-history", daemon=True)
+        self._writer.start()
+
+    def _create_identity_index(self):
+        exists = self._db.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                  (IDENTITY_INDEX,)).fetchone()
+        if exists:
+            return
+        with self._db:
+            # Databases written before the index existed may hold the same operation twice
+            removed = self._db.execute(f"DELETE FROM operations WHERE id NOT IN "
+                                       f"(SELECT MIN(id) FROM operations GROUP BY {IDENTITY})").rowcount
+            self._db.execute(f"CREATE UNIQUE INDEX {IDENTITY_INDEX} ON operations ({IDENTITY})")
+        if removed:
+            logging.info(f"Removed {removed} duplicate operations from {self.path}.")
+
+    # Writing
+
+    def record(self, record):
+        """Queue a telemetry record for insertion; never blocks."""
+        if not self._closed:
+            self._queue.put(_row(record))
+
+    def flush(self, timeout=10.0):
+        """Wait until every record queued so far is committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            batch, events = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    self._commit(batch, events)
+                    self._db.close()
+                    return
+                if isinstance(item, threading.Event):
+                    events.append(item)
+                    # Flush requested: commit what we have without waiting for more
+                    deadline = 0
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            self._commit(batch, events)
+
+    def _commit(self, batch, events):
+        if batch:
+            try:
+                changes = self._db.total_changes
+                with self._db:
+                    self._db.executemany(f"INSERT OR IGNORE INTO operations ({', '.join(COLUMNS)}) VALUES "
+                                         f"({', '.join('?' * len(COLUMNS))})", batch)
+                inserted = self._db.total_changes - changes
+                self.written += inserted
+                self.duplicates += len(batch) - inserted
+            except sqlite3.Error as e:
+                logging.error(f"Could not write {len(batch)} history records to {self.path}: {e}")
+        for event in events:
+            event.set()
+
+    def close(self):
+        """Write what is queued and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=10)
+
+    # Querying
+
+    def _reader(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path)
+            connection.row_factory = sqlite3.Row
+        return connection
+
+    def _select(self, sql, params):
+        return [dict(row) for row in self._reader().execute(sql, params)]
+
+    @staticmethod
+    def _where(op=None, target=None, outcome=None, since=None, until=None):
+        clauses, params = [], []
+        for column, value in (("op", op), ("target", target), ("outcome", outcome)):
+            if value is None:
+                continue
+            if isinstance(value, str) and value.endswith("*"):
+                clauses.append(f"{column} LIKE ? ESCAPE '\\'")
+                params.append(value[:-1].replace("%", r"\%").replace("_", r"\_") + "%")
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def query(self, op=None, target=None, outcome=None, since=None, until=None, order="ts", descending=True,
+              limit=100):
+        """Return matching operations as dicts, newest (or largest order key) first.
+
+        op and target match exactly, or by prefix when they end with "*"
+        (e.g. op="image.*"); since and until are Unix timestamps.
+        """
+        if order not in ORDER_KEYS:
+            raise ValueError(f"Invalid order '{order}', expected one of {', '.join(ORDER_KEYS)}.")
+        where, params = self._where(op, target, outcome, since, until)
+        sql = (f"SELECT {', '.join(COLUMNS)} FROM operations{where} ORDER BY {order} "
+               f"{'DESC' if descending else 'ASC'} LIMIT ?")
+        return self._select(sql, params + [limit])
+
+    def slowest(self, op=None, since=None, limit=20, **filters):
+        """The limit slowest operations, e.g. slowest(op="image.pull", since=time.time() - 7 * 86400)."""
+        return self.query(op=op, since=since, order="seconds", limit=limit, **filters)
+
+    def failure_rates(self, by="target", op=None, since=None, until=None, min_count=1):
+        """Count, failures and failure rate per target (or op/outcome), highest rate first."""
+        if by not in GROUP_KEYS:
+            raise ValueError(f"Invalid grouping '{by}', expected one of {', '.join(GROUP_KEYS)}.")
+        where, params = self._where(op=op, since=since, until=until)
+        sql = (f"SELECT {by} AS key, COUNT(*) AS count, SUM(outcome = 'error') AS failures, "
+               f"AVG(outcome = 'error') AS rate, AVG(seconds) AS mean_seconds FROM operations{where} "
+               f"GROUP BY {by} HAVING COUNT(*) >= ? ORDER BY rate DESC, count DESC")
+        return self._select(sql, params + [min_count])
+
+    def summary(self, since=None, until=None, op=None):
+        """Per-operation count, failures, mean/max seconds, API calls and bytes."""
+        where, params = self._where(op=op, since=since, until=until)
+        sql = (f"SELECT op, COUNT(*) AS count, SUM(outcome = 'error') AS failures, AVG(seconds) AS mean, "
+               f"MAX(seconds) AS max, SUM(api_calls) AS api_calls, SUM(bytes) AS bytes FROM operations{where} "
+               f"GROUP BY op ORDER BY op")
+        return self._select(sql, params)
+
+    def operations(self):
+        """Distinct operation names recorded so far."""
+        return [row["op"] for row in self._select("SELECT DISTINCT op FROM operations ORDER BY op", [])]
+
+    def prune(self, before):
+        """Delete operations older than the Unix timestamp before; returns the number deleted."""
+        self.flush()
+        connection = self._reader()
+        with connection:
+            return connection.execute("DELETE FROM operations WHERE ts < ?", (before,)).rowcount
+
+    def import_jsonl(self, path):
+        """Queue every record of a telemetry JSON-lines file; returns the number read.
+
+        Records already in the database are skipped when written (see duplicates).
+        """
+        count = 0
+        with open(path) as f:
+            for line in f:
+                try:
+                    self.record(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    continue
+                count += 1
+        return count
+
+
+def attach(recorder, path=DEFAULT_DB_FILE, **options):
+    """Create a HistoryStore that receives every record of a telemetry recorder; closed at exit."""
+    store = HistoryStore(path, **options)
+    recorder.add_listener(store.record)
+
+    def close():
+        # The recorder hands records to listeners on its writer thread; drain it before closing
+        recorder.flush()
+        store.close()
+
+    atexit.register(close)
+    return store
@@ -0,0 +1,271 @@
+"""In-process catalog of local Docker images with an indexed tag search.
+
+The catalog is filled with a single GET /images/json call (client.api.images(),
+not images.list(), which inspects every image in a request of its own), then
+kept current from the Docker events stream so searches do not go back to the
+daemon. A trigram index over the lower-cased repo:tag strings narrows substring
+queries to the tags containing every trigram of the query before the final
+substring check. The lower-cased tag, repository and name used for ranking are
+computed once when a tag is indexed, each match is ranked by one integer, and a
+limited search keeps only the best limit matches (heapq) instead of sorting.
+
+With 10k tags a selective query (tens of matches) takes tens of microseconds,
+but the remaining cost is Python work per match: a query matching a thousand
+tags takes one to two milliseconds, and one matching every tag (fewer than
+three characters, e.g. "re") around ten. Pass limit for interactive searches.
+"""
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger("cms.registry")
+
+
+class ImageEntry:
+    """Cached metadata for one local image."""
+
+    def __init__(self, image_id, tags, size=0, created=None):
+        self.id = image_id
+        self.tags = list(tags)
+        self.size = size
+        self.created = created
+
+    @classmethod
+    def from_image(cls, image):
+        attrs = getattr(image, "attrs", {}) or {}
+        return cls(image.id, image.tags, attrs.get("Size", 0), attrs.get("Created"))
+
+    @classmethod
+    def from_api(cls, data):
+        """From one item of GET /images/json (client.api.images())."""
+        tags = [tag for tag in data.get("RepoTags") or () if tag != "<none>:<none>"]
+        return cls(data["Id"], tags, data.get("Size", 0), data.get("Created"))
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _search_key(tag):
+    """(lower-cased tag, repository, name) of a repo:tag, as _score compares them."""
+    lowered = tag.lower()
+    repository = lowered.rsplit(":", 1)[0]
+    return lowered, repository, repository.rsplit("/", 1)[-1]
+
+
+_NOT_PREFIX = 7 << 20
+
+
+def _score(lowered, repository, name, needle, position):
+    """Rank of a match as one integer, lower is better.
+
+    Exact match, then repository match, then prefix, then earliest and
+    shortest; Docker references are shorter than 1024 characters.
+    """
+    return ((((lowered != needle) << 2 | (repository != needle and name != needle) << 1
+              | (not (position == 0 or name.startswith(needle)))) << 20) | position << 10 | len(lowered))
+
+
+class ImageCatalog:
+    """Cached, indexed view of the local image store.
+
+    get_client is a callable returning a Docker client, so the catalog does not
+    connect until it is first used. ttl is the maximum age in seconds of the
+    last full refresh before a query triggers another one (None never expires).
+    """
+
+    def __init__(self, get_client, ttl=300):
+        self._get_client = get_client
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._tag_owner = {}
+        self._keys = {}
+        self._index = {}
+        self._loaded_at = None
+        self._watcher = None
+        self._events = None
+        self.stats = {"queries": 0, "hits": 0, "misses": 0, "refreshes": 0, "event_updates": 0,
+                      "last_query_seconds": 0.0, "last_refresh_seconds": 0.0}
+
+    # Loading
+
+    def refresh(self):
+        """Reload every image from the daemon and rebuild the index."""
+        start = time.perf_counter()
+        images = self._get_client().api.images()
+        with self._lock:
+            self._entries = {}
+            self._tag_owner = {}
+            self._keys = {}
+            self._index = {}
+            for data in images:
+                self._add(ImageEntry.from_api(data))
+            self._loaded_at = time.monotonic()
+            self.stats["refreshes"] += 1
+            self.stats["last_refresh_seconds"] = time.perf_counter() - start
+        logger.info(f"Image catalog refreshed: {len(self._entries)} images, {len(self._tag_owner)} tags "
+                    f"in {self.stats['last_refresh_seconds']:.3f} seconds.")
+
+    def invalidate(self):
+        """Force a full refresh on the next query."""
+        with self._lock:
+            self._loaded_at = None
+
+    @property
+    def is_fresh(self):
+        if self._loaded_at is None:
+            return False
+        return self.ttl is None or time.monotonic() - self._loaded_at < self.ttl
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self.is_fresh:
+                self.stats["hits"] += 1
+                return
+            self.stats["misses"] += 1
+        self.refresh()
+
+    def _add(self, entry):
+        self._remove(entry.id)
+        self._entries[entry.id] = entry
+        for tag in entry.tags:
+            self._tag_owner[tag] = entry.id
+            key = self._keys[tag] = _search_key(tag)
+            for gram in _trigrams(key[0]):
+                self._index.setdefault(gram, set()).add(tag)
+
+    def _remove(self, image_id):
+        entry = self._entries.pop(image_id, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            if self._tag_owner.get(tag) != image_id:
+                continue
+            del self._tag_owner[tag]
+            for gram in _trigrams(self._keys.pop(tag)[0]):
+                postings = self._index.get(gram)
+                if postings is not None:
+                    postings.discard(tag)
+                    if not postings:
+                        del self._index[gram]
+
+    # Queries
+
+    def search(self, query, limit=None):
+        """Return every repo:tag containing query (case-insensitive), best matches first."""
+        self._ensure_loaded()
+        start = time.perf_counter()
+        needle = query.lower()
+        with self._lock:
+            if len(needle) < 3:
+                candidates = self._tag_owner.keys()
+            else:
+                postings = sorted((self._index.get(gram, ()) for gram in _trigrams(needle)), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:]) if postings else ()
+            keys = self._keys
+            matches = []
+            for tag in candidates:
+                lowered, repository, name = keys[tag]
+                position = lowered.find(needle)
+                if position < 0:
+                    continue
+                if position and not name.startswith(needle):
+                    # Neither exact, repository nor prefix match: the common case, scored inline
+                    matches.append((_NOT_PREFIX | position << 10 | len(lowered), tag))
+                else:
+                    matches.append((_score(lowered, repository, name, needle, position), tag))
+            self.stats["queries"] += 1
+        if limit is not None and limit < len(matches):
+            matches = heapq.nsmallest(limit, matches)
+        else:
+            matches.sort()
+        matches = [tag for _, tag in matches]
+        self.stats["last_query_seconds"] = time.perf_counter() - start
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Image catalog search '{query}': {len(matches)} matches "
+                         f"in {self.stats['last_query_seconds'] * 1000:.3f} ms.")
+        return matches
+
+    def images(self):
+        """Return all cached ImageEntry objects."""
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._entries.values())
+
+    def get(self, tag):
+        """Return the ImageEntry that owns tag, or None."""
+        self._ensure_loaded()
+        with self._lock:
+            image_id = self._tag_owner.get(tag)
+            return self._entries.get(image_id) if image_id else None
+
+    # Incremental updates
+
+    def apply_event(self, event):
+        """Update the catalog from one decoded Docker image event."""
+        if event.get("Type") != "image":
+            return
+        action = event.get("Action", "")
+        image_id = event.get("Actor", {}).get("ID") or event.get("id")
+        if not image_id:
+            return
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if action == "delete":
+                self._remove(image_id)
+                self.stats["event_updates"] += 1
+                return
+        if action not in ("pull", "tag", "untag", "load", "import", "build", "save"):
+            return
+        import docker
+        try:
+            image = self._get_client().images.get(image_id)
+        except docker.errors.ImageNotFound:
+            with self._lock:
+                self._remove(image_id)
+                self.stats["event_updates"] += 1
+            return
+        entry = ImageEntry.from_image(image)
+        with self._lock:
+            # A tag moved to this image from another one
+            for tag in entry.tags:
+                owner = self._tag_owner.get(tag)
+                if owner and owner != entry.id:
+                    previous = self._entries[owner]
+                    self._add(ImageEntry(owner, [t for t in previous.tags if t != tag],
+                                         previous.size, previous.created))
+            self._add(entry)
+            self.stats["event_updates"] += 1
+        logger.debug(f"Image catalog applied {action} event for {image_id[:19]}.")
+
+    def start_watching(self):
+        """Follow the Docker events stream in a background thread."""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watcher = threading.Thread(target=self._watch, name="cms-image-catalog-events", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        events = self._events
+        if events is not None:
+            events.close()
+
+    def _watch(self):
+        try:
+            self._events = self._get_client().events(decode=True, filters={"type": "image"})
+            logger.info("Image catalog watching Docker events.")
+            for event in self._events:
+                try:
+                    self.apply_event(event)
+                except Exception as e:
+                    logger.warning(f"Image catalog failed to apply event, will refresh: {e}")
+                    self.invalidate()
+        except Exception as e:
+            logger.warning(f"Image catalog event stream stopped: {e}")
+        finally:
+            self._events = None
+            # Without events the cache can silently go stale, so force a reload
+            self.invalidate()
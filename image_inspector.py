@@ -0,0 +1,303 @@
+"""Per-layer size breakdown of local images, to find what makes them large.
+
+The quick path combines GET /images/{name}/history (size and creating
+instruction of each step) with the layer digests from the image inspect
+data. Steps that only change metadata (ENV, CMD, ...) create no layer; they
+are kept in the report with empty=True.
+
+With top_files, the image is also streamed from GET /images/{name}/get (the
+`docker save` tarball) and each layer tarball is read member by member as it
+arrives, without extracting anything to disk. That gives the largest files
+of every layer and the bytes wasted on files that a later layer overwrites or
+deletes, which are still downloaded on every pull.
+
+Shared layers are found by comparing layer digests with every other local
+image (inspected in parallel).
+"""
+import contextvars
+import heapq
+import io
+import itertools
+import json
+import logging
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("cms.images")
+
+WHITEOUT = ".wh."
+OPAQUE_WHITEOUT = ".wh..wh..opq"
+# Members of the saved image smaller than this that look like JSON are kept (manifest, config)
+MAX_METADATA_BYTES = 16 * 2**20
+METADATA_INSTRUCTION = ("ENV", "CMD", "ENTRYPOINT", "EXPOSE", "LABEL", "USER", "VOLUME", "STOPSIGNAL", "ARG",
+                        "HEALTHCHECK", "SHELL", "ONBUILD", "MAINTAINER")
+
+
+class LayerInfo:
+    """One history step of an image and, unless empty, the layer it created."""
+
+    def __init__(self, index, created_by, created=0, size=0, empty=False, diff_id=None):
+        self.index = index
+        self.created_by = created_by or ""
+        self.created = created
+        self.size = size
+        self.empty = empty
+        self.diff_id = diff_id
+        self.shared_with = []
+        self.files = None
+        self.top_files = []
+        self.wasted = 0
+
+    @property
+    def instruction(self):
+        """The creating instruction without the /bin/sh -c #(nop) noise."""
+        text = " ".join(self.created_by.split())
+        for prefix in ("/bin/sh -c #(nop) ", "/bin/sh -c "):
+            if text.startswith(prefix):
+                text = text[len(prefix):] if prefix.endswith(") ") else "RUN " + text[len(prefix):]
+                break
+        text = text.replace("RUN /bin/sh -c ", "RUN ", 1) if text.startswith("RUN /bin/sh -c ") else text
+        return text.removesuffix(" # buildkit")
+
+    def as_dict(self):
+        return {"index": self.index, "instruction": self.instruction, "created": self.created, "size": self.size,
+                "empty": self.empty, "diff_id": self.diff_id, "shared_with": self.shared_with, "files": self.files,
+                "top_files": [{"path": path, "size": size} for size, path in self.top_files],
+                "wasted": self.wasted}
+
+
+class ImageReport:
+    """Layers of one image, bottom (base) first."""
+
+    def __init__(self, reference, image_id, size, layers):
+        self.reference = reference
+        self.id = image_id
+        self.size = size
+        self.layers = layers
+        self.scanned_bytes = 0
+
+    @property
+    def short_id(self):
+        return self.id.split(":", 1)[-1][:12]
+
+    @property
+    def layer_count(self):
+        return sum(1 for layer in self.layers if not layer.empty)
+
+    @property
+    def shared_bytes(self):
+        return sum(layer.size for layer in self.layers if layer.shared_with)
+
+    @property
+    def wasted_bytes(self):
+        return sum(layer.wasted for layer in self.layers)
+
+    def largest(self, count=5):
+        return heapq.nlargest(count, (layer for layer in self.layers if not layer.empty), key=lambda l: l.size)
+
+    def as_dict(self):
+        return {"reference": self.reference, "id": self.id, "size": self.size, "layer_count": self.layer_count,
+                "shared_bytes": self.shared_bytes, "wasted_bytes": self.wasted_bytes,
+                "layers": [layer.as_dict() for layer in self.layers]}
+
+    def summary(self):
+        text = (f"{self.reference} ({self.short_id}): {self.size / 1e6:.1f} MB in {self.layer_count} layers, "
+                f"{self.shared_bytes / 1e6:.1f} MB shared with other local images")
+        if self.scanned_bytes:
+            text += f", {self.wasted_bytes / 1e6:.1f} MB wasted on overwritten or deleted files"
+        return text + "."
+
+
+def _is_empty_step(entry):
+    created_by = " ".join((entry.get("CreatedBy") or "").split())
+    if entry.get("Size", 0):
+        return False
+    if "#(nop)" in created_by:
+        return not any(f"#(nop) {word}" in created_by for word in ("ADD", "COPY"))
+    return created_by.split(" ", 1)[0].upper() in METADATA_INSTRUCTION
+
+
+def _layers_from_history(history, diff_ids):
+    """Build LayerInfos from API history (newest first) and the image's layer digests (bottom first)."""
+    steps = list(reversed(history))
+    layers = [LayerInfo(i, step.get("CreatedBy"), step.get("Created", 0), step.get("Size", 0),
+                        _is_empty_step(step)) for i, step in enumerate(steps)]
+    candidates = [layer for layer in layers if not layer.empty]
+    if len(candidates) != len(diff_ids):
+        # Zero-size steps are ambiguous; fall back to the steps that added bytes
+        candidates = [layer for layer in layers if layer.size]
+    if len(candidates) == len(diff_ids):
+        for layer, diff_id in zip(candidates, diff_ids):
+            layer.diff_id = diff_id
+    else:
+        logger.debug(f"Could not match {len(layers)} history steps to {len(diff_ids)} layers.")
+    return layers
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only file over an iterable of byte chunks (a streamed HTTP body)."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            # A view, so handing out small pieces of a large chunk does not copy the rest
+            self._buffer = memoryview(chunk)
+        count = min(len(target), len(self._buffer))
+        target[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        self.bytes_read += count
+        return count
+
+
+class LayerScan:
+    """Files of one layer tarball: count, bytes, the largest files and whiteouts."""
+
+    def __init__(self, top):
+        self.top = top
+        self.files = 0
+        self.bytes = 0
+        self.largest = []
+        self.entries = []
+        self.whiteouts = []
+
+    def add(self, member):
+        path = member.name.removeprefix("./")
+        directory, _, base = path.rpartition("/")
+        if base == OPAQUE_WHITEOUT:
+            self.whiteouts.append(directory + "/")
+        elif base.startswith(WHITEOUT):
+            self.whiteouts.append(f"{directory}/{base[len(WHITEOUT):]}".lstrip("/"))
+        elif member.isfile():
+            self.files += 1
+            self.bytes += member.size
+            self.entries.append((path, member.size))
+            if self.top:
+                item = (member.size, path)
+                if len(self.largest) < self.top:
+                    heapq.heappush(self.largest, item)
+                elif item > self.largest[0]:
+                    heapq.heapreplace(self.largest, item)
+
+
+def scan_saved_image(chunks, top=10):
+    """Stream a `docker save` tarball and scan every layer in it.
+
+    Returns (config, layers, bytes read): the image config (with history and
+    rootfs.diff_ids) and the LayerScans bottom first.
+    """
+    reader = _ChunkReader(chunks)
+    metadata = {}
+    scans = {}
+    with tarfile.open(fileobj=reader, mode="r|") as saved:
+        for member in saved:
+            if not member.isfile():
+                continue
+            stream = saved.extractfile(member)
+            head = stream.read(512)
+            if head.lstrip()[:1] in (b"{", b"[") and member.size <= MAX_METADATA_BYTES:
+                metadata[member.name] = head + stream.read()
+                continue
+            scan = LayerScan(top)
+            layer_stream = _ChunkReader(itertools.chain([head], iter(lambda: stream.read(2**16), b"")))
+            try:
+                with tarfile.open(fileobj=layer_stream, mode="r|*") as layer:
+                    for entry in layer:
+                        scan.add(entry)
+            except tarfile.ReadError:
+                continue
+            scans[member.name] = scan
+    manifests = json.loads(metadata["manifest.json"]) if "manifest.json" in metadata else None
+    if not manifests:
+        raise ValueError("The saved image has no manifest.json entry; it is not a docker save archive.")
+    manifest = manifests[0]
+    if manifest.get("Config") not in metadata:
+        raise ValueError(f"The saved image is missing its config {manifest.get('Config')}.")
+    config = json.loads(metadata[manifest["Config"]])
+    return config, [scans.get(path) for path in manifest["Layers"]], reader.bytes_read
+
+
+def _apply_scans(layers, config, scans):
+    """Attach file scans to layers and compute the bytes wasted on overwritten or deleted files."""
+    history = config.get("history") or []
+    diff_ids = (config.get("rootfs") or {}).get("diff_ids") or []
+    if len(history) == len(layers):
+        # The saved config says exactly which steps created layers
+        for layer, step in zip(layers, history):
+            layer.empty = bool(step.get("empty_layer"))
+    with_layer = [layer for layer in layers if not layer.empty]
+    if len(with_layer) != len(scans):
+        logger.warning(f"Saved image has {len(scans)} layers but history has {len(with_layer)}; "
+                       "file details are omitted.")
+        return
+    present = {}
+    for layer, diff_id, scan in zip(with_layer, diff_ids, scans):
+        layer.diff_id = diff_id
+        if scan is None:
+            continue
+        layer.files = scan.files
+        layer.top_files = sorted(scan.largest, reverse=True)
+        for removed in scan.whiteouts:
+            for path in [p for p in present if p == removed or p.startswith(removed.rstrip("/") + "/")]:
+                owner, size = present.pop(path)
+                owner.wasted += size
+        for path, size in scan.entries:
+            if path in present:
+                owner, old_size = present[path]
+                owner.wasted += old_size
+            present[path] = (layer, size)
+
+
+def layer_index(client, exclude=None, concurrency=8):
+    """Map each layer digest to the names of the local images using it."""
+    images = [image for image in client.api.images() if image["Id"] != exclude]
+
+    def layers_of(image):
+        try:
+            return image, client.api.inspect_image(image["Id"])["RootFS"].get("Layers") or []
+        except Exception as e:
+            logger.debug(f"Could not inspect image {image['Id']}: {e}")
+            return image, []
+
+    index = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, layers_of, image) for image in images]
+        for future in futures:
+            image, diff_ids = future.result()
+            tags = [tag for tag in image.get("RepoTags") or () if tag != "<none>:<none>"]
+            name = tags[0] if tags else image["Id"].split(":", 1)[-1][:12]
+            for diff_id in diff_ids:
+                index.setdefault(diff_id, []).append(name)
+    return index
+
+
+def inspect_image(client, reference, top_files=0, shared=True, concurrency=8):
+    """Return an ImageReport for a local image.
+
+    top_files > 0 streams the saved image to list that many largest files per
+    layer and the wasted bytes; shared=False skips comparing with other images.
+    """
+    start = time.perf_counter()
+    data = client.api.inspect_image(reference)
+    layers = _layers_from_history(client.api.history(reference), data["RootFS"].get("Layers") or [])
+    report = ImageReport(reference, data["Id"], data.get("Size", 0), layers)
+    if top_files:
+        config, scans, report.scanned_bytes = scan_saved_image(client.api.get_image(reference), top_files)
+        _apply_scans(layers, config, scans)
+    if shared:
+        index = layer_index(client, exclude=data["Id"], concurrency=concurrency)
+        for layer in layers:
+            if layer.diff_id:
+                layer.shared_with = index.get(layer.diff_id, [])
+    logger.info(f"Inspected {reference}: {report.layer_count} layers in {time.perf_counter() - start:.2f} seconds.")
+    return report
@@ -0,0 +1,251 @@
+"""Golden base images and copy-on-write qcow2 overlays.
+
+Base images are registered once and made read-only. A VM gets its own thin
+overlay created with `qemu-img create -b base -F qcow2`, which only writes
+qcow2 metadata, so provisioning takes milliseconds regardless of base size and
+any number of VMs share one base on disk. Overlays can later be discarded,
+committed back into their base, or flattened into a new base image.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import stat
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger("cms.vm")
+
+QEMU_IMG = "qemu-img"
+DEFAULT_POOL_DIR = os.path.join(os.path.expanduser("~"), ".cms", "image-pool")
+
+
+def _check_name(name):
+    if not re.fullmatch(r"[A-Za-z0-9_.-]+", name or ""):
+        raise ValueError(f"Invalid name '{name}'.")
+
+
+def _qemu_img(*args):
+    command = [QEMU_IMG, *args]
+    logger.info(f"Running command: {' '.join(command)}")
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"qemu-img {args[0]} failed: {result.stderr.strip() or result.returncode}")
+    return result.stdout
+
+
+class ImagePool:
+    """Registry of read-only base images and the overlays created from them.
+
+    Layout: <pool>/bases/<name>.qcow2, <pool>/overlays/<name>.qcow2 and an
+    index file <pool>/pool.json mapping names to paths and parents.
+    """
+
+    def __init__(self, pool_dir=DEFAULT_POOL_DIR):
+        self.pool_dir = pool_dir
+        self.bases_dir = os.path.join(pool_dir, "bases")
+        self.overlays_dir = os.path.join(pool_dir, "overlays")
+        os.makedirs(self.bases_dir, exist_ok=True)
+        os.makedirs(self.overlays_dir, exist_ok=True)
+        self._index_path = os.path.join(pool_dir, "pool.json")
+        self._lock = threading.Lock()
+        # Overlays being committed and bases being written (by a commit or add_base); guarded by _lock,
+        # reserved while qemu-img or the copy runs
+        self._committing = set()
+        self._writing_bases = set()
+
+    def _load(self):
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"bases": {}, "overlays": {}}
+
+    def _save(self, index):
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self._index_path)
+
+    # Base images
+
+    def add_base(self, source, name=None, move=False):
+        """Register a qcow2 image as a read-only base, copying (or moving) it into the pool."""
+        name = name or os.path.splitext(os.path.basename(source))[0]
+        _check_name(name)
+        path = os.path.join(self.bases_dir, f"{name}.qcow2")
+        # Reserve the name under the lock and copy without it, so a multi-GB copy does not block overlays
+        with self._lock:
+            index = self._load()
+            if name in index["bases"] or name in self._writing_bases:
+                raise ValueError(f"Base image '{name}' already exists.")
+            self._writing_bases.add(name)
+        try:
+            if move:
+                shutil.move(source, path)
+            else:
+                shutil.copyfile(source, path)
+            os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            with self._lock:
+                index = self._load()
+                index["bases"][name] = {"path": path, "source": os.path.abspath(source), "added": time.time()}
+                self._save(index)
+        except BaseException:
+            # Leave no partial copy behind, and give a moved image back
+            if os.path.exists(path):
+                if move and not os.path.exists(source):
+                    shutil.move(path, source)
+                else:
+                    os.remove(path)
+            raise
+        finally:
+            with self._lock:
+                self._writing_bases.discard(name)
+        logger.info(f"Added base image {name} from {source}.")
+        return path
+
+    def bases(self):
+        """Return {name: info} for all base images, with the names of their overlays."""
+        index = self._load()
+        bases = {name: dict(info, overlays=[]) for name, info in index["bases"].items()}
+        for overlay, info in index["overlays"].items():
+            if info["base"] in bases:
+                bases[info["base"]]["overlays"].append(overlay)
+        return bases
+
+    def remove_base(self, name):
+        with self._lock:
+            index = self._load()
+            if name not in index["bases"]:
+                raise KeyError(f"Unknown base image '{name}'.")
+            children = [o for o, info in index["overlays"].items() if info["base"] == name]
+            if children:
+                raise ValueError(f"Base image '{name}' is used by overlays: {', '.join(children)}.")
+            path = index["bases"].pop(name)["path"]
+            if os.path.exists(path):
+                os.remove(path)
+            self._save(index)
+        logger.info(f"Removed base image {name}.")
+
+    # Overlays
+
+    def create_overlay(self, base, name, size=None, preallocation=None, cluster_size=None):
+        """Create a copy-on-write overlay of base and return its path.
+
+        preallocation="metadata" and cluster_size (e.g. "64k", "2M") are passed
+        to qemu-img; size grows the overlay's virtual disk beyond the base.
+        """
+        _check_name(name)
+        with self._lock:
+            index = self._load()
+            if base not in index["bases"]:
+                raise KeyError(f"Unknown base image '{base}'.")
+            if base in self._writing_bases:
+                raise ValueError(f"Base image '{base}' is being written by an overlay commit.")
+            if name in index["overlays"]:
+                raise ValueError(f"Overlay '{name}' already exists.")
+            base_path = index["bases"][base]["path"]
+            path = os.path.join(self.overlays_dir, f"{name}.qcow2")
+            options = []
+            if preallocation:
+                options.append(f"preallocation={preallocation}")
+            if cluster_size:
+                options.append(f"cluster_size={cluster_size}")
+            args = ["create", "-f", "qcow2", "-b", base_path, "-F", "qcow2"]
+            if options:
+                args += ["-o", ",".join(options)]
+            args.append(path)
+            if size:
+                args.append(str(size))
+            start = time.monotonic()
+            _qemu_img(*args)
+            duration = time.monotonic() - start
+            index["overlays"][name] = {"path": path, "base": base, "created": time.time()}
+            self._save(index)
+        logger.info(f"Created overlay {name} on base {base} in {duration:.3f} seconds.")
+        return path
+
+    def overlays(self):
+        """Return {name: info} for all overlays."""
+        return self._load()["overlays"]
+
+    def overlay_path(self, name):
+        info = self._load()["overlays"].get(name)
+        if info is None:
+            raise KeyError(f"Unknown overlay '{name}'.")
+        return info["path"]
+
+    def discard_overlay(self, name):
+        """Delete an overlay and everything written to it."""
+        with self._lock:
+            index = self._load()
+            if name in self._committing:
+                raise ValueError(f"Overlay '{name}' is being committed.")
+            info = index["overlays"].pop(name, None)
+            if info is None:
+                raise KeyError(f"Unknown overlay '{name}'.")
+            if os.path.exists(info["path"]):
+                os.remove(info["path"])
+            self._save(index)
+        logger.info(f"Discarded overlay {name}.")
+
+    def commit_overlay(self, name, new_base=None):
+        """Keep an overlay's changes, then drop the overlay.
+
+        With new_base the overlay is flattened into a new standalone base image
+        and the original base is untouched. Without it the changes are written
+        into the original base, which is only allowed when no other overlay
+        depends on that base.
+        """
+        # Check and reserve under the lock, run qemu-img (minutes for a large overlay) without it, so
+        # creating overlays of other bases is not blocked meanwhile
+        with self._lock:
+            index = self._load()
+            info = index["overlays"].get(name)
+            if info is None:
+                raise KeyError(f"Unknown overlay '{name}'.")
+            if name in self._committing:
+                raise ValueError(f"Overlay '{name}' is already being committed.")
+            if new_base:
+                _check_name(new_base)
+                if new_base in index["bases"] or new_base in self._writing_bases:
+                    raise ValueError(f"Base image '{new_base}' already exists.")
+                target = new_base
+            else:
+                siblings = [o for o, other in index["overlays"].items() if other["base"] == info["base"] and o != name]
+                if siblings:
+                    raise ValueError(f"Committing would change base '{info['base']}' under overlays: "
+                                     f"{', '.join(siblings)}. Commit to a new base instead.")
+                target = info["base"]
+                base_path = index["bases"][target]["path"]
+            self._committing.add(name)
+            self._writing_bases.add(target)
+
+        start = time.monotonic()
+        try:
+            if new_base:
+                path = os.path.join(self.bases_dir, f"{new_base}.qcow2")
+                _qemu_img("convert", "-O", "qcow2", info["path"], path)
+                os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            else:
+                os.chmod(base_path, stat.S_IRUSR | stat.S_IWUSR)
+                try:
+                    _qemu_img("commit", info["path"])
+                finally:
+                    os.chmod(base_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            with self._lock:
+                index = self._load()
+                if new_base:
+                    index["bases"][new_base] = {"path": path, "source": info["path"], "added": time.time()}
+                index["overlays"].pop(name, None)
+                if os.path.exists(info["path"]):
+                    os.remove(info["path"])
+                self._save(index)
+        finally:
+            with self._lock:
+                self._committing.discard(name)
+                self._writing_bases.discard(target)
+        logger.info(f"Committed overlay {name} into {new_base or info['base']} "
+                    f"in {time.monotonic() - start:.2f} seconds.")
@@ -0,0 +1,225 @@
+import inspect
+import itertools
+import logging
+import queue
+import subprocess
+import threading
+import time
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the executor queue is full."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled."""
+
+
+class Job:
+    """A unit of work tracked by the JobExecutor."""
+
+    def __init__(self, job_id, name, func, args, kwargs, on_success, on_error):
+        self.id = job_id
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_success = on_success
+        self.on_error = on_error
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def duration(self):
+        """Seconds spent running (so far, if the job is still running)."""
+        if self.started_at is None:
+            return None
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation was requested; call from long-running job code."""
+        if self._cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} ({self.name}) was cancelled.")
+
+    def wait(self, timeout=None):
+        """Block until the job finishes. Returns True if it finished within the timeout."""
+        return self._done_event.wait(timeout)
+
+
+class JobExecutor:
+    """Thread pool with a bounded queue for blocking Docker and QEMU operations.
+
+    Callbacks are not run on the worker threads. They are queued and run by
+    process_callbacks(), which the GUI calls from the Tk main loop via root.after.
+    """
+
+    def __init__(self, max_workers=4, max_queue=32):
+        self.max_workers = max_workers
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._callbacks = queue.SimpleQueue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._workers = []
+        self._shutdown = False
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker, name=f"cms-job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, job_name, func, *args, on_success=None, on_error=None, **kwargs):
+        """Queue func(*args, **kwargs) for execution and return its Job.
+
+        If func accepts a ``job`` keyword argument it is passed the Job so it can
+        poll for cancellation. Raises JobQueueFull when the queue is at capacity.
+        The job's own name is job_name so that kwargs may include name (e.g.
+        the name of a VM or container).
+        """
+        if self._shutdown:
+            raise RuntimeError("Job executor has been shut down.")
+        job = Job(next(self._ids), job_name, func, args, kwargs, on_success, on_error)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            logging.warning(f"Job queue full, rejected job: {job_name}")
+            raise JobQueueFull(f"Job queue is full ({self._queue.maxsize} pending jobs).") from None
+        logging.info(f"Job {job.id} queued: {job_name}")
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a job. Queued jobs never start; running jobs are asked to stop.
+
+        Returns False if the job is unknown or has already finished.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            job._cancel_event.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED, error=JobCancelled(f"Job {job.id} ({job.name}) was cancelled."))
+        logging.info(f"Cancellation requested for job {job_id}: {job.name}")
+        return True
+
+    def jobs(self):
+        """Snapshot of all known jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def clear_finished(self):
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.status in FINISHED_STATES]:
+                del self._jobs[job_id]
+
+    def process_callbacks(self, limit=100):
+        """Run pending success/error callbacks on the calling thread."""
+        for _ in range(limit):
+            try:
+                callback, value = self._callbacks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback(value)
+            except Exception as e:
+                logging.error(f"Job callback failed: {e}")
+
+    def shutdown(self, cancel_pending=True):
+        self._shutdown = True
+        if cancel_pending:
+            for job in self.jobs():
+                self.cancel(job.id)
+        for _ in self._workers:
+            self._queue.put(None)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.status != QUEUED:
+                    continue
+                job.status = RUNNING
+                job.started_at = time.monotonic()
+            logging.info(f"Job {job.id} started: {job.name}")
+            try:
+                if _accepts_job(job.func):
+                    job.kwargs.setdefault("job", job)
+                result = job.func(*job.args, **job.kwargs)
+            except JobCancelled as e:
+                with self._lock:
+                    self._finish(job, CANCELLED, error=e)
+            except Exception as e:
+                logging.error(f"Job {job.id} failed: {job.name}: {e}")
+                with self._lock:
+                    self._finish(job, CANCELLED if job.cancelled else FAILED, error=e)
+            else:
+                with self._lock:
+                    self._finish(job, CANCELLED if job.cancelled else DONE, result=result)
+
+    def _finish(self, job, status, result=None, error=None):
+        # Caller holds self._lock.
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.monotonic()
+        if job.started_at is None:
+            job.started_at = job.finished_at
+        job._done_event.set()
+        logging.info(f"Job {job.id} {status}: {job.name} ({job.duration:.2f}s)")
+        if status == DONE and job.on_success:
+            self._callbacks.put((job.on_success, result))
+        elif status in (FAILED, CANCELLED) and job.on_error:
+            self._callbacks.put((job.on_error, error))
+
+
+def _accepts_job(func):
+    # inspect.signature follows functools.wraps, so decorated functions are handled too
+    try:
+        return "job" in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def run_process(args, job=None, poll_interval=0.2):
+    """Run a subprocess to completion, terminating it if the job is cancelled.
+
+    Returns the process exit code.
+    """
+    logging.info(f"Running command: {' '.join(args)}")
+    process = subprocess.Popen(args)
+    while True:
+        try:
+            return process.wait(timeout=poll_interval)
+        except subprocess.TimeoutExpired:
+            if job is not None and job.cancelled:
+                logging.info(f"Terminating process {process.pid} for cancelled job {job.id}.")
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                job.check_cancelled()
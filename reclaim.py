@@ -0,0 +1,419 @@
+"""Disk reclamation for images, stopped containers, build cache and VM overlays.
+
+A ReclaimPolicy says what may go:
+
+* keep_tags - untag all but the newest N tags of every repository (images
+  left without tags are removed)
+* dangling - remove untagged images; images pulled by digest have no tags
+  but are not dangling and stay
+* image_unused_days / container_age_days / cache_unused_days /
+  overlay_unused_days - evict what has not been used for that long
+* high_water / low_water - when the Docker root or the image pool file system
+  is fuller than high_water, evict least recently used resources until the
+  projected usage drops below low_water
+
+plan() reads the daemon state with a single system df call plus the image
+pool index and returns a ReclaimPlan listing every removal with the bytes it
+frees; nothing is deleted until execute() runs it. Images, containers or
+overlays in use by a container or a running VM are never candidates.
+
+Docker does not record when an image was last used, so the UsageTracker keeps
+last-used timestamps for everything the CMS runs, builds or pulls; other
+images fall back to their creation time.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from calendar import timegm
+
+from batch_containers import run_operations, summarize
+
+logger = logging.getLogger("cms.reclaim")
+
+DEFAULT_USAGE_FILE = os.path.join(os.path.expanduser("~"), ".cms", "last_used.json")
+DAY = 86400
+
+# Containers go first so the images they referenced become removable
+PHASES = ("container", "image", "build-cache", "overlay")
+
+
+class ReclaimPolicy:
+    """What the reclamation engine may remove; None disables a rule."""
+
+    FIELDS = ("keep_tags", "dangling", "image_unused_days", "container_age_days", "cache_unused_days",
+              "overlay_unused_days", "high_water", "low_water")
+
+    def __init__(self, keep_tags=None, dangling=False, image_unused_days=None, container_age_days=None,
+                 cache_unused_days=None, overlay_unused_days=None, high_water=None, low_water=None):
+        if high_water is not None and not 0 < high_water <= 1:
+            raise ValueError("high_water must be a fraction between 0 and 1.")
+        if low_water is not None and high_water is not None and not 0 < low_water <= high_water:
+            raise ValueError("low_water must be between 0 and high_water.")
+        if keep_tags is not None and keep_tags < 1:
+            raise ValueError("keep_tags must be at least 1.")
+        self.keep_tags = keep_tags
+        self.dangling = bool(dangling)
+        self.image_unused_days = image_unused_days
+        self.container_age_days = container_age_days
+        self.cache_unused_days = cache_unused_days
+        self.overlay_unused_days = overlay_unused_days
+        self.high_water = high_water
+        self.low_water = low_water if low_water is not None else (max(0.0, high_water - 0.1) if high_water else None)
+
+    @classmethod
+    def load(cls, path):
+        """Read a policy from a JSON file with the same keys as the constructor."""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        unknown = set(data) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown reclaim policy keys: {', '.join(sorted(unknown))}.")
+        return cls(**data)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class UsageTracker:
+    """Last-used timestamps of images (by tag or id) and overlays (by name), stored as JSON."""
+
+    def __init__(self, path=DEFAULT_USAGE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path) as f:
+                    self._data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._data = {}
+        return self._data
+
+    def touch(self, kind, *keys):
+        """Record that images (kind "images") or overlays ("overlays") were used now."""
+        now = time.time()
+        with self._lock:
+            data = self._load()
+            data.setdefault(kind, {}).update((key, now) for key in keys)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Could not save usage timestamps to {self.path}: {e}")
+
+    def last_used(self, kind, *keys):
+        """Latest timestamp recorded under any of keys, or None."""
+        with self._lock:
+            entries = self._load().get(kind, {})
+            times = [entries[key] for key in keys if key in entries]
+        return max(times) if times else None
+
+
+class Candidate:
+    """One removal in a reclamation plan."""
+
+    def __init__(self, kind, target, size, reason, last_used, location, func):
+        self.kind = kind
+        self.target = target
+        self.size = size
+        self.reason = reason
+        self.last_used = last_used
+        self.location = location
+        self.func = func
+
+    def as_dict(self):
+        return {"kind": self.kind, "target": self.target, "bytes": self.size, "reason": self.reason,
+                "last_used": self.last_used}
+
+
+class ReclaimPlan:
+    def __init__(self, policy):
+        self.policy = policy
+        self.candidates = []
+        self.disk = {}
+
+    @property
+    def total_bytes(self):
+        return sum(c.size for c in self.candidates)
+
+    def as_dict(self):
+        return {"policy": self.policy.as_dict(), "disk": self.disk, "bytes": self.total_bytes,
+                "candidates": [c.as_dict() for c in self.candidates]}
+
+    def describe(self):
+        if not self.candidates:
+            return "Nothing to reclaim."
+        lines = [f"{c.kind:11} {c.size / 1e6:10.1f} MB  {c.target}  ({c.reason})" for c in self.candidates]
+        lines.append(f"{len(self.candidates)} removals, {self.total_bytes / 1e6:.1f} MB reclaimable.")
+        return "\n".join(lines)
+
+
+def _parse_time(value):
+    """Seconds since the epoch for a Docker timestamp (int or RFC 3339 string)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value or value.startswith("0001-01-01"):
+        return None
+    return float(timegm(time.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")))
+
+
+def _repository(tag):
+    return tag.rsplit(":", 1)[0] if ":" in tag.rsplit("/", 1)[-1] else tag
+
+
+def _disk_fraction(path):
+    if not path or not os.path.exists(path):
+        return None
+    usage = shutil.disk_usage(path)
+    return {"path": path, "total": usage.total, "used": usage.used, "fraction": usage.used / usage.total}
+
+
+def _image_candidates(client, df, policy, usage, busy_images, now):
+    images = df.get("Images") or []
+    by_id = {image["Id"]: image for image in images}
+    tag_reasons = {}
+
+    if policy.keep_tags:
+        repositories = {}
+        for image in images:
+            for tag in image.get("RepoTags") or ():
+                if tag != "<none>:<none>":
+                    repositories.setdefault(_repository(tag), []).append((image.get("Created", 0), tag))
+        for repository, tags in repositories.items():
+            for _, tag in sorted(tags, reverse=True)[policy.keep_tags:]:
+                tag_reasons[tag] = f"older than the newest {policy.keep_tags} tags of {repository}"
+
+    candidates = []
+    removed = set()
+    for image_id, image in by_id.items():
+        if image_id in busy_images:
+            continue
+        tags = [tag for tag in image.get("RepoTags") or () if tag != "<none>:<none>"]
+        last_used = usage.last_used("images", image_id, *tags) or _parse_time(image.get("Created"))
+        shared = image.get("SharedSize", -1)
+        unique = image.get("Size", 0) - (shared if shared and shared > 0 else 0)
+        reason = None
+        # Forcing is only needed to drop every tag of an image at once
+        force = True
+        if not tags and policy.dangling and not image.get("RepoDigests"):
+            reason = "dangling"
+            force = False
+        elif policy.image_unused_days is not None and now - last_used > policy.image_unused_days * DAY:
+            reason = f"unused for {(now - last_used) / DAY:.0f} days"
+        elif tags and all(tag in tag_reasons for tag in tags):
+            reason = tag_reasons[tags[0]]
+        if reason is not None:
+            removed.add(image_id)
+            candidates.append(Candidate("image", tags[0] if tags else image_id[:19], unique, reason, last_used,
+                                        "docker", lambda i=image_id, f=force: client.api.remove_image(i, force=f)))
+            continue
+        # Image stays but some of its tags are over the keep limit: untagging frees nothing
+        for tag in tags:
+            if tag in tag_reasons:
+                candidates.append(Candidate("image", tag, 0, f"untag, {tag_reasons[tag]}", last_used, "docker",
+                                            lambda t=tag: client.api.remove_image(t)))
+    return candidates, removed
+
+
+def _lru_images(client, df, usage, excluded):
+    """Every image not in excluded, for high-water eviction."""
+    candidates = []
+    for image in df.get("Images") or []:
+        if image["Id"] in excluded:
+            continue
+        tags = [tag for tag in image.get("RepoTags") or () if tag != "<none>:<none>"]
+        shared = image.get("SharedSize", -1)
+        candidates.append(Candidate("image", tags[0] if tags else image["Id"][:19],
+                                    image.get("Size", 0) - (shared if shared and shared > 0 else 0),
+                                    "least recently used", usage.last_used("images", image["Id"], *tags)
+                                    or _parse_time(image.get("Created")), "docker",
+                                    lambda i=image["Id"]: client.api.remove_image(i, force=True)))
+    return candidates
+
+
+def _overlay_candidates(pool, manager, usage, policy, now, lru):
+    running_disks = {vm.disk for vm in manager.list() if vm.is_running()} if manager is not None else set()
+    started = {}
+    if manager is not None:
+        for vm in manager.list():
+            started[vm.disk] = max(started.get(vm.disk, 0), vm.started_at)
+    candidates = []
+    for name, info in pool.overlays().items():
+        path = info["path"]
+        if path in running_disks:
+            continue
+        try:
+            stat = os.stat(path)
+            size, modified = stat.st_blocks * 512, stat.st_mtime
+        except FileNotFoundError:
+            size, modified = 0, info.get("created", 0)
+        last_used = max(modified, started.get(path, 0), usage.last_used("overlays", name) or 0)
+        if lru:
+            reason = "least recently used"
+        elif policy.overlay_unused_days is not None and now - last_used > policy.overlay_unused_days * DAY:
+            reason = f"unused for {(now - last_used) / DAY:.0f} days"
+        else:
+            continue
+        candidates.append(Candidate("overlay", name, size, reason, last_used, "pool",
+                                    lambda n=name: pool.discard_overlay(n)))
+    return candidates
+
+
+def plan(policy, client=None, pool=None, manager=None, usage=None, docker_root=None, now=None):
+    """Return the ReclaimPlan for policy.
+
+    client covers images, containers and build cache; pool (with manager to
+    see which overlays are in use) covers VM overlays. docker_root is the
+    daemon's data directory used for the high-water check (skipped when it is
+    not on this host).
+    """
+    usage = usage or UsageTracker()
+    now = now or time.time()
+    result = ReclaimPlan(policy)
+    lru = []
+
+    if client is not None:
+        df = client.api.df()
+        containers = df.get("Containers") or []
+        removable_containers = set()
+        for container in containers:
+            if container.get("State") in ("running", "paused", "restarting"):
+                continue
+            created = _parse_time(container.get("Created")) or now
+            name = (container.get("Names") or [container["Id"][:12]])[0].lstrip("/")
+            candidate = Candidate("container", name, container.get("SizeRw", 0) or 0, container.get("Status", ""),
+                                  created, "docker", lambda i=container["Id"]: client.api.remove_container(i))
+            if policy.container_age_days is not None and now - created > policy.container_age_days * DAY:
+                candidate.reason = f"stopped, created {(now - created) / DAY:.0f} days ago"
+                removable_containers.add(container["Id"])
+                result.candidates.append(candidate)
+            else:
+                lru.append(candidate)
+        busy_images = {c.get("ImageID") for c in containers if c["Id"] not in removable_containers}
+        image_candidates, removed_images = _image_candidates(client, df, policy, usage, busy_images, now)
+        result.candidates += image_candidates
+
+        if policy.cache_unused_days is not None:
+            cutoff = policy.cache_unused_days * DAY
+            stale = [entry for entry in df.get("BuildCache") or () if not entry.get("InUse")
+                     and now - (_parse_time(entry.get("LastUsedAt")) or _parse_time(entry.get("CreatedAt")) or now)
+                     > cutoff]
+            if stale:
+                hours = int(cutoff // 3600)
+                result.candidates.append(Candidate(
+                    "build-cache", f"{len(stale)} records", sum(e.get("Size", 0) for e in stale if not e.get("Shared")),
+                    f"unused for {policy.cache_unused_days} days", None, "docker",
+                    lambda: client.api.prune_builds(filters={"until": f"{hours}h"})))
+
+        if policy.high_water:
+            root = docker_root
+            if root is None:
+                try:
+                    root = client.api.info().get("DockerRootDir")
+                except Exception as e:
+                    logger.warning(f"Could not read the Docker root directory: {e}")
+            disk = _disk_fraction(root)
+            if disk is not None:
+                result.disk["docker"] = disk
+                lru += _lru_images(client, df, usage, busy_images | removed_images)
+
+    if pool is not None:
+        result.candidates += _overlay_candidates(pool, manager, usage, policy, now, lru=False)
+        if policy.high_water:
+            disk = _disk_fraction(pool.pool_dir)
+            if disk is not None:
+                result.disk["pool"] = disk
+                planned = {c.target for c in result.candidates if c.kind == "overlay"}
+                lru += [c for c in _overlay_candidates(pool, manager, usage, policy, now, lru=True)
+                        if c.target not in planned]
+
+    _evict_over_high_water(result, policy, lru)
+    result.candidates.sort(key=lambda c: PHASES.index(c.kind))
+    return result
+
+
+def _evict_over_high_water(result, policy, lru):
+    """Add least recently used candidates per file system until usage is projected below low_water."""
+    for location, disk in result.disk.items():
+        disk["projected"] = (disk["used"] - sum(c.size for c in result.candidates if c.location == location)) \
+            / disk["total"]
+        if disk["fraction"] < policy.high_water or disk["projected"] < policy.low_water:
+            continue
+        for candidate in sorted((c for c in lru if c.location == location), key=lambda c: c.last_used or 0):
+            if disk["projected"] < policy.low_water:
+                break
+            result.candidates.append(candidate)
+            disk["projected"] -= candidate.size / disk["total"]
+
+
+def execute(plan, concurrency=4, job=None):
+    """Run a plan in phases (containers, images, build cache, overlays), each phase in parallel.
+
+    Returns (results, summary) with summary["bytes"] set to the bytes freed by
+    the removals that succeeded.
+    """
+    def remove(candidate):
+        def run():
+            candidate.func()
+            return candidate.size
+        return run
+
+    results = []
+    wall = 0.0
+    freed = 0
+    for phase in PHASES:
+        batch = [c for c in plan.candidates if c.kind == phase]
+        if not batch:
+            continue
+        tasks = [(f"reclaim.{c.kind}", f"remove {c.kind}", c.target, remove(c)) for c in batch]
+        phase_results, seconds = run_operations(tasks, concurrency, job, bytes_of=lambda size: size, log=logger,
+                                                thread_name_prefix="cms-reclaim")
+        results += phase_results
+        wall += seconds
+        freed += sum(c.size for c, result in zip(batch, phase_results) if result.ok)
+    summary = summarize(results, wall)
+    summary["bytes"] = freed
+    logger.info(f"Reclaimed {freed / 1e6:.1f} MB with {summary['ok']}/{len(results)} removals "
+                f"in {summary['wall_seconds']:.2f} seconds.")
+    return results, summary
+
+
+class Reclaimer:
+    """Background thread that runs reclaim_once() every interval seconds.
+
+    reclaim_once() plans and executes a policy and returns (results,
+    summary); rounds with nothing to remove cost one system df call.
+    """
+
+    def __init__(self, reclaim_once, interval=600.0):
+        self._reclaim_once = reclaim_once
+        self.interval = interval
+        self.last_summary = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cms-reclaimer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                results, summary = self._reclaim_once()
+                if results:
+                    self.last_summary = summary
+            except Exception as e:
+                logger.warning(f"Background reclamation failed: {e}")
+            self._stop.wait(self.interval)
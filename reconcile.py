@@ -0,0 +1,270 @@
+"""Declarative desired state for containers and VMs.
+
+A spec file is JSON:
+
+    {
+      "containers": {
+        "web": {"image": "nginx:latest", "replicas": 3, "ports": ["8080:80"],
+                "env": {"MODE": "prod"}, "cpus": 0.5, "memory": "256m"}
+      },
+      "vms": {
+        "db": {"base": "ubuntu-22.04", "cpu": 2, "memory": 2048}
+      }
+    }
+
+plan() compares the spec with one listing of the containers labelled
+cms.service and one listing of the VM manager, and returns only the actions
+needed to converge; apply() runs them in parallel. Replica i of service web is
+named web-<i>. Each container carries a hash of its service definition, so a
+changed definition recreates exactly the affected replicas and an unchanged
+spec plans nothing. Containers of services no longer in the spec are removed
+(prune); VMs missing from the spec are left alone. A running VM whose cpu,
+memory, disk or QEMU options differ from its entry is restarted; moving an
+existing overlay to another base is refused, since it would lose the VM's disk.
+"""
+import hashlib
+import json
+import logging
+import os
+
+from batch_containers import parse_env, parse_ports, run_operations, summarize
+from vm_manager import build_qemu_command
+
+logger = logging.getLogger("cms.containers")
+
+SERVICE_LABEL = "cms.service"
+REPLICA_LABEL = "cms.replica"
+SPEC_LABEL = "cms.spec"
+# Seconds a drifted VM gets to power down before it is killed and relaunched
+VM_RESTART_TIMEOUT = 10.0
+
+CONTAINER_KEYS = {"image", "replicas", "env", "ports", "cpus", "memory", "labels", "command"}
+VM_KEYS = {"base", "image", "cpu", "memory", "kvm", "cache", "aio", "hugepages"}
+# Keys passed to VMManager.launch
+VM_OPTIONS = ("kvm", "cache", "aio", "hugepages")
+
+
+class Action:
+    """One step of a reconciliation plan."""
+
+    def __init__(self, kind, target, reason, func):
+        self.kind = kind
+        self.target = target
+        self.reason = reason
+        self.func = func
+
+    def as_dict(self):
+        return {"action": self.kind, "target": self.target, "reason": self.reason}
+
+
+class Plan:
+    def __init__(self):
+        self.actions = []
+        self.unchanged = []
+
+    def add(self, kind, target, reason, func):
+        self.actions.append(Action(kind, target, reason, func))
+
+    def as_dict(self):
+        return {"actions": [action.as_dict() for action in self.actions], "unchanged": self.unchanged}
+
+    def describe(self):
+        if not self.actions:
+            return f"Nothing to do ({len(self.unchanged)} resources up to date)."
+        lines = [f"{action.kind:9} {action.target}  ({action.reason})" for action in self.actions]
+        lines.append(f"{len(self.actions)} actions, {len(self.unchanged)} resources up to date.")
+        return "\n".join(lines)
+
+
+def load_spec(path):
+    with open(path, 'r') as f:
+        return validate_spec(json.load(f))
+
+
+def validate_spec(spec):
+    """Check a spec dict and return it; raises ValueError on the first problem."""
+    if not isinstance(spec, dict) or set(spec) - {"containers", "vms"}:
+        raise ValueError("The spec must be an object with 'containers' and/or 'vms'.")
+    for service, config in spec.get("containers", {}).items():
+        if not isinstance(config, dict) or "image" not in config:
+            raise ValueError(f"Container service '{service}' needs an image.")
+        unknown = set(config) - CONTAINER_KEYS
+        if unknown:
+            raise ValueError(f"Container service '{service}' has unknown keys: {', '.join(sorted(unknown))}.")
+        if not isinstance(config.get("replicas", 1), int) or config.get("replicas", 1) < 0:
+            raise ValueError(f"Container service '{service}' has an invalid replica count.")
+    for name, config in spec.get("vms", {}).items():
+        if not isinstance(config, dict) or ("base" in config) == ("image" in config):
+            raise ValueError(f"VM '{name}' needs exactly one of 'base' or 'image'.")
+        unknown = set(config) - VM_KEYS
+        if unknown:
+            raise ValueError(f"VM '{name}' has unknown keys: {', '.join(sorted(unknown))}.")
+        for key in ("cpu", "memory"):
+            if not str(config.get(key, "")).isdigit() or int(config[key]) <= 0:
+                raise ValueError(f"VM '{name}' needs a positive {key}.")
+    return spec
+
+
+def spec_hash(config):
+    """Short stable hash of a service definition (the replica count is not part of it)."""
+    definition = {key: value for key, value in config.items() if key != "replicas"}
+    return hashlib.sha1(json.dumps(definition, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _run_kwargs(service, config, index, digest):
+    env = config.get("env")
+    if isinstance(env, list):
+        env = parse_env(env)
+    ports = config.get("ports")
+    if isinstance(ports, list):
+        ports = parse_ports(ports)
+    labels = dict(config.get("labels") or {})
+    labels.update({SERVICE_LABEL: service, REPLICA_LABEL: str(index), SPEC_LABEL: digest})
+    kwargs = {"name": f"{service}-{index}", "detach": True, "environment": env or None, "labels": labels,
+              "ports": {container: (int(host) + index if host is not None else None)
+                        for container, host in (ports or {}).items()} or None}
+    if config.get("command"):
+        kwargs["command"] = config["command"]
+    if config.get("cpus"):
+        kwargs["nano_cpus"] = int(float(config["cpus"]) * 1e9)
+    if config.get("memory"):
+        kwargs["mem_limit"] = config["memory"]
+    return kwargs
+
+
+def _plan_containers(plan, client, services, prune):
+    # One listing request; the summaries carry the labels and state the plan needs, while
+    # containers.list() would inspect every container separately
+    actual = {}
+    for summary in client.api.containers(all=True, filters={"label": SERVICE_LABEL}):
+        labels = summary.get("Labels") or {}
+        actual.setdefault(labels.get(SERVICE_LABEL), {})[labels.get(REPLICA_LABEL)] = summary
+
+    def name_of(summary):
+        return (summary.get("Names") or ["/" + summary["Id"][:12]])[0].lstrip("/")
+
+    def create(image, kwargs):
+        return lambda: client.containers.run(image, **kwargs)
+
+    def start(summary):
+        return lambda: client.api.start(summary["Id"])
+
+    def remove(summary):
+        return lambda: client.api.remove_container(summary["Id"], force=True)
+
+    def recreate(summary, image, kwargs):
+        def run():
+            client.api.remove_container(summary["Id"], force=True)
+            client.containers.run(image, **kwargs)
+        return run
+
+    for service, config in services.items():
+        digest = spec_hash(config)
+        existing = actual.pop(service, {})
+        for index in range(config.get("replicas", 1)):
+            kwargs = _run_kwargs(service, config, index, digest)
+            summary = existing.pop(str(index), None)
+            if summary is None:
+                plan.add("create", kwargs["name"], "missing", create(config["image"], kwargs))
+            elif (summary.get("Labels") or {}).get(SPEC_LABEL) != digest:
+                plan.add("recreate", name_of(summary), "definition changed",
+                         recreate(summary, config["image"], kwargs))
+            elif summary.get("State") != "running":
+                plan.add("start", name_of(summary), summary.get("State"), start(summary))
+            else:
+                plan.unchanged.append(name_of(summary))
+        for summary in existing.values():
+            plan.add("remove", name_of(summary), "above replica count", remove(summary))
+    if not prune:
+        return
+    for summaries in actual.values():
+        for summary in summaries.values():
+            plan.add("remove", name_of(summary), "service not in spec", remove(summary))
+
+
+def _plan_vms(plan, manager, pool, vms):
+    actual = {vm.name: vm for vm in manager.list()}
+    overlays = pool.overlays() if pool is not None else {}
+
+    def launch(name, config, create_overlay, restart=False):
+        options = {key: config[key] for key in VM_OPTIONS if key in config}
+
+        def run():
+            if restart:
+                # The VM is relaunched right away, so do not wait the default minute for the guest
+                manager.shutdown(name, timeout=VM_RESTART_TIMEOUT)
+            if create_overlay:
+                disk = pool.create_overlay(config["base"], name)
+            elif "base" in config:
+                disk = pool.overlay_path(name)
+            else:
+                disk = config["image"]
+            manager.launch(disk, int(config["cpu"]), int(config["memory"]), name=name, **options)
+        return run
+
+    for name, config in vms.items():
+        vm = actual.get(name)
+        if "base" in config and name in overlays and overlays[name]["base"] != config["base"]:
+            # Rebasing would throw away everything the VM wrote to its overlay
+            raise ValueError(f"VM '{name}' runs on an overlay of base '{overlays[name]['base']}', not "
+                             f"'{config['base']}'; discard the overlay to change its base.")
+        needs_overlay = "base" in config and name not in overlays
+        if vm is None or not vm.is_running():
+            reason = "missing" if vm is None else "stopped"
+            plan.add("start-vm" if vm is not None else "create-vm", name, reason, launch(name, config, needs_overlay))
+            continue
+        if "base" in config:
+            disk = overlays[name]["path"] if name in overlays else os.path.join(pool.overlays_dir, f"{name}.qcow2")
+        else:
+            disk = config["image"]
+        changes = _vm_changes(vm, config, disk)
+        if changes:
+            plan.add("restart", name, ", ".join(changes), launch(name, config, needs_overlay, restart=True))
+        else:
+            plan.unchanged.append(name)
+
+
+def _vm_settings(command):
+    """The spec-controlled settings of a QEMU command line built by build_qemu_command."""
+    drive = dict(part.split("=", 1) for part in command[command.index("-drive") + 1].split(",") if "=" in part)
+    return {"disk": drive.get("file"), "kvm": "-enable-kvm" in command, "cache": drive.get("cache"),
+            "aio": drive.get("aio"), "hugepages": "-mem-path" in command}
+
+
+def _vm_changes(vm, config, disk):
+    """Describe every difference between a running VM and its spec entry, e.g. "cache none -> writeback"."""
+    options = {key: config[key] for key in VM_OPTIONS if key in config}
+    # Build the command the spec asks for, so defaults and the aio fallback resolve as they did at launch
+    wanted = _vm_settings(build_qemu_command(disk, int(config["cpu"]), int(config["memory"]), vm.qmp_path,
+                                             name=vm.name, **options))
+    wanted.update(cpu=int(config["cpu"]), memory=int(config["memory"]))
+    current = dict(_vm_settings(vm.command), cpu=vm.cpu, memory=vm.memory)
+    return [f"{key} {current[key]} -> {wanted[key]}" for key in ("cpu", "memory", "disk", *VM_OPTIONS)
+            if current[key] != wanted[key]]
+
+
+def plan(spec, client=None, manager=None, pool=None, prune=True):
+    """Return the Plan that moves the current state to spec.
+
+    Containers are only considered when the spec has a "containers" key (an
+    empty object removes every cms.service container when prune is set), VMs
+    only when it has "vms". client is needed for the former, manager and pool
+    for the latter.
+    """
+    validate_spec(spec)
+    result = Plan()
+    if "containers" in spec:
+        _plan_containers(result, client, spec["containers"], prune)
+    if "vms" in spec:
+        _plan_vms(result, manager, pool, spec["vms"])
+    return result
+
+
+def apply(plan, concurrency=8, job=None):
+    """Run a plan's actions in parallel; returns (results, summary) like batch_containers."""
+    tasks = [(f"reconcile.{action.kind}", action.kind, action.target, action.func) for action in plan.actions]
+    results, wall = run_operations(tasks, concurrency, job, log=logger, thread_name_prefix="cms-reconcile")
+    summary = summarize(results, wall)
+    logger.info(f"Reconcile applied {summary['ok']}/{len(results)} actions in {summary['wall_seconds']:.2f} "
+                f"seconds, {len(plan.unchanged)} resources unchanged.")
+    return results, summary
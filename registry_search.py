@@ -0,0 +1,322 @@
+"""Registry search and tag listing with caching, coalescing and rate limiting.
+
+Queries go to a pluggable backend: Docker Hub (the index search that
+`docker search` uses, plus the Hub tags API) or any registry implementing
+the Distribution v2 API (/v2/_catalog and /v2/<name>/tags/list), such as a
+local `registry:2` container. Answers are kept in an on-disk cache with a TTL
+and a bounded number of entries (least recently used evicted first);
+identical queries already in flight share one request; and a token bucket
+spaces requests so repeated searches do not trip registry rate limits.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger("cms.registry")
+
+DOCKER_HUB_INDEX = "https://index.docker.io"
+DOCKER_HUB_API = "https://hub.docker.com"
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cms", "registry-cache.json")
+SORT_KEYS = ("stars", "name", "official")
+
+
+class RegistryError(Exception):
+    """Raised when the registry cannot be reached or answers with an error."""
+
+
+class RateLimited(RegistryError):
+    """The registry answered 429 Too Many Requests."""
+
+    def __init__(self, retry_after=None):
+        try:
+            self.retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            self.retry_after = None
+        super().__init__("Registry rate limit reached"
+                         + (f", retry after {self.retry_after:.0f} seconds." if self.retry_after else "."))
+
+
+class SearchResult:
+    """One repository found by a registry search."""
+
+    def __init__(self, name, description="", stars=0, official=False, automated=False):
+        self.name = name
+        self.description = description or ""
+        self.stars = stars or 0
+        self.official = bool(official)
+        self.automated = bool(automated)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], data.get("description"), data.get("stars"), data.get("official"),
+                   data.get("automated"))
+
+    def as_dict(self):
+        return {"name": self.name, "description": self.description, "stars": self.stars,
+                "official": self.official, "automated": self.automated}
+
+
+class TagInfo:
+    """One tag of a repository; size and updated are None when the registry does not report them."""
+
+    def __init__(self, name, size=None, updated=None):
+        self.name = name
+        self.size = size
+        self.updated = updated
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], data.get("size"), data.get("updated"))
+
+    def as_dict(self):
+        return {"name": self.name, "size": self.size, "updated": self.updated}
+
+
+def sort_results(results, key="stars", reverse=False):
+    """Sort search results by stars (most first), name or official (official first)."""
+    if key not in SORT_KEYS:
+        raise ValueError(f"Invalid sort key '{key}', expected one of {', '.join(SORT_KEYS)}.")
+    if key == "name":
+        return sorted(results, key=lambda r: r.name, reverse=reverse)
+    if key == "official":
+        return sorted(results, key=lambda r: (not r.official, -r.stars), reverse=reverse)
+    return sorted(results, key=lambda r: r.stars, reverse=not reverse)
+
+
+def _get_json(url, timeout=10.0, headers=None):
+    request = urllib.request.Request(url, headers={"Accept": "application/json", **(headers or {})})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        if e.code == 429:
+            raise RateLimited(e.headers.get("Retry-After")) from e
+        raise RegistryError(f"{url}: HTTP {e.code} {e.reason}") from e
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        raise RegistryError(f"{url}: {e}") from e
+
+
+class DockerHubBackend:
+    """Docker Hub: index search (stars, official, description) and the Hub tags API."""
+
+    def __init__(self, index_url=DOCKER_HUB_INDEX, api_url=DOCKER_HUB_API, timeout=10.0):
+        self.index_url = index_url.rstrip("/")
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+
+    @property
+    def name(self):
+        return self.index_url
+
+    def search(self, query, limit):
+        url = f"{self.index_url}/v1/search?{urllib.parse.urlencode({'q': query, 'n': limit})}"
+        data = _get_json(url, self.timeout)
+        return [SearchResult(item["name"], item.get("description"), item.get("star_count"),
+                             item.get("is_official"), item.get("is_automated"))
+                for item in data.get("results") or ()][:limit]
+
+    def tags(self, repository, limit):
+        path = repository if "/" in repository else f"library/{repository}"
+        url = f"{self.api_url}/v2/repositories/{path}/tags?{urllib.parse.urlencode({'page_size': min(limit, 100)})}"
+        tags = []
+        while url and len(tags) < limit:
+            data = _get_json(url, self.timeout)
+            tags += [TagInfo(item["name"], item.get("full_size"), item.get("last_updated"))
+                     for item in data.get("results") or ()]
+            url = data.get("next")
+        return tags[:limit]
+
+
+class RegistryV2Backend:
+    """Any Distribution v2 registry; search is a substring match over /v2/_catalog."""
+
+    def __init__(self, url, timeout=10.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    @property
+    def name(self):
+        return self.url
+
+    def search(self, query, limit):
+        data = _get_json(f"{self.url}/v2/_catalog?n=10000", self.timeout)
+        needle = query.lower()
+        return [SearchResult(name) for name in data.get("repositories") or () if needle in name.lower()][:limit]
+
+    def tags(self, repository, limit):
+        data = _get_json(f"{self.url}/v2/{repository}/tags/list", self.timeout)
+        return [TagInfo(name) for name in sorted(data.get("tags") or ())][:limit]
+
+
+def backend_for(url=None):
+    """Docker Hub for None, "hub" or "docker.io"; otherwise a v2 registry at url."""
+    if not url or url in ("hub", "docker.io"):
+        return DockerHubBackend()
+    if "://" not in url:
+        url = f"https://{url}"
+    return RegistryV2Backend(url)
+
+
+class RateLimiter:
+    """Token bucket: at most burst requests at once, refilled at rate per second."""
+
+    def __init__(self, rate=1.0, burst=5):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def back_off(self, seconds):
+        """Send nothing for seconds (after a 429 answer)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+class ResponseCache:
+    """JSON file cache with a TTL and at most max_entries entries (least recently used evicted)."""
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl=3600, max_entries=500):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = OrderedDict()
+            if self.path:
+                try:
+                    with open(self.path) as f:
+                        self._entries.update(json.load(f))
+                except (FileNotFoundError, json.JSONDecodeError):
+                    pass
+        return self._entries
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save registry cache {self.path}: {e}")
+
+    def get(self, key):
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry["ts"] > self.ttl:
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return entry["value"]
+
+    def put(self, key, value):
+        with self._lock:
+            entries = self._load()
+            entries[key] = {"ts": time.time(), "value": value}
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._save()
+
+
+class RegistrySearch:
+    """Cached, coalesced and rate-limited search and tag listing against one backend."""
+
+    def __init__(self, backend=None, cache=None, limiter=None):
+        self.backend = backend or DockerHubBackend()
+        self.cache = cache if cache is not None else ResponseCache()
+        self.limiter = limiter or RateLimiter()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "requests": 0, "rate_limited": 0}
+
+    def search(self, query, limit=25):
+        """Return SearchResults for query, best registry ranking first."""
+        values = self._cached(f"search|{query.lower()}|{limit}", lambda: [
+            r.as_dict() for r in self.backend.search(query, limit)])
+        return [SearchResult.from_dict(value) for value in values]
+
+    def tags(self, repository, limit=100):
+        """Return TagInfos for repository."""
+        values = self._cached(f"tags|{repository}|{limit}", lambda: [
+            t.as_dict() for t in self.backend.tags(repository, limit)])
+        return [TagInfo.from_dict(value) for value in values]
+
+    def _cached(self, key, fetch):
+        key = f"{self.backend.name}|{key}"
+        value = self.cache.get(key)
+        if value is not None:
+            with self._lock:
+                self.stats["hits"] += 1
+            return value
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        if not owner:
+            return future.result()
+        try:
+            value = self._fetch(fetch)
+            self.cache.put(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _fetch(self, fetch):
+        self.limiter.acquire()
+        with self._lock:
+            self.stats["requests"] += 1
+        start = time.monotonic()
+        try:
+            value = fetch()
+        except RateLimited as e:
+            with self._lock:
+                self.stats["rate_limited"] += 1
+            self.limiter.back_off(e.retry_after or 30)
+            raise
+        logger.info(f"Registry request to {self.backend.name} took {time.monotonic() - start:.2f} seconds.")
+        return value
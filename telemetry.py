@@ -0,0 +1,314 @@
+"""Structured performance telemetry for Cloud Management System operations.
+
+Every instrumented operation produces one JSON line in the metrics file
+(~/.cms/cms_metrics.jsonl, or $CMS_METRICS_FILE):
+
+    {"ts": 1760000000.1, "op": "image.pull", "target": "nginx:latest",
+     "seconds": 4.213, "outcome": "ok", "api_calls": 3, "bytes": 73400320}
+
+Durations come from time.monotonic(). Docker API calls are counted by a
+response hook on the client session and attributed to the operation active in
+the calling context; worker pools submit tasks with contextvars.copy_context().run
+so calls made on their threads count too.
+
+Recording a finished operation costs the caller a deque append and a queue
+put: a background thread appends the records to the file in batches and calls
+the listeners (such as the history database), so file I/O never runs on the
+Tk thread or inside a timed operation.
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+
+METRICS_FILE = os.environ.get("CMS_METRICS_FILE") or os.path.join(os.path.expanduser("~"), ".cms",
+                                                                    "cms_metrics.jsonl")
+
+OK = "ok"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+_current_span = contextvars.ContextVar("cms_telemetry_span", default=None)
+
+
+class Span:
+    """Measurements for one running operation."""
+
+    def __init__(self, operation, target=None):
+        self.operation = operation
+        self.target = target
+        self.api_calls = 0
+        self.bytes = 0
+        self.outcome = OK
+        self.error = None
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def api_call(self, count=1):
+        with self._lock:
+            self.api_calls += count
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.bytes += count or 0
+
+    def as_record(self):
+        record = {"ts": round(time.time(), 3), "op": self.operation, "target": self.target,
+                  "seconds": round(self.seconds, 6), "outcome": self.outcome,
+                  "api_calls": self.api_calls, "bytes": self.bytes}
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(records):
+    """Per-operation count, failures, mean and p50/p95/p99 seconds for an iterable of metric records."""
+    grouped = defaultdict(list)
+    for record in records:
+        grouped[record["op"]].append(record)
+    summary = {}
+    for operation, items in sorted(grouped.items()):
+        durations = sorted(r["seconds"] for r in items)
+        summary[operation] = {
+            "count": len(items),
+            "failures": sum(r["outcome"] == ERROR for r in items),
+            "mean": sum(durations) / len(durations),
+            "p50": percentile(durations, 0.50),
+            "p95": percentile(durations, 0.95),
+            "p99": percentile(durations, 0.99),
+            "max": durations[-1],
+            "api_calls": sum(r.get("api_calls", 0) for r in items),
+            "bytes": sum(r.get("bytes", 0) for r in items),
+        }
+    return summary
+
+
+def load_records(path=METRICS_FILE, operation=None, since=None):
+    """Read metric records from a JSON-lines file, optionally filtered by operation and start time."""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if operation and record.get("op") != operation:
+                continue
+            if since and record.get("ts", 0) < since:
+                continue
+            records.append(record)
+    return records
+
+
+class MetricsRecorder:
+    """Keeps recent spans in memory and hands them to a background writer for the metrics file and listeners."""
+
+    def __init__(self, path=METRICS_FILE, window=1000):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._recent = defaultdict(lambda: deque(maxlen=self.window))
+        self._listeners = []
+        # Unbounded queue: recording never blocks the caller
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._closed = False
+
+    def record(self, span):
+        record = span.as_record()
+        with self._lock:
+            self._recent[span.operation].append(record)
+            if self._closed or (not self.path and not self._listeners):
+                return
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="cms-telemetry", daemon=True)
+                self._writer.start()
+        self._queue.put(record)
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Take whatever else is queued, so a burst of operations costs one file open
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in batch if isinstance(item, dict)]
+            if records:
+                self._write(records)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if None in batch:
+                return
+
+    def _write(self, records):
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write("".join(json.dumps(record) + "\n" for record in records))
+            except OSError as e:
+                logging.warning(f"Could not write metrics to {self.path}: {e}")
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            for record in records:
+                try:
+                    listener(record)
+                except Exception as e:
+                    logging.warning(f"Metrics listener {listener!r} failed: {e}")
+
+    def flush(self, timeout=10.0):
+        """Wait until every record so far is written and passed to the listeners."""
+        with self._lock:
+            if self._writer is None or self._closed:
+                return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10.0):
+        """Write what is queued and stop the writer thread; later records are only kept in memory."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            writer = self._writer
+        if writer is not None:
+            self._queue.put(None)
+            writer.join(timeout)
+
+    def add_listener(self, listener):
+        """Call listener(record) for every recorded operation."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def recent(self):
+        with self._lock:
+            return [record for records in self._recent.values() for record in records]
+
+    def summary(self):
+        """Percentile summary of the operations recorded by this process."""
+        return summarize(self.recent())
+
+
+_recorder = MetricsRecorder()
+
+
+def get_recorder():
+    return _recorder
+
+
+def configure(path=METRICS_FILE, window=1000):
+    """Replace the process-wide recorder (path=None keeps metrics in memory only)."""
+    global _recorder
+    previous, _recorder = _recorder, MetricsRecorder(path, window)
+    previous.close()
+    return _recorder
+
+
+@atexit.register
+def _close_recorder():
+    _recorder.close()
+
+
+def current_span():
+    return _current_span.get()
+
+
+class measure:
+    """Context manager timing an operation and recording it when the block exits.
+
+        with telemetry.measure("image.pull", target=name) as span:
+            span.add_bytes(size)
+    """
+
+    def __init__(self, operation, target=None):
+        self.span = Span(operation, target)
+        self._token = None
+        self._start = None
+
+    def __enter__(self):
+        self._token = _current_span.set(self.span)
+        self._start = time.monotonic()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.seconds = time.monotonic() - self._start
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.span.outcome = CANCELLED if type(exc).__name__ == "JobCancelled" else ERROR
+            self.span.error = str(exc)[:500]
+        _recorder.record(self.span)
+        return False
+
+
+def instrumented(operation, target=(), bytes_of=None):
+    """Decorator recording each call as operation.
+
+    target names the argument (or tuple of arguments, first one set wins) used
+    as the record's target; bytes_of(result) returns the number of bytes the
+    call transferred.
+    """
+    names = (target,) if isinstance(target, str) else tuple(target)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            target_value = None
+            if names:
+                try:
+                    arguments = signature.bind_partial(*args, **kwargs).arguments
+                    target_value = next((arguments[n] for n in names if arguments.get(n) is not None), None)
+                except TypeError:
+                    pass
+            with measure(operation, target=None if target_value is None else str(target_value)) as span:
+                result = func(*args, **kwargs)
+                if bytes_of is not None:
+                    try:
+                        span.add_bytes(bytes_of(result))
+                    except Exception as e:
+                        logging.debug(f"Could not count bytes for {operation}: {e}")
+                return result
+        return wrapper
+    return decorator
+
+
+def _count_api_call(response, *args, **kwargs):
+    span = _current_span.get()
+    if span is not None:
+        span.api_call()
+    return response
+
+
+def instrument_client(client):
+    """Count Docker API requests made through client against the active operation."""
+    session = getattr(client, "api", client)
+    hooks = session.hooks.setdefault("response", [])
+    if _count_api_call not in hooks:
+        hooks.append(_count_api_call)
+    return client
+
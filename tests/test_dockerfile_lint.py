@@ -0,0 +1,110 @@
+import pytest
+
+import dockerfile_lint
+from dockerfile_lint import ERROR, INFO, WARNING, Analyzer, analyze
+
+
+def rules(text, context=None):
+    return [(f.rule, f.severity, f.line) for f in analyze(text, context).findings]
+
+
+def test_logical_lines_join_continuations_and_skip_comments():
+    text = "# syntax=docker/dockerfile:1\nFROM python:3.12\n# comment\nRUN apt-get update \\\n    && make\n"
+    assert list(dockerfile_lint.logical_lines(text)) == [(2, "FROM python:3.12"), (4, "RUN apt-get update && make")]
+
+
+def test_escape_directive_changes_the_continuation_character():
+    text = "# escape=`\nFROM windows:ltsc2022\nRUN dir `\n    C:\\\n"
+    assert list(dockerfile_lint.logical_lines(text))[-1] == (3, "RUN dir C:\\")
+
+
+def test_clean_dockerfile_has_no_findings():
+    text = ("FROM python:3.12-slim\n"
+            "COPY requirements.txt .\n"
+            "RUN pip install --no-cache-dir -r requirements.txt\n"
+            "COPY . .\n"
+            'CMD ["python", "app.py"]\n')
+    assert rules(text) == []
+
+
+def test_copying_the_context_before_installing_dependencies_busts_the_cache():
+    text = "FROM node:20\nCOPY . /app\nRUN npm ci\n"
+    assert ("cache-bust", WARNING, 2) in rules(text)
+
+
+def test_copy_from_another_stage_does_not_bust_the_cache():
+    text = "FROM node:20 AS build\nFROM node:20\nCOPY --from=build . /app\nRUN npm ci\n"
+    assert "cache-bust" not in [rule for rule, _, _ in rules(text)]
+
+
+def test_consecutive_runs_are_reported_once_per_group():
+    text = "FROM alpine:3.19\nRUN echo 1\nRUN echo 2\nENV A=1\nRUN echo 3\n"
+    assert [f for f in rules(text) if f[0] == "combine-run"] == [("combine-run", INFO, 2)]
+
+
+@pytest.mark.parametrize("command, expected", [
+    ("apt-get update", "apt-update"),
+    ("apt-get update && apt-get install -y curl", "package-cache"),
+    ("apk add curl", "package-cache"),
+    ("pip install flask", "package-cache"),
+    ("yum install -y curl", "package-cache"),
+])
+def test_package_manager_caches(command, expected):
+    assert expected in [rule for rule, _, _ in rules(f"FROM debian:12\nRUN {command}\n")]
+
+
+@pytest.mark.parametrize("command", [
+    "apt-get update && apt-get install -y curl && rm -rf /var/lib/apt/lists/*",
+    "apk add --no-cache curl",
+    "pip install --no-cache-dir flask",
+    "yum install -y curl && yum clean all",
+])
+def test_cleaned_package_caches_are_not_reported(command):
+    assert rules(f"FROM debian:12\nRUN {command}\n") == []
+
+
+def test_build_toolchain_in_a_single_stage_image():
+    assert ("multi-stage", INFO, 2) in rules("FROM golang:1.22\nRUN go build -o /app .\n")
+    assert "multi-stage" not in [r for r, _, _ in rules("FROM golang:1.22 AS build\nRUN go build -o /app .\n"
+                                                        "FROM scratch\nCOPY --from=build /app /app\n")]
+
+
+@pytest.mark.parametrize("base, reported", [("ubuntu", True), ("ubuntu:latest", True), ("ubuntu:22.04", False),
+                                            ("registry:5000/app", True), ("app@sha256:abc", False),
+                                            ("scratch", False), ("$BASE", False)])
+def test_unpinned_base_images(base, reported):
+    assert (("base-tag", INFO, 1) in rules(f"FROM {base}\n")) == reported
+
+
+def test_later_stages_may_build_on_earlier_stage_names():
+    text = "FROM python:3.12 AS base\nFROM base\n"
+    assert "base-tag" not in [rule for rule, _, _ in rules(text)]
+
+
+def test_syntax_errors():
+    assert rules("RUN echo hi\n") == [("syntax", ERROR, 1)]
+    assert ("syntax", ERROR, 2) in rules("FROM alpine:3.19\nRUNN echo hi\n")
+    assert rules("ARG VERSION=3.19\nFROM alpine:${VERSION}\n") == []
+
+
+def test_large_context_without_dockerignore():
+    text = "FROM alpine:3.19\n"
+    large = dockerfile_lint.LARGE_CONTEXT_BYTES
+    assert rules(text, (10, large, False)) == [("context", WARNING, None)]
+    assert rules(text, (10, large, True)) == []
+    assert rules(text, (10, large - 1, False)) == []
+
+
+def test_layer_counts_of_the_final_stage():
+    text = "FROM golang:1.22 AS build\nRUN go build\nRUN strip app\nFROM scratch\nCOPY --from=build /app /app\n"
+    analysis = analyze(text)
+    assert (len(analysis.stages), analysis.layers, analysis.total_layers) == (2, 1, 3)
+
+
+def test_analyzer_reuses_unchanged_instructions_with_new_line_numbers():
+    analyzer = Analyzer()
+    first = analyzer.analyze("FROM alpine:3.19\nRUN echo hi\n")
+    second = analyzer.analyze("FROM alpine:3.19\n\nRUN echo hi\n")
+    assert analyzer.analyze("FROM alpine:3.19\n\nRUN echo hi\n") is second
+    assert [i.line for i in first.instructions] == [1, 2]
+    assert [i.line for i in second.instructions] == [1, 3]
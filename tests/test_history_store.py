@@ -0,0 +1,111 @@
+import json
+import sqlite3
+
+import pytest
+
+import history_store
+from history_store import HistoryStore, parse_age
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), flush_interval=0.05)
+    yield store
+    store.close()
+
+
+def record(ts, op="image.pull", target="nginx:latest", seconds=1.0, outcome="ok", **extra):
+    return {"ts": ts, "op": op, "target": target, "seconds": seconds, "outcome": outcome, **extra}
+
+
+def fill(store, records):
+    for r in records:
+        store.record(r)
+    assert store.flush()
+
+
+def test_the_same_operation_is_stored_once(store):
+    fill(store, [record(100.0), record(100.0), record(100.0, target=None), record(100.0, target=None)])
+    assert len(store.query()) == 2
+    assert (store.written, store.duplicates) == (2, 2)
+
+
+def test_import_skips_operations_already_recorded(store, tmp_path):
+    fill(store, [record(100.0), record(200.0)])
+    path = tmp_path / "metrics.jsonl"
+    path.write_text("\n".join(json.dumps(r) for r in (record(100.0), record(200.0), record(300.0)))
+                    + "\nnot json\n" + json.dumps({"ts": 1}) + "\n")
+    assert store.import_jsonl(str(path)) == 3
+    assert store.flush()
+    assert [r["ts"] for r in store.query(order="ts", descending=False)] == [100.0, 200.0, 300.0]
+    assert store.duplicates == 2
+
+
+def test_existing_duplicates_are_removed_when_the_index_is_created(tmp_path):
+    path = str(tmp_path / "old.db")
+    db = sqlite3.connect(path)
+    db.executescript(history_store.SCHEMA)
+    db.executemany("INSERT INTO operations (ts, op, target, seconds, outcome) VALUES (?, ?, ?, ?, ?)",
+                   [(1.0, "image.pull", "a", 2.0, "ok")] * 3 + [(2.0, "image.pull", "a", 2.0, "ok")])
+    db.commit()
+    db.close()
+    store = HistoryStore(path)
+    try:
+        assert len(store.query()) == 2
+    finally:
+        store.close()
+
+
+def test_query_filters_and_prefix_matching(store):
+    fill(store, [record(1.0, op="image.pull"), record(2.0, op="image.build", target="app:1"),
+                 record(3.0, op="container.run", outcome="error"), record(4.0, op="image_pull")])
+    assert [r["ts"] for r in store.query(op="image.*")] == [2.0, 1.0]
+    assert [r["ts"] for r in store.query(outcome="error")] == [3.0]
+    assert [r["ts"] for r in store.query(since=2.0, until=4.0)] == [3.0, 2.0]
+    assert [r["ts"] for r in store.query(target="app:*")] == [2.0]
+
+
+def test_slowest_orders_by_duration(store):
+    fill(store, [record(float(i), seconds=s) for i, s in enumerate((0.5, 3.0, 1.5, 2.0))])
+    assert [r["seconds"] for r in store.slowest(op="image.pull", limit=3)] == [3.0, 2.0, 1.5]
+
+
+def test_failure_rates_per_target(store):
+    fill(store, [record(1.0, target="a", outcome="error"), record(2.0, target="a"),
+                 record(3.0, target="b"), record(4.0, target="b"), record(5.0, target="c", outcome="error")])
+    rates = {row["key"]: (row["count"], row["failures"], row["rate"]) for row in store.failure_rates(min_count=2)}
+    assert rates == {"a": (2, 1, 0.5), "b": (2, 0, 0.0)}
+
+
+def test_summary_per_operation(store):
+    fill(store, [record(1.0, seconds=1.0, bytes=10, api_calls=2), record(2.0, seconds=3.0, bytes=5, api_calls=1),
+                 record(3.0, op="container.run", outcome="error")])
+    summary = {row["op"]: row for row in store.summary()}
+    assert summary["image.pull"]["count"] == 2
+    assert summary["image.pull"]["mean"] == pytest.approx(2.0)
+    assert (summary["image.pull"]["bytes"], summary["image.pull"]["api_calls"]) == (15, 3)
+    assert summary["container.run"]["failures"] == 1
+
+
+def test_prune_deletes_older_operations(store):
+    fill(store, [record(1.0), record(2.0), record(3.0)])
+    assert store.prune(before=3.0) == 2
+    assert [r["ts"] for r in store.query()] == [3.0]
+
+
+def test_invalid_order_and_grouping(store):
+    with pytest.raises(ValueError):
+        store.query(order="op")
+    with pytest.raises(ValueError):
+        store.failure_rates(by="seconds")
+
+
+@pytest.mark.parametrize("text, seconds", [("30m", 1800), ("24h", 86400), ("7d", 604800), ("2w", 1209600),
+                                           ("1.5 h", 5400)])
+def test_parse_age(text, seconds):
+    assert parse_age(text) == seconds
+
+
+def test_parse_age_rejects_other_units():
+    with pytest.raises(ValueError):
+        parse_age("3 months")
@@ -0,0 +1,123 @@
+import time
+
+import pytest
+
+import reclaim
+from reclaim import DAY, Candidate, ReclaimPlan, ReclaimPolicy, UsageTracker
+
+NOW = 1_700_000_000.0
+
+
+class FakeAPI:
+    def __init__(self, df):
+        self._df = df
+        self.calls = []
+
+    def df(self):
+        return self._df
+
+    def remove_image(self, image, force=False):
+        self.calls.append(("remove_image", image, force))
+
+    def remove_container(self, container):
+        self.calls.append(("remove_container", container))
+
+
+class FakeClient:
+    def __init__(self, images=(), containers=()):
+        self.api = FakeAPI({"Images": list(images), "Containers": list(containers), "BuildCache": []})
+
+
+def image(image_id, tags=(), digests=(), created=NOW - 100 * DAY, size=100):
+    return {"Id": image_id, "RepoTags": list(tags), "RepoDigests": list(digests), "Created": created, "Size": size,
+            "SharedSize": 0}
+
+
+@pytest.fixture
+def usage(tmp_path):
+    return UsageTracker(str(tmp_path / "last_used.json"))
+
+
+def plan(policy, client, usage):
+    return reclaim.plan(policy, client=client, usage=usage, now=NOW)
+
+
+def test_untagged_images_are_kept_without_the_dangling_rule(usage):
+    client = FakeClient([image("sha256:untagged")])
+    result = plan(ReclaimPolicy(overlay_unused_days=3), client, usage)
+    assert result.candidates == []
+
+
+def test_dangling_rule_removes_untagged_images_without_force(usage):
+    client = FakeClient([image("sha256:untagged"), image("sha256:tagged", ["app:1"])])
+    result = plan(ReclaimPolicy(dangling=True), client, usage)
+    assert [(c.target, c.reason) for c in result.candidates] == [("sha256:untagged", "dangling")]
+    result.candidates[0].func()
+    assert client.api.calls == [("remove_image", "sha256:untagged", False)]
+
+
+def test_images_pulled_by_digest_are_not_dangling(usage):
+    client = FakeClient([image("sha256:pinned", ["<none>:<none>"], ["app@sha256:abc"])])
+    assert plan(ReclaimPolicy(dangling=True), client, usage).candidates == []
+
+
+def test_keep_tags_untags_older_tags_and_removes_images_left_without_tags(usage):
+    client = FakeClient([image("sha256:old", ["app:1"], created=NOW - 30 * DAY),
+                         image("sha256:mid", ["app:2", "app:stable"], created=NOW - 20 * DAY),
+                         image("sha256:new", ["app:3"], created=NOW - 10 * DAY)])
+    result = plan(ReclaimPolicy(keep_tags=2), client, usage)
+    removals = {(c.target, c.size) for c in result.candidates}
+    # app:3 and app:stable are newest by creation time, app:2 shares an image with app:stable
+    assert ("app:1", 100) in removals
+    assert ("app:2", 0) in removals
+    assert all(c.target not in ("app:3", "app:stable") for c in result.candidates)
+
+
+def test_unused_days_prefers_recorded_use_over_creation_time(usage):
+    client = FakeClient([image("sha256:a", ["used:1"]), image("sha256:b", ["idle:1"])])
+    usage.touch("images", "used:1")
+    result = reclaim.plan(ReclaimPolicy(image_unused_days=30), client=client, usage=usage, now=time.time())
+    assert [c.target for c in result.candidates] == ["idle:1"]
+
+
+def test_images_of_kept_containers_are_never_candidates(usage):
+    containers = [{"Id": "c1", "Names": ["/web"], "State": "running", "ImageID": "sha256:a", "Created": NOW},
+                  {"Id": "c2", "Names": ["/old"], "State": "exited", "ImageID": "sha256:b",
+                   "Created": NOW - 10 * DAY, "SizeRw": 5}]
+    client = FakeClient([image("sha256:a", ["web:1"]), image("sha256:b", ["old:1"])], containers)
+    result = plan(ReclaimPolicy(image_unused_days=30, container_age_days=7), client, usage)
+    # The stopped container goes first, which frees the image it used
+    assert [(c.kind, c.target) for c in result.candidates] == [("container", "old"), ("image", "old:1")]
+
+
+def test_high_water_evicts_least_recently_used_until_below_low_water():
+    policy = ReclaimPolicy(high_water=0.9, low_water=0.5)
+    result = ReclaimPlan(policy)
+    result.disk["docker"] = {"total": 1000, "used": 950, "fraction": 0.95}
+    lru = [Candidate("image", name, size, "least recently used", last_used, "docker", None)
+           for name, size, last_used in (("newest", 300, 3), ("oldest", 300, 1), ("middle", 300, 2))]
+    reclaim._evict_over_high_water(result, policy, lru)
+    assert [c.target for c in result.candidates] == ["oldest", "middle"]
+    assert result.disk["docker"]["projected"] == pytest.approx(0.35)
+
+
+def test_execute_counts_only_successful_removals():
+    def fail():
+        raise RuntimeError("in use")
+
+    result = ReclaimPlan(ReclaimPolicy())
+    result.candidates = [Candidate("image", "a", 10, "r", None, "docker", lambda: None),
+                         Candidate("overlay", "b", 20, "r", None, "pool", fail),
+                         Candidate("container", "c", 5, "r", None, "docker", lambda: None)]
+    results, summary = reclaim.execute(result)
+    assert [(r.action, r.ok) for r in results] == [("remove container", True), ("remove image", True),
+                                                    ("remove overlay", False)]
+    assert summary["bytes"] == 15
+    assert summary["failed"] == 1
+
+
+@pytest.mark.parametrize("options", [{"high_water": 1.5}, {"high_water": 0.5, "low_water": 0.8},
+                                     {"keep_tags": 0}])
+def test_policy_rejects_invalid_limits(options):
+    with pytest.raises(ValueError):
+        ReclaimPolicy(**options)
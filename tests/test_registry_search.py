@@ -0,0 +1,182 @@
+import threading
+
+import pytest
+
+import registry_search
+from registry_search import (DockerHubBackend, RateLimited, RateLimiter, RegistrySearch, RegistryV2Backend,
+                             ResponseCache, SearchResult, TagInfo)
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping advances the clock instantly."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(registry_search, "time", clock)
+    return clock
+
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self, error=None):
+        self.searches = []
+        self.error = error
+
+    def search(self, query, limit):
+        self.searches.append(query)
+        if self.error is not None:
+            raise self.error
+        return [SearchResult(f"{query}-{i}", stars=i) for i in range(limit)]
+
+    def tags(self, repository, limit):
+        return [TagInfo(f"1.{i}", size=i) for i in range(limit)]
+
+
+def make_search(backend, tmp_path=None, **cache_options):
+    path = str(tmp_path / "cache.json") if tmp_path is not None else None
+    return RegistrySearch(backend, ResponseCache(path, **cache_options), RateLimiter(rate=1000, burst=1000))
+
+
+def test_repeated_searches_are_answered_from_the_cache(clock):
+    backend = FakeBackend()
+    search = make_search(backend)
+    first = search.search("nginx", limit=3)
+    second = search.search("NGINX", limit=3)
+    assert [r.as_dict() for r in first] == [r.as_dict() for r in second]
+    assert backend.searches == ["nginx"]
+    assert (search.stats["misses"], search.stats["hits"], search.stats["requests"]) == (1, 1, 1)
+
+
+def test_cache_entries_expire_after_the_ttl(clock):
+    backend = FakeBackend()
+    search = make_search(backend, ttl=60)
+    search.search("redis", limit=1)
+    clock.now += 61
+    search.search("redis", limit=1)
+    assert backend.searches == ["redis", "redis"]
+
+
+def test_cache_evicts_least_recently_used_entries(clock):
+    cache = ResponseCache(None, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_cache_survives_a_restart(clock, tmp_path):
+    backend = FakeBackend()
+    make_search(backend, tmp_path).tags("library/nginx", limit=2)
+    tags = make_search(FakeBackend(error=AssertionError("not cached")), tmp_path).tags("library/nginx", limit=2)
+    assert [(t.name, t.size) for t in tags] == [("1.0", 0), ("1.1", 1)]
+
+
+def test_cache_keys_include_the_backend(clock):
+    backend = FakeBackend()
+    search = make_search(backend)
+    search.search("nginx", limit=1)
+    other = FakeBackend()
+    other.name = "other"
+    search.backend = other
+    search.search("nginx", limit=1)
+    assert (backend.searches, other.searches) == (["nginx"], ["nginx"])
+
+
+def test_identical_queries_in_flight_share_one_request():
+    release = threading.Event()
+    started = threading.Event()
+
+    class SlowBackend(FakeBackend):
+        def search(self, query, limit):
+            started.set()
+            release.wait(5)
+            return super().search(query, limit)
+
+    backend = SlowBackend()
+    search = make_search(backend)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(search.search("postgres", limit=2)))
+               for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while search.stats["coalesced"] < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert backend.searches == ["postgres"]
+    assert len(results) == 4 and all(len(r) == 2 for r in results)
+
+
+def test_failed_requests_are_not_cached(clock):
+    backend = FakeBackend(error=registry_search.RegistryError("down"))
+    search = make_search(backend)
+    for _ in range(2):
+        with pytest.raises(registry_search.RegistryError):
+            search.search("nginx")
+    assert len(backend.searches) == 2
+
+
+def test_rate_limiter_allows_a_burst_then_spaces_requests(clock):
+    limiter = RateLimiter(rate=2.0, burst=3)
+    for _ in range(3):
+        limiter.acquire()
+    assert clock.sleeps == []
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
+    clock.now += 10
+    for _ in range(3):
+        limiter.acquire()
+    assert len(clock.sleeps) == 1
+
+
+def test_a_429_answer_blocks_requests_for_retry_after(clock):
+    backend = FakeBackend(error=RateLimited("7"))
+    search = RegistrySearch(backend, ResponseCache(None), RateLimiter(rate=100, burst=100))
+    with pytest.raises(RateLimited):
+        search.search("nginx")
+    backend.error = None
+    search.search("nginx")
+    assert search.stats["rate_limited"] == 1
+    assert sum(clock.sleeps) == pytest.approx(7)
+
+
+def test_rate_limited_parses_retry_after():
+    assert RateLimited("12").retry_after == 12
+    assert RateLimited("Wed, 21 Oct 2015 07:28:00 GMT").retry_after is None
+
+
+def test_backend_for():
+    assert isinstance(registry_search.backend_for(None), DockerHubBackend)
+    assert isinstance(registry_search.backend_for("hub"), DockerHubBackend)
+    assert registry_search.backend_for("localhost:5000").name == "https://localhost:5000"
+    assert isinstance(registry_search.backend_for("http://registry.local/"), RegistryV2Backend)
+
+
+def test_sort_results():
+    results = [SearchResult("b", stars=5), SearchResult("a", stars=1, official=True), SearchResult("c", stars=9)]
+    assert [r.name for r in registry_search.sort_results(results)] == ["c", "b", "a"]
+    assert [r.name for r in registry_search.sort_results(results, "name")] == ["a", "b", "c"]
+    assert [r.name for r in registry_search.sort_results(results, "official")] == ["a", "c", "b"]
+    with pytest.raises(ValueError):
+        registry_search.sort_results(results, "pulls")
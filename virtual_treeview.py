@@ -0,0 +1,94 @@
+"""A Treeview for very long lists that only renders the visible rows.
+
+ttk.Treeview creates a Tk item per row, so inserting tens of thousands of rows
+freezes the window. VirtualTreeview keeps the rows in a Python list, creates
+only `height` items and re-fills them as the user scrolls.
+"""
+from tkinter import ttk
+
+
+class VirtualTreeview(ttk.Frame):
+    """Windowed, scrollable table over a list of rows.
+
+    columns, headings and widths describe the columns. on_sort(column) is
+    called when a heading is clicked. Rows are value tuples; keys (e.g. image
+    ids) identify them for selection.
+    """
+
+    def __init__(self, master, columns, headings, widths, height=20, on_sort=None, anchors=None):
+        super().__init__(master)
+        self.height = height
+        self._rows = []
+        self._keys = []
+        self._offset = 0
+        self._selected = set()
+        self._rendering = False
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=height)
+        for column, heading, width in zip(columns, headings, widths):
+            command = (lambda c=column: on_sort(c)) if on_sort is not None else ""
+            self.tree.heading(column, text=heading, command=command)
+            self.tree.column(column, width=width, anchor=(anchors or {}).get(column, "w"))
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units", 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-1, "units", 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(1, "units", 3))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-1, "pages"))
+        self.tree.bind("<Next>", lambda e: self.scroll(1, "pages"))
+
+    def set_rows(self, rows, keys=None):
+        """Replace all rows, keeping the scroll position and selection where possible."""
+        self._rows = list(rows)
+        self._keys = [str(k) for k in keys] if keys is not None else [str(i) for i in range(len(self._rows))]
+        self._selected &= set(self._keys)
+        self._offset = max(0, min(self._offset, len(self._rows) - self.height))
+        self._render()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def selection(self):
+        """Keys of the selected rows, including rows scrolled out of view."""
+        return [key for key in self._keys if key in self._selected]
+
+    def scroll(self, amount, what="units", step=1):
+        page = self.height if what == "pages" else step
+        self._move_to(self._offset + amount * page)
+        return "break"
+
+    def _move_to(self, offset):
+        offset = max(0, min(int(offset), len(self._rows) - self.height))
+        if offset != self._offset:
+            self._offset = offset
+            self._render()
+
+    def _on_scrollbar(self, action, amount, what=None):
+        if action == "moveto":
+            self._move_to(float(amount) * len(self._rows))
+        else:
+            self.scroll(int(amount), what)
+
+    def _on_select(self, _event=None):
+        if self._rendering:
+            return
+        visible = set(self.tree.get_children())
+        self._selected = (self._selected - visible) | set(self.tree.selection())
+
+    def _render(self):
+        self._rendering = True
+        try:
+            self.tree.delete(*self.tree.get_children())
+            end = min(len(self._rows), self._offset + self.height)
+            for index in range(self._offset, end):
+                self.tree.insert("", "end", iid=self._keys[index], values=self._rows[index])
+            self.tree.selection_set([key for key in self._keys[self._offset:end] if key in self._selected])
+        finally:
+            self._rendering = False
+        total = len(self._rows) or 1
+        self.scrollbar.set(self._offset / total, min(1.0, (self._offset + self.height) / total))
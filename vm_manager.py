@@ -0,0 +1,370 @@
+"""QEMU virtual machine lifecycle management.
+
+VMs are started as tracked subprocesses with performance-oriented defaults
+(KVM with host CPU passthrough when /dev/kvm is usable, virtio disk and
+network, cache=none with native AIO) and a QMP control socket. Each VM's pid,
+command line and socket path are written to a small JSON file in the state
+directory, so VMs started by the GUI can be managed from the command line and
+vice versa.
+"""
+import json
+import logging
+import os
+import re
+import signal
+import socket
+import subprocess
+import time
+
+logger = logging.getLogger("cms.vm")
+
+QEMU_BINARY = "qemu-system-x86_64"
+DEFAULT_STATE_DIR = os.path.join(os.path.expanduser("~"), ".cms", "vms")
+
+CACHE_MODES = ("none", "writeback", "writethrough", "directsync", "unsafe")
+AIO_MODES = ("native", "io_uring", "threads")
+# Header magic of the image formats QEMU opens; anything else is a raw disk
+DISK_MAGIC = ((b"QFI\xfb", "qcow2"), (b"QED\x00", "qed"), (b"KDMV", "vmdk"), (b"vhdxfile", "vhdx"))
+
+
+class QMPError(Exception):
+    """Raised when QEMU answers a QMP command with an error or the socket fails."""
+
+
+def kvm_available():
+    return os.access("/dev/kvm", os.R_OK | os.W_OK)
+
+
+def detect_disk_format(path):
+    """Detect the image format of a disk from its header, as qemu-img info does; qcow2 if unreadable."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(8)
+    except OSError:
+        return "qcow2"
+    return next((fmt for magic, fmt in DISK_MAGIC if header.startswith(magic)), "raw")
+
+
+def build_qemu_command(disk, cpu, memory, qmp_path, iso=None, kvm=None, cache="none", aio="native",
+                       hugepages=False, virtio=True, name=None, snapshot=False, display=None, disk_format=None):
+    """Return the QEMU argument list for a VM.
+
+    kvm=None enables KVM when /dev/kvm is usable. aio=native needs a cache mode
+    that bypasses the host page cache (none or directsync), so other cache
+    modes fall back to thread-pool AIO. disk_format=None detects the format
+    from the disk header.
+    """
+    if cache not in CACHE_MODES:
+        raise ValueError(f"Invalid cache mode '{cache}'.")
+    if aio not in AIO_MODES:
+        raise ValueError(f"Invalid AIO mode '{aio}'.")
+    if aio == "native" and cache not in ("none", "directsync"):
+        aio = "threads"
+    if kvm is None:
+        kvm = kvm_available()
+
+    command = [QEMU_BINARY, "-m", f"{memory}M", "-smp", f"cpus={cpu}"]
+    if name:
+        command += ["-name", name]
+    if kvm:
+        command += ["-enable-kvm", "-cpu", "host"]
+    else:
+        command += ["-cpu", "max"]
+    if hugepages:
+        command += ["-mem-path", "/dev/hugepages", "-mem-prealloc"]
+
+    interface = "virtio" if virtio else "ide"
+    fmt = disk_format or detect_disk_format(disk)
+    drive = f"file={disk},if={interface},format={fmt},cache={cache},aio={aio},discard=unmap"
+    if snapshot:
+        drive += ",snapshot=on"
+    command += ["-drive", drive]
+    if virtio:
+        command += ["-netdev", "user,id=net0", "-device", "virtio-net-pci,netdev=net0"]
+    if iso:
+        command += ["-cdrom", iso, "-boot", "order=d"]
+    else:
+        command += ["-boot", "order=c"]
+    if display:
+        command += ["-display", display]
+    command += ["-qmp", f"unix:{qmp_path},server=on,wait=off"]
+    return command
+
+
+class QMPClient:
+    """Minimal QEMU Machine Protocol client over a unix socket."""
+
+    def __init__(self, path, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def connect(self):
+        try:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(self.timeout)
+            self._sock.connect(self.path)
+            self._reader = self._sock.makefile("r")
+            greeting = self._read()
+            if "QMP" not in greeting:
+                raise QMPError(f"Unexpected QMP greeting: {greeting}")
+            self.execute("qmp_capabilities")
+        except OSError as e:
+            self.close()
+            raise QMPError(f"Cannot connect to QMP socket {self.path}: {e}") from e
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _read(self):
+        line = self._reader.readline()
+        if not line:
+            raise QMPError("QMP connection closed.")
+        return json.loads(line)
+
+    def execute(self, command, **arguments):
+        message = {"execute": command}
+        if arguments:
+            message["arguments"] = arguments
+        self._sock.sendall(json.dumps(message).encode() + b"\n")
+        while True:
+            reply = self._read()
+            if "event" in reply:
+                continue
+            if "error" in reply:
+                raise QMPError(f"{command}: {reply['error'].get('desc', reply['error'])}")
+            return reply.get("return")
+
+
+class VM:
+    """A QEMU process started by the VMManager."""
+
+    def __init__(self, name, pid, command, qmp_path, disk, cpu, memory, started_at, launch_seconds=0.0,
+                 process=None):
+        self.name = name
+        self.pid = pid
+        self.command = command
+        self.qmp_path = qmp_path
+        self.disk = disk
+        self.cpu = cpu
+        self.memory = memory
+        self.started_at = started_at
+        self.launch_seconds = launch_seconds
+        self.process = process
+
+    @property
+    def accelerated(self):
+        return "-enable-kvm" in self.command
+
+    def is_running(self):
+        if self.process is not None:
+            return self.process.poll() is None
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return _pid_command_matches(self.pid)
+
+    def as_dict(self):
+        return {"name": self.name, "pid": self.pid, "command": self.command, "qmp_path": self.qmp_path,
+                "disk": self.disk, "cpu": self.cpu, "memory": self.memory, "started_at": self.started_at,
+                "launch_seconds": self.launch_seconds}
+
+
+def _pid_command_matches(pid):
+    # Guard against pid reuse: the process must still be a QEMU binary
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return b"qemu" in f.read()
+    except OSError:
+        return True
+
+
+def _wait_for_exit(vm, timeout):
+    deadline = time.monotonic() + timeout
+    while vm.is_running():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+class VMManager:
+    """Starts QEMU VMs and controls them through QMP."""
+
+    def __init__(self, state_dir=DEFAULT_STATE_DIR):
+        self.state_dir = state_dir
+        # State files and QMP sockets control the VMs, so only their owner may reach them
+        os.makedirs(state_dir, mode=0o700, exist_ok=True)
+        os.chmod(state_dir, 0o700)
+        self._processes = {}
+
+    def _state_file(self, name):
+        return os.path.join(self.state_dir, f"{name}.json")
+
+    def launch(self, disk, cpu, memory, name=None, iso=None, **options):
+        """Start a VM in the background and return its VM record once QMP answers.
+
+        options are passed to build_qemu_command (kvm, cache, aio, hugepages, ...).
+        """
+        name = name or os.path.splitext(os.path.basename(disk))[0]
+        if not re.fullmatch(r"[A-Za-z0-9_.-]+", name):
+            raise ValueError(f"Invalid VM name '{name}'.")
+        existing = self.get(name)
+        if existing is not None and existing.is_running():
+            raise ValueError(f"VM '{name}' is already running.")
+
+        qmp_path = os.path.join(self.state_dir, f"{name}.qmp")
+        if os.path.exists(qmp_path):
+            os.remove(qmp_path)
+        command = build_qemu_command(disk, cpu, memory, qmp_path, iso=iso, name=name, **options)
+        logger.info(f"Starting VM {name}: {' '.join(command)}")
+        start = time.monotonic()
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, start_new_session=True)
+        vm = VM(name, process.pid, command, qmp_path, disk, int(cpu), int(memory), time.time(), process=process)
+        self._processes[name] = process
+        try:
+            self._wait_for_qmp(vm)
+        except Exception:
+            if process.poll() is None:
+                process.kill()
+            raise
+        vm.launch_seconds = time.monotonic() - start
+        with open(self._state_file(name), "w") as f:
+            json.dump(vm.as_dict(), f)
+        logger.info(f"VM {name} running (pid {vm.pid}, {'KVM' if vm.accelerated else 'TCG'}) "
+                    f"after {vm.launch_seconds:.2f} seconds.")
+        return vm
+
+    def _wait_for_qmp(self, vm, timeout=30.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if vm.process.poll() is not None:
+                raise RuntimeError(f"QEMU exited with code {vm.process.returncode} while starting VM {vm.name}.")
+            if os.path.exists(vm.qmp_path):
+                try:
+                    with QMPClient(vm.qmp_path, timeout=2.0):
+                        return
+                except QMPError:
+                    pass
+            time.sleep(0.05)
+        raise RuntimeError(f"Timed out waiting for the QMP socket of VM {vm.name}.")
+
+    def get(self, name):
+        try:
+            with open(self._state_file(name)) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return VM(process=self._processes.get(name), **data)
+
+    def list(self):
+        """Return all known VMs, running or not."""
+        vms = []
+        for filename in sorted(os.listdir(self.state_dir)):
+            if filename.endswith(".json"):
+                vm = self.get(filename[:-5])
+                if vm is not None:
+                    vms.append(vm)
+        return vms
+
+    def _require(self, name):
+        vm = self.get(name)
+        if vm is None:
+            raise KeyError(f"Unknown VM '{name}'.")
+        return vm
+
+    def qmp(self, name, command, **arguments):
+        vm = self._require(name)
+        with QMPClient(vm.qmp_path) as client:
+            return client.execute(command, **arguments)
+
+    def status(self, name):
+        """Return the QEMU run state (running, paused, ...) or 'stopped' if the process has exited."""
+        vm = self._require(name)
+        if not vm.is_running():
+            return "stopped"
+        try:
+            return self.qmp(name, "query-status").get("status", "unknown")
+        except QMPError as e:
+            logger.warning(f"QMP status query for VM {name} failed: {e}")
+            return "unreachable"
+
+    def pause(self, name):
+        self.qmp(name, "stop")
+        logger.info(f"VM {name} paused.")
+
+    def resume(self, name):
+        self.qmp(name, "cont")
+        logger.info(f"VM {name} resumed.")
+
+    def shutdown(self, name, timeout=60.0):
+        """Ask the guest to power down (ACPI), forcing the VM off after timeout seconds."""
+        vm = self._require(name)
+        if not vm.is_running():
+            return
+        self.qmp(name, "system_powerdown")
+        logger.info(f"Requested ACPI shutdown of VM {name}.")
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not vm.is_running():
+                logger.info(f"VM {name} shut down.")
+                return
+            time.sleep(0.5)
+        logger.warning(f"VM {name} did not shut down within {timeout:.0f} seconds, forcing it off.")
+        self.kill(name)
+
+    def kill(self, name):
+        """Stop the VM immediately."""
+        vm = self._require(name)
+        if not vm.is_running():
+            return
+        try:
+            self.qmp(name, "quit")
+        except QMPError:
+            os.kill(vm.pid, signal.SIGKILL)
+        if vm.process is not None:
+            vm.process.wait(timeout=10)
+        elif not _wait_for_exit(vm, 10):
+            # Started by another process, so there is no handle to wait on: the disk is only free once the pid is gone
+            try:
+                os.kill(vm.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            if not _wait_for_exit(vm, 10):
+                raise RuntimeError(f"VM {name} (pid {vm.pid}) did not exit after SIGKILL.")
+        logger.info(f"VM {name} stopped.")
+
+    def remove(self, name):
+        """Forget a stopped VM (the disk image is kept)."""
+        vm = self._require(name)
+        if vm.is_running():
+            raise ValueError(f"VM '{name}' is still running.")
+        for path in (self._state_file(name), vm.qmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._processes.pop(name, None)
+
+    def wait(self, name, poll_interval=1.0, job=None):
+        """Block until the VM's QEMU process exits."""
+        vm = self._require(name)
+        while vm.is_running():
+            if job is not None and job.cancelled:
+                self.kill(name)
+                job.check_cancelled()
+            time.sleep(poll_interval)